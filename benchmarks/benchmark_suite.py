@@ -0,0 +1,472 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import typing
+
+from typing import Optional
+
+from benchmarks.data_generators import (create_archive, create_certificates_directory, create_mixed_locked_files,
+                                        create_source_files)
+from classes.bank_certificates_classes import BankCertificatesContainer
+from classes.stored_file_classes import StoredFile, StoredFileContainer
+from classes.zip_unzip_file_classes import ZipFile, UnZipFile
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+def get_peak_rss_kb() -> Optional[int]:
+    """
+    Получить пиковый объём резидентной памяти текущего процесса
+    :return: int: пиковый RSS в килобайтах или None, если платформа его не отдаёт
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return peak_rss // 1024 if platform.system() == 'Darwin' else peak_rss
+
+
+def get_percentile(sorted_values: list[float], percentile: float) -> float:
+    """
+    Получить перцентиль линейной интерполяцией между соседними значениями
+    :param list[float] sorted_values: отсортированные значения
+    :param float percentile: перцентиль от 0 до 100
+    :return: float: значение перцентиля
+    """
+    position = (len(sorted_values) - 1) * percentile / 100
+    lower_index = int(position)
+    upper_index = min(lower_index + 1, len(sorted_values) - 1)
+    return sorted_values[lower_index] + (sorted_values[upper_index] - sorted_values[lower_index]) * (
+        position - lower_index)
+
+
+class Measurement:
+    """
+    Класс, предназначенный для хранения времени повторов замера и памяти, занятой во время замера.
+    """
+
+    def __init__(self, timings: list[float], peak_rss_kb: Optional[int] = None,
+                 peak_rss_delta_kb: Optional[int] = None):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param list[float] timings: время каждого повтора в секундах
+        :param int peak_rss_kb: пиковый RSS процесса замера в килобайтах, None - память не замерялась
+        :param int peak_rss_delta_kb: рост пикового RSS за время замера в килобайтах
+        """
+        self.timings = timings
+        self.peak_rss_kb = peak_rss_kb
+        self.peak_rss_delta_kb = peak_rss_delta_kb
+
+
+class BenchmarkResult:
+    """
+    Класс, предназначенный для хранения результатов одного замера.
+    Каждое значение timings - время одного повтора, по ним считаются перцентили.
+    """
+
+    def __init__(self, name: str, parameters: dict, measurement: Measurement, items: int, bytes_count: int = 0):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str name: имя замера
+        :param dict parameters: параметры данных замера
+        :param Measurement measurement: время повторов и память замера
+        :param int items: количество обработанных элементов за один повтор
+        :param int bytes_count: количество обработанных байт за один повтор
+        """
+        self.name = name
+        self.parameters = parameters
+        self.timings = measurement.timings
+        self.items = items
+        self.bytes_count = bytes_count
+        self.peak_rss_kb = measurement.peak_rss_kb
+        self.peak_rss_delta_kb = measurement.peak_rss_delta_kb
+
+    def to_dict(self) -> dict:
+        """
+        Получить результат в виде словаря для записи в JSON
+        :return: dict: результат с пропускной способностью и перцентилями
+        """
+        sorted_timings = sorted(self.timings)
+        median_time = statistics.median(sorted_timings)
+        return {
+            'name': self.name,
+            'parameters': self.parameters,
+            'repeat': len(self.timings),
+            'items': self.items,
+            'bytes': self.bytes_count,
+            'timings_s': self.timings,
+            'best_s': sorted_timings[0],
+            'mean_s': statistics.fmean(sorted_timings),
+            'p50_s': get_percentile(sorted_timings, 50),
+            'p90_s': get_percentile(sorted_timings, 90),
+            'p99_s': get_percentile(sorted_timings, 99),
+            'items_per_s': self.items / median_time if median_time else None,
+            'bytes_per_s': self.bytes_count / median_time if median_time and self.bytes_count else None,
+            'peak_rss_kb': self.peak_rss_kb,
+            'peak_rss_delta_kb': self.peak_rss_delta_kb,
+        }
+
+
+def _run_in_child(function: typing.Callable[[], typing.Any], writer: multiprocessing.connection.Connection) -> None:
+    """
+    Выполнить функцию в дочернем процессе и передать результат или исключение через канал
+    :param function: функция без аргументов
+    :param multiprocessing.connection.Connection writer: канал для результата
+    """
+    try:
+        writer.send(function())
+    except BaseException as error:
+        writer.send(error)
+        raise
+
+
+def run_in_child(function: typing.Callable[[], typing.Any], timeout: Optional[float] = None) -> typing.Any:
+    """
+    Выполнить функцию в дочернем процессе (fork) и вернуть её результат или поднять её исключение.
+    Если fork недоступен, функция выполняется в текущем процессе.
+    :param function: функция без аргументов, результат которой сериализуется pickle
+    :param float timeout: наибольшее время выполнения в секундах, None - без ограничения
+    :return: результат функции
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return function()
+    context = multiprocessing.get_context('fork')
+    reader, writer = context.Pipe(duplex=False)
+    process = context.Process(target=_run_in_child, args=(function, writer))
+    process.start()
+    writer.close()
+    result = None
+    try:
+        # Процесс, завершившийся без результата (например, убитый при нехватке памяти), не блокирует ожидание
+        if not multiprocessing.connection.wait([reader, process.sentinel], timeout):
+            process.terminate()
+            raise TimeoutError(f'Дочерний процесс {process.pid} не завершился за {timeout} с')
+        if reader.poll():
+            try:
+                result = reader.recv()
+            except EOFError:
+                pass
+    finally:
+        reader.close()
+        process.join()
+    if isinstance(result, BaseException):
+        raise result
+    if process.exitcode != 0:
+        raise RuntimeError(f'Дочерний процесс {process.pid} завершился с кодом {process.exitcode}')
+    return result
+
+
+def _measure_repeats(function: typing.Callable, repeat: int, setup: Optional[typing.Callable]) -> Measurement:
+    """
+    Замерить время выполнения функции и рост пикового RSS в текущем процессе
+    :param function: замеряемая функция
+    :param int repeat: количество повторов
+    :param setup: функция подготовки, вызывается перед каждым повтором и не входит в замер
+    :return: Measurement: время каждого повтора и память
+    """
+    baseline_rss_kb = get_peak_rss_kb()
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    peak_rss_kb = get_peak_rss_kb()
+    return Measurement(timings, peak_rss_kb, None if peak_rss_kb is None else peak_rss_kb - baseline_rss_kb)
+
+
+def measure(function: typing.Callable, repeat: int, setup: Optional[typing.Callable] = None) -> Measurement:
+    """
+    Замерить время выполнения функции и память. Повторы выполняются в отдельном процессе (fork):
+    ru_maxrss только растёт, а пиковый RSS нового процесса в Linux начинается с текущего RSS,
+    поэтому рост пикового RSS относится только к этому замеру. Без fork замер выполняется
+    в текущем процессе, и рост может быть занижен пиком предыдущих замеров.
+    Изменения памяти, сделанные функцией, в текущий процесс не попадают.
+    :param function: замеряемая функция
+    :param int repeat: количество повторов
+    :param setup: функция подготовки, вызывается перед каждым повтором и не входит в замер
+    :return: Measurement: время каждого повтора и память
+    """
+    return run_in_child(lambda: _measure_repeats(function, repeat, setup))
+
+
+def benchmark_container_scan(work_directory: str, options: argparse.Namespace) -> list[BenchmarkResult]:
+    """
+    Замер чтения директории StoredFileContainer
+    :param str work_directory: временная директория для данных замера
+    :param argparse.Namespace options: параметры запуска
+    :return: list[BenchmarkResult]: результаты замеров
+    """
+    file_directory = os.path.join(work_directory, 'certificates')
+    files_count = len(create_certificates_directory(file_directory, options.files))
+    parameters = {'files': files_count}
+    return [
+        BenchmarkResult('container_scan', parameters,
+                        measure(lambda: StoredFileContainer(file_directory), options.repeat), files_count),
+        BenchmarkResult('container_scan_lazy', parameters,
+                        measure(lambda: sum(1 for _ in StoredFileContainer(file_directory, lazy=True).iter_files()),
+                                options.repeat), files_count),
+    ]
+
+
+def benchmark_unlocked_files(work_directory: str, options: argparse.Namespace) -> list[BenchmarkResult]:
+    """
+    Замер определения незаблокированных файлов get_unlocked_files
+    :param str work_directory: временная директория для данных замера
+    :param argparse.Namespace options: параметры запуска
+    :return: list[BenchmarkResult]: результаты замеров
+    """
+    file_directory = os.path.join(work_directory, 'mixed')
+    locked_files = create_mixed_locked_files(file_directory, options.files, options.locked_share)
+    try:
+        container = StoredFileContainer(file_directory)
+        timings = measure(container.get_unlocked_files, options.repeat)
+    finally:
+        for locked_file in locked_files:
+            locked_file.close()
+    return [BenchmarkResult('get_unlocked_files', {'files': options.files, 'locked': len(locked_files)},
+                            timings, options.files)]
+
+
+def benchmark_certificates_container(work_directory: str, options: argparse.Namespace) -> list[BenchmarkResult]:
+    """
+    Замер создания BankCertificatesContainer и задержек его запросов
+    :param str work_directory: временная директория для данных замера
+    :param argparse.Namespace options: параметры запуска
+    :return: list[BenchmarkResult]: результаты замеров
+    """
+    file_directory = os.path.join(work_directory, 'certificates')
+    names_list = create_certificates_directory(file_directory, options.files)
+    parameters = {'files': len(names_list)}
+    results = [BenchmarkResult('certificates_container', parameters, measure(
+        lambda: BankCertificatesContainer(file_directory).certificates_index, options.repeat), len(names_list))]
+    container = BankCertificatesContainer(file_directory)
+    container.certificates_index
+    random_obj = random.Random(0)
+    queries_count = options.queries
+    # Аргументы запросов готовятся заранее, чтобы разбор даты не входил в замер
+    split_names = []
+    for file_name in random_obj.choices(names_list, k=queries_count):
+        bank_code, snils, end_date = file_name.split('.')[:3]
+        start_date = datetime.datetime.strptime(end_date, '%Y%m%d%H%M%S')
+        split_names.append((bank_code, snils, start_date, start_date + datetime.timedelta(days=30)))
+    queries = {
+        'certificates_by_code': lambda x: container.get_certificates_by_code(x[0]),
+        'certificates_by_snils': lambda x: container.get_certificates_by_snils(x[1]),
+        'certificates_by_end_date': lambda x: container.get_certificates_by_end_date(x[2], x[3]),
+    }
+    for query_name, query in queries.items():
+        # Каждый запрос - отдельный замер, чтобы получить распределение задержек
+        timings = []
+        for split_name in split_names:
+            start_time = time.perf_counter()
+            query(split_name)
+            timings.append(time.perf_counter() - start_time)
+        # Память для задержек отдельных запросов не замеряется
+        results.append(BenchmarkResult(query_name, dict(parameters, queries=queries_count), Measurement(timings), 1))
+    return results
+
+
+def benchmark_zip(work_directory: str, options: argparse.Namespace) -> list[BenchmarkResult]:
+    """
+    Замер ZipFile и UnZipFile на архивах из множества маленьких и нескольких больших файлов
+    :param str work_directory: временная директория для данных замера
+    :param argparse.Namespace options: параметры запуска
+    :return: list[BenchmarkResult]: результаты замеров
+    """
+    results = []
+    archive_kinds = (
+        ('small', options.small_members, options.small_member_size),
+        ('huge', options.huge_members, options.huge_member_size),
+    )
+    for kind, members_count, member_size in archive_kinds:
+        source_directory = os.path.join(work_directory, f'source_{kind}')
+        names_list = create_source_files(source_directory, members_count, member_size)
+        files_to_zip = [StoredFile(source_directory, x) for x in names_list]
+        parameters = {'members': members_count, 'member_size': member_size, 'workers': options.workers}
+        total_size = members_count * member_size
+        zip_file = ZipFile(work_directory, f'{kind}.zip', files_to_zip, workers=options.workers)
+        results.append(BenchmarkResult(f'zip_{kind}', parameters,
+                                       measure(lambda: zip_file.make_zip_files(False), options.repeat),
+                                       members_count, total_size))
+        shutil.rmtree(source_directory)
+        # Архив для распаковки создаётся заново стандартным zipfile, чтобы замер не зависел от ZipFile
+        create_archive(os.path.join(work_directory, f'{kind}.zip'), members_count, member_size)
+        unzip_directory = os.path.join(work_directory, f'unzip_{kind}')
+        unzip_file = UnZipFile(work_directory, f'{kind}.zip', unzip_directory)
+
+        def clean_unzip_directory():
+            shutil.rmtree(unzip_directory, ignore_errors=True)
+            os.mkdir(unzip_directory)
+
+        results.append(BenchmarkResult(f'unzip_{kind}', parameters, measure(
+            lambda: unzip_file.make_unzip_files(False, workers=options.workers), options.repeat,
+            clean_unzip_directory), members_count, total_size))
+        shutil.rmtree(unzip_directory)
+        os.remove(os.path.join(work_directory, f'{kind}.zip'))
+    return results
+
+
+def benchmark_zip_stream(work_directory: str, options: argparse.Namespace) -> list[BenchmarkResult]:
+    """
+    Сравнение записи больших файлов через zipfile.ZipFile.write и потоковой записи частями chunk_size
+    :param str work_directory: временная директория для данных замера
+    :param argparse.Namespace options: параметры запуска
+    :return: list[BenchmarkResult]: результаты замеров
+    """
+    source_directory = os.path.join(work_directory, 'source_huge')
+    names_list = create_source_files(source_directory, options.huge_members, options.huge_member_size)
+    files_to_zip = [StoredFile(source_directory, x) for x in names_list]
+    total_size = options.huge_members * options.huge_member_size
+    results = []
+    for chunk_size in (None, options.chunk_size):
+        parameters = {'members': options.huge_members, 'member_size': options.huge_member_size,
+                      'chunk_size': chunk_size}
+        zip_file = ZipFile(work_directory, 'huge.zip', files_to_zip, chunk_size=chunk_size)
+        results.append(BenchmarkResult('zip_huge_write' if chunk_size is None else 'zip_huge_stream', parameters,
+                                       measure(lambda: zip_file.make_zip_files(False), options.repeat),
+                                       options.huge_members, total_size))
+    return results
+
+
+BENCHMARK_CASES = {
+    'container_scan': benchmark_container_scan,
+    'unlocked_files': benchmark_unlocked_files,
+    'certificates_container': benchmark_certificates_container,
+    'zip': benchmark_zip,
+    'zip_stream': benchmark_zip_stream,
+}
+
+
+def run_case(case_name: str, options: argparse.Namespace) -> list[dict]:
+    """
+    Выполнить замеры одного набора во временной директории
+    :param str case_name: имя набора из BENCHMARK_CASES
+    :param argparse.Namespace options: параметры запуска
+    :return: list[dict]: результаты замеров
+    """
+    work_directory = tempfile.mkdtemp(prefix=f'benchmark_{case_name}_', dir=options.work_dir)
+    try:
+        return [x.to_dict() for x in BENCHMARK_CASES[case_name](work_directory, options)]
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+def run_case_isolated(case_name: str, options: argparse.Namespace) -> list[dict]:
+    """
+    Выполнить набор замеров в отдельном процессе, чтобы данные набора не влияли на следующие наборы
+    :param str case_name: имя набора из BENCHMARK_CASES
+    :param argparse.Namespace options: параметры запуска
+    :return: list[dict]: результаты замеров
+    """
+    return run_in_child(lambda: run_case(case_name, options), options.timeout)
+
+
+def get_commit() -> Optional[str]:
+    """
+    Получить текущий коммит репозитория
+    :return: str: хэш коммита или None, если git недоступен
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current_results: list[dict], previous_results: list[dict]) -> list[str]:
+    """
+    Сравнить результаты с результатами прошлого запуска по медиане времени
+    :param list[dict] current_results: текущие результаты
+    :param list[dict] previous_results: прошлые результаты
+    :return: list[str]: строки сравнения
+    """
+    previous_by_key = {(x['name'], json.dumps(x['parameters'], sort_keys=True)): x for x in previous_results}
+    lines = []
+    for result in current_results:
+        previous = previous_by_key.get((result['name'], json.dumps(result['parameters'], sort_keys=True)))
+        if previous is not None and result['p50_s']:
+            lines.append(f'{result["name"]}: p50 {previous["p50_s"]:.6f} с -> {result["p50_s"]:.6f} с '
+                         f'(x{previous["p50_s"] / result["p50_s"]:.2f})')
+    return lines
+
+
+def parse_size(value: str) -> int:
+    """
+    Разобрать размер с суффиксом K, M или G
+    :param str value: размер, например '64M'
+    :return: int: размер в байтах
+    """
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    suffix = value[-1:].upper()
+    if suffix in multipliers:
+        return int(value[:-1]) * multipliers[suffix]
+    return int(value)
+
+
+def main(arguments: Optional[list[str]] = None) -> dict:
+    """
+    Запустить набор замеров и записать результаты в JSON
+    :param list[str] arguments: аргументы командной строки
+    :return: dict: результаты запуска
+    """
+    parser = argparse.ArgumentParser(description='Замеры производительности контейнеров файлов и архивации')
+    parser.add_argument('--cases', nargs='+', choices=sorted(BENCHMARK_CASES), default=list(BENCHMARK_CASES))
+    parser.add_argument('--files', type=int, default=10000, help='количество файлов в директории (10k - 1M)')
+    parser.add_argument('--locked-share', type=float, default=0.1, help='доля заблокированных файлов')
+    parser.add_argument('--queries', type=int, default=1000, help='количество запросов к контейнеру сертификатов')
+    parser.add_argument('--small-members', type=int, default=2000)
+    parser.add_argument('--small-member-size', type=parse_size, default='4K')
+    parser.add_argument('--huge-members', type=int, default=2)
+    parser.add_argument('--huge-member-size', type=parse_size, default='64M')
+    parser.add_argument('--chunk-size', type=parse_size, default='1M', help='размер части потоковой записи')
+    parser.add_argument('--workers', type=int, default=1, help='потоки и процессы ZipFile и UnZipFile')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=None, help='наибольшее время набора замеров в секундах')
+    parser.add_argument('--work-dir', default=None, help='директория для временных данных')
+    parser.add_argument('--output', default=None, help='файл для записи результатов в JSON')
+    parser.add_argument('--compare', default=None, help='файл результатов прошлого запуска для сравнения')
+    options = parser.parse_args(arguments)
+    results = []
+    for case_name in options.cases:
+        results.extend(run_case_isolated(case_name, options))
+    run_results = {
+        'commit': get_commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {x: y for x, y in vars(options).items() if x not in ('output', 'compare', 'work_dir')},
+        'results': results,
+    }
+    for result in results:
+        memory = '' if result['peak_rss_kb'] is None else (
+            f', пиковый RSS {result["peak_rss_kb"]} КБ (+{result["peak_rss_delta_kb"]} КБ)')
+        print(f'{result["name"]}: p50 {result["p50_s"]:.6f} с, p99 {result["p99_s"]:.6f} с, '
+              f'{result["items_per_s"] or 0:.0f} эл/с{memory}')
+    if options.compare is not None:
+        with open(options.compare, encoding='utf-8') as previous_file:
+            print('\n'.join(compare_results(results, json.load(previous_file)['results'])))
+    if options.output is not None:
+        with open(options.output, 'w', encoding='utf-8') as output_file:
+            json.dump(run_results, output_file, ensure_ascii=False, indent=2)
+    return run_results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import collections
+import time
+
+from benchmarks.certificate_name_parse_benchmark import generate_certificates_names
+from classes.bank_certificates_classes import BankCertificateFile, certificate_name_parser
+from classes.certificate_columns_classes import CertificateColumns, numpy
+
+
+def aggregate_objects(certificates: list[BankCertificateFile]) -> (dict, dict):
+    """
+    Посчитать сертификаты по банкам и по месяцам срока окончания циклом по объектам
+    :param list[BankCertificateFile] certificates: сертификаты
+    :return: (dict, dict): количество по кодам банков и по месяцам
+    """
+    by_bank = collections.Counter()
+    by_month = collections.Counter()
+    for certificate in certificates:
+        if certificate.is_valid:
+            by_bank[certificate.bank_code] += 1
+            by_month[f'{certificate.end_date.year:04d}-{certificate.end_date.month:02d}'] += 1
+    return dict(sorted(by_bank.items())), dict(sorted(by_month.items()))
+
+
+def measure(function, *args) -> (float, object):
+    """
+    Измерить время выполнения функции
+    :param function: функция
+    :return: (float, object): время в секундах и результат функции
+    """
+    start_time = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start_time, result
+
+
+def main(names_count: int = 500000) -> None:
+    """
+    Сравнить разбор имён и агрегаты по объектам сертификатов и по столбцам
+    :param int names_count: количество имён
+    """
+    names_list = generate_certificates_names(names_count)
+    print(f'numpy: {"установлен" if numpy is not None else "не установлен"}')
+    parse_time, _ = measure(certificate_name_parser.parse_many, names_list)
+    columns_parse_time, columns = measure(CertificateColumns.from_names, names_list)
+    print(f'{names_count} имён: CertificateNameParser {parse_time:.3f} с; '
+          f'CertificateColumns.from_names {columns_parse_time:.3f} с')
+    certificates = [BankCertificateFile('', x) for x in names_list]
+    objects_time, objects_result = measure(aggregate_objects, certificates)
+    export_time, columns = measure(CertificateColumns.from_certificates, certificates)
+    columns_time, columns_result = measure(lambda: (columns.count_by_bank(), columns.get_expiry_histogram('M')))
+    assert objects_result == columns_result
+    print(f'Агрегаты циклом по объектам {objects_time:.3f} с; '
+          f'выгрузка в столбцы {export_time:.3f} с, агрегаты по столбцам {columns_time:.3f} с')
+
+
+if __name__ == '__main__':
+    main()
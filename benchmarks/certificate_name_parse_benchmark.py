@@ -0,0 +1,79 @@
+import datetime
+import random
+import timeit
+
+from classes.bank_certificates_classes import CertificateNameParser
+
+
+def legacy_certificate_name_parse(file_name: str) -> (bool, str):
+    """
+    Разбор имени сертификата через strptime и assert - в том виде, в котором он был до CertificateNameParser.
+    :param str file_name: имя файла с расширением
+    :return: (bool, str): возврат True или False и строки с описанием
+    """
+    splited_file_name = file_name.split('.')
+    if len(splited_file_name) == 4:
+        bank_code = splited_file_name[0]
+        snils = splited_file_name[1]
+        if len(splited_file_name[2]) == 14:
+            try:
+                end_date = datetime.datetime.strptime(splited_file_name[2], '%Y%m%d%H%M%S')
+            except ValueError:
+                return False, f'Неверный формат даты'
+        else:
+            return False, f'Неверный формат даты'
+        certificate_condition = splited_file_name[3]
+        try:
+            assert len(bank_code) == 4, f'Неверный код банка'
+            assert len(snils) == 11, f'Неверный СНИЛС'
+            assert certificate_condition in ('cer', 'del'), f'Файл не является сертификатом'
+        except AssertionError as a:
+            return False, str(a)
+        return True, (
+            ' Код банка: {}; СНИЛС: {}; Срок окончания сертификата: {}; Состояние сертификата: {}'.
+            format(bank_code, snils, end_date, certificate_condition))
+    else:
+        return False, f'{file_name} - Имя файла не соответствует имени сертификата'
+
+
+def generate_certificates_names(names_count: int, invalid_share: float = 0.1, seed: int = 0) -> list[str]:
+    """
+    Сгенерировать имена сертификатов
+    :param int names_count: количество имён
+    :param float invalid_share: доля невалидных имён
+    :param int seed: зерно генератора случайных чисел
+    :return: list[str]: список имён
+    """
+    random_obj = random.Random(seed)
+    names_list = []
+    for _ in range(names_count):
+        end_date = datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=random_obj.randrange(10 ** 9))
+        condition = random_obj.choice(('cer', 'del'))
+        if random_obj.random() < invalid_share:
+            condition = random_obj.choice(('zzz', 'txt'))
+        names_list.append(f'{random_obj.randrange(10000):04d}.{random_obj.randrange(10 ** 11):011d}.'
+                          f'{end_date:%Y%m%d%H%M%S}.{condition}')
+    return names_list
+
+
+def main(names_count: int = 100000, repeat: int = 5) -> None:
+    """
+    Сравнить скорость разбора имён сертификатов старым и новым способом
+    :param int names_count: количество имён
+    :param int repeat: количество повторов, берётся лучшее время
+    """
+    names_list = generate_certificates_names(names_count)
+    parser = CertificateNameParser()
+    parsed_list = parser.parse_many(names_list)
+    # Результаты должны совпадать со старым разбором
+    for name, parsed_name in zip(names_list, parsed_list):
+        assert legacy_certificate_name_parse(name) == (parsed_name.is_valid, parsed_name.error_str), name
+    legacy_time = min(timeit.repeat(lambda: [legacy_certificate_name_parse(x) for x in names_list],
+                                    number=1, repeat=repeat))
+    parser_time = min(timeit.repeat(lambda: parser.parse_many(names_list), number=1, repeat=repeat))
+    print(f'strptime: {legacy_time:.3f} с; CertificateNameParser: {parser_time:.3f} с; '
+          f'ускорение x{legacy_time / parser_time:.2f} на {names_count} именах')
+
+
+if __name__ == '__main__':
+    main()
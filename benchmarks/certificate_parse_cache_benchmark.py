@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.certificate_name_parse_benchmark import generate_certificates_names
+from classes.bank_certificates_classes import BankCertificatesContainer
+
+
+def measure_container_startup(file_directory: str, cache_path: str) -> (float, dict):
+    """
+    Измерить время создания контейнера сертификатов
+    :param str file_directory: путь до папки с сертификатами
+    :param str cache_path: путь до файла кэша
+    :return: (float, dict): время в секундах и статистика кэша
+    """
+    start_time = time.perf_counter()
+    container = BankCertificatesContainer(file_directory, parse_cache_path=cache_path)
+    elapsed = time.perf_counter() - start_time
+    container.parse_cache.close()
+    return elapsed, container.parse_cache_stats
+
+
+def main(files_count: int = 50000) -> None:
+    """
+    Сравнить запуск контейнера без кэша разбора имён и с заполненным кэшем
+    :param int files_count: количество файлов сертификатов
+    """
+    temporary_folder = tempfile.mkdtemp()
+    try:
+        file_directory = os.path.join(temporary_folder, 'certificates')
+        os.mkdir(file_directory)
+        for file_name in generate_certificates_names(files_count):
+            open(os.path.join(file_directory, file_name), 'w').close()
+        # Время изменения папки в прошлом, чтобы кэш запомнил полный список имён
+        os.utime(file_directory, (0, 0))
+        cache_path = os.path.join(temporary_folder, 'cache.sqlite')
+        cold_time, cold_stats = measure_container_startup(file_directory, cache_path)
+        warm_time, warm_stats = measure_container_startup(file_directory, cache_path)
+        print(f'{files_count} файлов: холодный запуск {cold_time:.3f} с {cold_stats}; '
+              f'запуск с кэшем {warm_time:.3f} с {warm_stats}')
+    finally:
+        shutil.rmtree(temporary_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import random
+import zipfile
+
+from benchmarks.certificate_name_parse_benchmark import generate_certificates_names
+
+
+def create_certificates_directory(file_directory: str, files_count: int, invalid_share: float = 0.1,
+                                  seed: int = 0) -> list[str]:
+    """
+    Создать директорию с пустыми файлами, названными как сертификаты
+    :param str file_directory: путь до директории, создаётся если её нет
+    :param int files_count: количество файлов
+    :param float invalid_share: доля файлов с невалидными именами
+    :param int seed: зерно генератора случайных чисел
+    :return: list[str]: имена созданных файлов
+    """
+    os.makedirs(file_directory, exist_ok=True)
+    # Генератор может повторить имя, повторы не создают новых файлов
+    names_list = list(dict.fromkeys(generate_certificates_names(files_count, invalid_share, seed)))
+    for file_name in names_list:
+        open(os.path.join(file_directory, file_name), 'wb').close()
+    return names_list
+
+
+def create_mixed_locked_files(file_directory: str, files_count: int, locked_share: float = 0.1,
+                              seed: int = 0) -> list:
+    """
+    Создать директорию с файлами, часть из которых открыта на запись (заблокирована)
+    :param str file_directory: путь до директории, создаётся если её нет
+    :param int files_count: количество файлов
+    :param float locked_share: доля заблокированных файлов
+    :param int seed: зерно генератора случайных чисел
+    :return: list: открытые на запись файлы. Файлы остаются заблокированными, пока их не закроют
+    """
+    os.makedirs(file_directory, exist_ok=True)
+    random_obj = random.Random(seed)
+    locked_files = []
+    for file_number in range(files_count):
+        file_path = os.path.join(file_directory, f'file_{file_number:07d}.txt')
+        if random_obj.random() < locked_share:
+            locked_file = open(file_path, 'wb')
+            locked_file.write(b'locked')
+            locked_file.flush()
+            locked_files.append(locked_file)
+        else:
+            with open(file_path, 'wb') as unlocked_file:
+                unlocked_file.write(b'unlocked')
+    return locked_files
+
+
+def generate_file_part(random_obj: random.Random, part_size: int) -> bytes:
+    """
+    Сгенерировать часть содержимого файла: половина случайная, половина хорошо сжимается
+    :param random.Random random_obj: генератор случайных чисел
+    :param int part_size: размер части в байтах
+    :return: bytes: содержимое части
+    """
+    random_size = part_size // 2
+    compressible_size = part_size - random_size
+    return random_obj.randbytes(random_size) + (b'certificate' * (compressible_size // 11 + 1))[:compressible_size]
+
+
+def write_generated_file(target_file, file_size: int, random_obj: random.Random) -> None:
+    """
+    Записать сгенерированное содержимое частями по мегабайту
+    :param target_file: файл, открытый на запись
+    :param int file_size: размер содержимого в байтах
+    :param random.Random random_obj: генератор случайных чисел
+    """
+    left_size = file_size
+    while left_size > 0:
+        part_size = min(1024 * 1024, left_size)
+        target_file.write(generate_file_part(random_obj, part_size))
+        left_size -= part_size
+
+
+def create_source_files(file_directory: str, files_count: int, file_size: int, seed: int = 0) -> list[str]:
+    """
+    Создать файлы для архивации с содержимым generate_file_part
+    :param str file_directory: путь до директории, создаётся если её нет
+    :param int files_count: количество файлов
+    :param int file_size: размер каждого файла в байтах
+    :param int seed: зерно генератора случайных чисел
+    :return: list[str]: имена созданных файлов
+    """
+    os.makedirs(file_directory, exist_ok=True)
+    random_obj = random.Random(seed)
+    names_list = []
+    for file_number in range(files_count):
+        file_name = f'member_{file_number:07d}.bin'
+        with open(os.path.join(file_directory, file_name), 'wb') as source_file:
+            write_generated_file(source_file, file_size, random_obj)
+        names_list.append(file_name)
+    return names_list
+
+
+def create_archive(archive_full_path: str, members_count: int, member_size: int, seed: int = 0) -> None:
+    """
+    Создать архив с заданным количеством файлов заданного размера
+    :param str archive_full_path: полный путь архива
+    :param int members_count: количество файлов в архиве
+    :param int member_size: размер каждого файла в байтах
+    :param int seed: зерно генератора случайных чисел
+    """
+    random_obj = random.Random(seed)
+    with zipfile.ZipFile(archive_full_path, 'w', compression=zipfile.ZIP_DEFLATED) as created_zip:
+        for member_number in range(members_count):
+            with created_zip.open(f'member_{member_number:07d}.bin', 'w', force_zip64=True) as member_file:
+                write_generated_file(member_file, member_size, random_obj)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.data_generators import create_archive
+from classes.zip_unzip_file_classes import UnZipFile, ZipFile, ZipRepacker
+
+
+def measure_unzip_zip(archive_folder: str, work_folder: str) -> float:
+    """
+    Измерить перенос файлов архива в новый архив через распаковку на диск
+    :param str archive_folder: папка с исходным архивом source.zip
+    :param str work_folder: папка для распакованных файлов и нового архива
+    :return: float: время в секундах
+    """
+    start_time = time.perf_counter()
+    is_error, unzipped_files, message = UnZipFile(archive_folder, 'source.zip', work_folder).make_unzip_files(False)
+    assert not is_error, message
+    is_error, message = ZipFile(work_folder, 'target.zip', unzipped_files).make_zip_files(True)
+    assert not is_error, message
+    return time.perf_counter() - start_time
+
+
+def measure_repack(archive_folder: str, work_folder: str) -> float:
+    """
+    Измерить перенос файлов архива в новый архив через ZipRepacker
+    :param str archive_folder: папка с исходным архивом source.zip
+    :param str work_folder: папка для нового архива
+    :return: float: время в секундах
+    """
+    start_time = time.perf_counter()
+    is_error, message = ZipRepacker(archive_folder, 'source.zip', work_folder,
+                                    lambda x: 'target.zip').make_repack_files(False)
+    assert not is_error, message
+    return time.perf_counter() - start_time
+
+
+def main(members_count: int = 200, member_size: int = 1024 * 1024) -> None:
+    """
+    Сравнить перенос файлов между архивами через диск и без распаковки
+    :param int members_count: количество файлов в архиве
+    :param int member_size: размер каждого файла в байтах
+    """
+    temporary_folder = tempfile.mkdtemp()
+    try:
+        create_archive(os.path.join(temporary_folder, 'source.zip'), members_count, member_size)
+        for name, function in (('Распаковка и архивация', measure_unzip_zip), ('ZipRepacker', measure_repack)):
+            work_folder = os.path.join(temporary_folder, name)
+            os.mkdir(work_folder)
+            print(f'{name}: {function(temporary_folder, work_folder):.3f} с '
+                  f'({members_count} файлов по {member_size} байт)')
+    finally:
+        shutil.rmtree(temporary_folder)
+
+
+if __name__ == '__main__':
+    main()
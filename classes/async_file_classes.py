@@ -0,0 +1,223 @@
+import asyncio
+import atexit
+import concurrent.futures
+import functools
+import os
+import threading
+import typing
+import weakref
+
+from typing import List, Optional
+
+from classes.stored_file_classes import StoredFile, StoredFileContainer, FilesChangeSet
+from classes.zip_unzip_file_classes import ZipFile, UnZipFile
+
+
+class AsyncFilesExecutor:
+    """
+    Класс, предназначенный для выполнения блокирующих операций с файлами из asyncio.
+    Операции выполняются в ограниченном пуле потоков, а количество одновременно
+    обрабатываемых архивов ограничивается семафором. Пул можно использовать из нескольких
+    циклов событий: у каждого цикла свой семафор, поэтому max_concurrent действует в пределах цикла.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrent: Optional[int] = None):
+        """
+        Класс конструктор.
+        :param int max_workers: количество потоков пула, по умолчанию - количество процессоров
+        :param int max_concurrent: количество одновременно выполняемых операций, по умолчанию - max_workers
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or self.max_workers
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        # asyncio.Semaphore привязывается к циклу событий, поэтому семафоры хранятся по циклам
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        Семафор работающего цикла событий, ограничивающий количество одновременно выполняемых операций.
+        Создаётся при первом обращении из цикла и удаляется вместе с циклом.
+        :return: asyncio.Semaphore: семафор
+        """
+        event_loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(event_loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrent)
+                self._semaphores[event_loop] = semaphore
+        return semaphore
+
+    async def run(self, function: typing.Callable, *args, cancel_event: Optional[threading.Event] = None,
+                  **kwargs):
+        """
+        Выполнить функцию в пуле потоков. При отмене задачи выставляется cancel_event и
+        ожидается завершение функции, чтобы она успела вернуть файлы в исходное состояние.
+        :param function: блокирующая функция
+        :param cancel_event: признак отмены, который проверяет функция
+        :return: результат функции
+        """
+        async with self.semaphore:
+            concurrent_future = self.executor.submit(functools.partial(function, *args, **kwargs))
+            future = asyncio.wrap_future(concurrent_future)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if cancel_event is not None:
+                    cancel_event.set()
+                # Не начавшая выполняться функция просто снимается с очереди пула
+                if not concurrent_future.cancel():
+                    await asyncio.wait([future])
+                raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Остановить пул потоков
+        :param bool wait: ожидать завершения выполняющихся операций
+        """
+        self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+_default_files_executor = None
+_default_files_executor_lock = threading.Lock()
+
+
+def get_default_files_executor() -> AsyncFilesExecutor:
+    """
+    Получить общий для модуля AsyncFilesExecutor с настройками по умолчанию.
+    Пул останавливается при завершении интерпретатора или вызовом shutdown_default_files_executor.
+    :return: AsyncFilesExecutor: пул для операций с файлами
+    """
+    global _default_files_executor
+    with _default_files_executor_lock:
+        if _default_files_executor is None:
+            _default_files_executor = AsyncFilesExecutor()
+        return _default_files_executor
+
+
+def shutdown_default_files_executor(wait: bool = True) -> None:
+    """
+    Остановить общий для модуля AsyncFilesExecutor. Следующий вызов get_default_files_executor создаст новый пул
+    :param bool wait: ожидать завершения выполняющихся операций
+    """
+    global _default_files_executor
+    with _default_files_executor_lock:
+        files_executor = _default_files_executor
+        _default_files_executor = None
+    if files_executor is not None:
+        files_executor.shutdown(wait=wait)
+
+
+atexit.register(shutdown_default_files_executor)
+
+
+class AsyncZipFile:
+    """
+    Компонента, предназначенная для архивации файлов из asyncio. Архивация выполняется ZipFile
+    в пуле AsyncFilesExecutor, при отмене задачи архив возвращается в исходное состояние.
+    """
+
+    def __init__(self, archive_path: str, archive_name: str, files_to_zip: List[StoredFile],
+                 files_executor: Optional[AsyncFilesExecutor] = None, **zip_file_kwargs):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str archive_path: путь, по которому будет создан архив
+        :param str archive_name: имя архива
+        :param list[StoredFile] files_to_zip: список передаваемых экземпляров класса StoredFile
+        :param AsyncFilesExecutor files_executor: пул для выполнения архивации, по умолчанию - общий пул модуля
+        :param zip_file_kwargs: остальные параметры ZipFile (workers, compression_policy, update_mode и т.д.)
+        """
+        self.files_executor = files_executor or get_default_files_executor()
+        self.cancel_event = threading.Event()
+        self.zip_file = ZipFile(archive_path, archive_name, files_to_zip, cancel_event=self.cancel_event,
+                                **zip_file_kwargs)
+
+    async def make_zip_files(self, delete_base_file: bool) -> (bool, str):
+        """
+        Метод, который создает архив аналогично ZipFile.make_zip_files, не блокируя цикл событий
+        :param bool delete_base_file: если True - удаляет базовые файлы
+        :return: (bool, str): возврат True или False и лога с описанием
+        """
+        self.cancel_event.clear()
+        return await self.files_executor.run(self.zip_file.make_zip_files, delete_base_file,
+                                             cancel_event=self.cancel_event)
+
+
+class AsyncUnZipFile:
+    """
+    Компонента, предназначенная для разархивации файлов из asyncio. Распаковка выполняется UnZipFile
+    в пуле AsyncFilesExecutor, при отмене задачи уже распакованные файлы удаляются.
+    """
+
+    def __init__(self, archive_path: str, archive_name: str, path_to_unzip: str,
+                 files_executor: Optional[AsyncFilesExecutor] = None):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str archive_path: путь до архива
+        :param str archive_name: имя архива
+        :param str path_to_unzip: путь, в который надо будет распаковать файлы из архива
+        :param AsyncFilesExecutor files_executor: пул для выполнения распаковки, по умолчанию - общий пул модуля
+        """
+        self.files_executor = files_executor or get_default_files_executor()
+        self.cancel_event = threading.Event()
+        self.unzip_file = UnZipFile(archive_path, archive_name, path_to_unzip, cancel_event=self.cancel_event)
+
+    async def make_unzip_files(self, delete_archive: bool, workers: int = 1,
+                               verify: bool = False) -> (bool, List[StoredFile], str):
+        """
+        Метод, который распаковывает архив аналогично UnZipFile.make_unzip_files, не блокируя цикл событий
+        :param bool delete_archive: если True - удаляет архив
+        :param int workers: количество потоков распаковки
+        :param bool verify: если True - архив проверяется до распаковки
+        :return: (bool, list[StoredFile], str) - возвращает True/False, список объектов класса и строку
+        """
+        self.cancel_event.clear()
+        return await self.files_executor.run(self.unzip_file.make_unzip_files, delete_archive, workers, verify,
+                                             cancel_event=self.cancel_event)
+
+
+async def scan_container(file_directory: str, container_class: typing.Type[StoredFileContainer] = StoredFileContainer,
+                         files_executor: Optional[AsyncFilesExecutor] = None,
+                         **container_kwargs) -> StoredFileContainer:
+    """
+    Функция для создания контейнера файлов (чтения директории) в пуле потоков
+    :param str file_directory: путь до директории
+    :param container_class: класс контейнера, например BankCertificatesContainer
+    :param AsyncFilesExecutor files_executor: пул, по умолчанию - общий пул модуля
+    :param container_kwargs: остальные параметры конструктора контейнера
+    :return: StoredFileContainer: контейнер с прочитанным списком файлов
+    """
+    files_executor = files_executor or get_default_files_executor()
+    return await files_executor.run(container_class, file_directory, **container_kwargs)
+
+
+async def refresh_container(container: StoredFileContainer,
+                            files_executor: Optional[AsyncFilesExecutor] = None) -> FilesChangeSet:
+    """
+    Функция для применения изменений директории к контейнеру в пуле потоков
+    :param StoredFileContainer container: контейнер
+    :param AsyncFilesExecutor files_executor: пул, по умолчанию - общий пул модуля
+    :return: FilesChangeSet: изменения директории
+    """
+    files_executor = files_executor or get_default_files_executor()
+    return await files_executor.run(container.refresh)
+
+
+async def get_unlocked_files(container: StoredFileContainer, snapshot_max_age: float = 0.0,
+                             files_executor: Optional[AsyncFilesExecutor] = None) -> List[StoredFile]:
+    """
+    Функция для получения незаблокированных файлов контейнера в пуле потоков
+    :param StoredFileContainer container: контейнер
+    :param float snapshot_max_age: допустимый возраст снимка открытых файлов
+    :param AsyncFilesExecutor files_executor: пул, по умолчанию - общий пул модуля
+    :return: list[StoredFile]: незаблокированные файлы
+    """
+    files_executor = files_executor or get_default_files_executor()
+    return await files_executor.run(container.get_unlocked_files, snapshot_max_age)
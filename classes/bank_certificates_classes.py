@@ -1,8 +1,125 @@
-from classes.stored_file_classes import StoredFile, StoredFileContainer
+from classes.stored_file_classes import StoredFile, StoredFileContainer, StoredFileFilter, FilesChangeSet
+from classes.directory_scanner_classes import DirectoryTreeScanner
+from classes.certificate_parse_cache_classes import CertificateParseCache
+from classes.metrics_classes import metrics
+from array import array
+import bisect
+import calendar
 import datetime
+import itertools
+import os
+import time
 import typing
 
 
+CERTIFICATE_CONDITIONS = ('cer', 'del')
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+class ParsedCertificateName:
+    """
+    Класс, предназначенный для хранения результата разбора имени сертификата.
+    Поля, до которых разбор не дошёл, равны None.
+    """
+    __slots__ = ('is_valid', 'error_str', 'bank_code', 'snils', 'end_date', 'certificate_condition')
+
+    def __init__(self, is_valid: bool, error_str: str, bank_code: typing.Optional[str] = None,
+                 snils: typing.Optional[str] = None, end_date: typing.Optional[datetime.datetime] = None,
+                 certificate_condition: typing.Optional[str] = None):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param bool is_valid: True если имя соответствует имени сертификата
+        :param str error_str: описание ошибки или описание сертификата
+        :param str bank_code: код банка
+        :param str snils: СНИЛС
+        :param datetime.datetime end_date: срок окончания сертификата
+        :param str certificate_condition: состояние сертификата
+        """
+        self.is_valid = is_valid
+        self.error_str = error_str
+        self.bank_code = bank_code
+        self.snils = snils
+        self.end_date = end_date
+        self.certificate_condition = certificate_condition
+
+
+class CertificateNameParser:
+    """
+    Класс, предназначенный для разбора имён сертификатов вида КОДБ.СНИЛС.ГГГГММДДччммсс.cer|del.
+    Дата разбирается срезами строки с проверкой по календарю, без strptime и исключений.
+    """
+
+    @staticmethod
+    def parse_end_date(date_str: str) -> typing.Optional[datetime.datetime]:
+        """
+        Разобрать срок окончания сертификата
+        :param str date_str: дата в формате ГГГГММДДччммсс
+        :return: datetime.datetime: дата или None, если формат неверный
+        """
+        if len(date_str) != 14:
+            return None
+        if not (date_str.isascii() and date_str.isdigit()):
+            # Редкие случаи (пробелы, не ASCII цифры) разбираются как раньше, чтобы результат не изменился
+            try:
+                return datetime.datetime.strptime(date_str, '%Y%m%d%H%M%S')
+            except ValueError:
+                return None
+        date_value, second = divmod(int(date_str), 100)
+        date_value, minute = divmod(date_value, 100)
+        date_value, hour = divmod(date_value, 100)
+        date_value, day = divmod(date_value, 100)
+        year, month = divmod(date_value, 100)
+        if year < 1 or not 1 <= month <= 12 or hour > 23 or minute > 59 or second > 59:
+            return None
+        if not 1 <= day <= _DAYS_IN_MONTH[month] and not (month == 2 and day == 29 and calendar.isleap(year)):
+            return None
+        return datetime.datetime(year, month, day, hour, minute, second)
+
+    def parse(self, file_name: str) -> ParsedCertificateName:
+        """
+        Разобрать имя сертификата
+        :param str file_name: имя файла с расширением
+        :return: ParsedCertificateName: результат разбора
+        """
+        splited_file_name = file_name.split('.')
+        if len(splited_file_name) != 4:
+            return ParsedCertificateName(False, f'{file_name} - Имя файла не соответствует имени сертификата')
+        bank_code, snils, date_str, certificate_condition = splited_file_name
+        end_date = self.parse_end_date(date_str)
+        if end_date is None:
+            return ParsedCertificateName(False, 'Неверный формат даты', bank_code, snils)
+        if len(bank_code) != 4:
+            error_str = 'Неверный код банка'
+        elif len(snils) != 11:
+            error_str = 'Неверный СНИЛС'
+        elif certificate_condition not in CERTIFICATE_CONDITIONS:
+            error_str = 'Файл не является сертификатом'
+        else:
+            if date_str.isascii() and date_str.isdigit():
+                # Совпадает с str(end_date), но без форматирования datetime
+                end_date_str = (f'{date_str[0:4]}-{date_str[4:6]}-{date_str[6:8]} '
+                                f'{date_str[8:10]}:{date_str[10:12]}:{date_str[12:14]}')
+            else:
+                end_date_str = str(end_date)
+            return ParsedCertificateName(
+                True, ' Код банка: {}; СНИЛС: {}; Срок окончания сертификата: {}; Состояние сертификата: {}'.
+                format(bank_code, snils, end_date_str, certificate_condition),
+                bank_code, snils, end_date, certificate_condition)
+        return ParsedCertificateName(False, error_str, bank_code, snils, end_date, certificate_condition)
+
+    def parse_many(self, files_names: typing.Iterable[str]) -> list[ParsedCertificateName]:
+        """
+        Разобрать имена сертификатов, например, весь список файлов директории
+        :param files_names: имена файлов
+        :return: list[ParsedCertificateName]: результаты разбора в порядке имён
+        """
+        parse = self.parse
+        return [parse(x) for x in files_names]
+
+
+certificate_name_parser = CertificateNameParser()
+
+
 class BankCertificateFile(StoredFile):
     """
     Класс, предназанченный для хранения информации о сертификате. Родительский класс StoredFile.
@@ -14,15 +131,21 @@ class BankCertificateFile(StoredFile):
     is_valid: bool
     pin: str  # может устанавливаться дополнительно
 
-    def __init__(self, file_path: str, file_name: str):
+    def __init__(self, file_path: str, file_name: str, file_stat: typing.Optional[os.stat_result] = None,
+                 parsed_name: typing.Optional[ParsedCertificateName] = None):
         """
         Конструктор класса. При создании передаются хранимые атрибуты.
         return вызванного метода передается двум атрибутам.
         :param str file_path: путь файла, без имени файла.
         :param str file_name: имя файла с расширением.
+        :param os.stat_result file_stat: уже полученная информация о файле.
+        :param ParsedCertificateName parsed_name: уже полученный результат разбора имени (например, из кэша).
         """
-        super().__init__(file_path, file_name)
-        self.is_valid, self.error_str = self.certificate_name_parse()
+        super().__init__(file_path, file_name, file_stat)
+        if parsed_name is None:
+            self.is_valid, self.error_str = self.certificate_name_parse()
+        else:
+            self.is_valid, self.error_str = self.apply_parsed_name(parsed_name)
 
     def certificate_name_parse(self) -> (bool, str):
         """
@@ -30,29 +153,403 @@ class BankCertificateFile(StoredFile):
         передачи в атрибуты нужных параметров.
         :return: (bool, str): возврат True или False и строки с описанием
         """
-        splited_file_name = self.file_name.split('.')
-        if len(splited_file_name) == 4:
-            self.bank_code = splited_file_name[0]
-            self.snils = splited_file_name[1]
-            if len(splited_file_name[2]) == 14:
-                try:
-                    self.end_date = datetime.datetime.strptime(splited_file_name[2], '%Y%m%d%H%M%S')
-                except ValueError:
-                    return False, f'Неверный формат даты'
-            else:
-                return False, f'Неверный формат даты'
-            self.certificate_condition = splited_file_name[3]
-            try:
-                assert len(self.bank_code) == 4, f'Неверный код банка'
-                assert len(self.snils) == 11, f'Неверный СНИЛС'
-                assert self.certificate_condition in ('cer', 'del'), f'Файл не является сертификатом'
-            except AssertionError as a:
-                return False, str(a)
-            return True, (
-                ' Код банка: {}; СНИЛС: {}; Срок окончания сертификата: {}; Состояние сертификата: {}'.
-                format(self.bank_code, self.snils, self.end_date, self.certificate_condition))
-        else:
-            return False, f'{self.file_name} - Имя файла не соответствует имени сертификата'
+        return self.apply_parsed_name(certificate_name_parser.parse(self.file_name))
+
+    def apply_parsed_name(self, parsed_name: ParsedCertificateName) -> (bool, str):
+        """
+        Передать в атрибуты результат разбора имени. Не разобранные поля не устанавливаются.
+        :param ParsedCertificateName parsed_name: результат разбора имени
+        :return: (bool, str): возврат True или False и строки с описанием
+        """
+        if parsed_name.bank_code is not None:
+            self.bank_code = parsed_name.bank_code
+            self.snils = parsed_name.snils
+        if parsed_name.end_date is not None:
+            self.end_date = parsed_name.end_date
+            self.certificate_condition = parsed_name.certificate_condition
+        return parsed_name.is_valid, parsed_name.error_str
+
+
+def date_to_seconds(date_value: datetime.datetime) -> int:
+    """
+    Перевести дату в количество секунд от 0001-01-01 (не зависит от часового пояса).
+    :param datetime.datetime date_value: дата
+    :return: int: количество секунд
+    """
+    return date_value.toordinal() * 86400 + date_value.hour * 3600 + date_value.minute * 60 + date_value.second
+
+
+class BankCertificatesIndex:
+    """
+    Класс, предназначенный для быстрого поиска сертификатов по коду банка, СНИЛС и сроку окончания.
+    Данные хранятся по столбцам: сертификат определяется номером в списке certificates,
+    индексы хранят номера в array, признаки состояния - в bytearray. Удалённые записи помечаются,
+    а когда их становится больше compact_ratio от действующих - индекс перестраивается без них.
+    """
+    __slots__ = ('certificates', '_positions', '_states', '_by_bank_code', '_by_snils',
+                 '_end_dates', '_end_date_positions', '_removed_count')
+
+    STATE_INVALID = 0
+    STATE_VALID = 1
+    STATE_REMOVED = 2
+    # Доля удалённых записей от действующих, после которой индекс перестраивается,
+    # и минимальное количество удалённых записей, чтобы маленький индекс не перестраивался постоянно
+    compact_ratio = 0.5
+    compact_min_removed = 1024
+
+    def __init__(self, certificates: typing.Iterable[BankCertificateFile] = ()):
+        """
+        Класс конструктор. Строит индекс по переданным сертификатам.
+        :param certificates: сертификаты для индексации
+        """
+        self.certificates = []
+        self._positions = {}
+        self._states = bytearray()
+        self._by_bank_code = {}
+        self._by_snils = {}
+        self._end_dates = array('q')
+        self._end_date_positions = array('I')
+        self._removed_count = 0
+        end_date_pairs = []
+        for certificate in certificates:
+            position = self._append(certificate)
+            end_date = getattr(certificate, 'end_date', None)
+            if end_date is not None:
+                end_date_pairs.append((date_to_seconds(end_date), position))
+        # При построении индекса сортировка одна, без вставок по одному элементу
+        end_date_pairs.sort()
+        self._end_dates.extend(x[0] for x in end_date_pairs)
+        self._end_date_positions.extend(x[1] for x in end_date_pairs)
+
+    def __len__(self) -> int:
+        """
+        Количество проиндексированных сертификатов, без удалённых
+        :return: int: количество сертификатов
+        """
+        return len(self._positions)
+
+    def _append(self, certificate: BankCertificateFile) -> int:
+        """
+        Добавить сертификат в столбцы и индексы по коду банка и СНИЛС
+        :param BankCertificateFile certificate: сертификат
+        :return: int: номер сертификата
+        """
+        position = len(self.certificates)
+        self.certificates.append(certificate)
+        self._positions[certificate.full_file_name] = position
+        self._states.append(self.STATE_VALID if certificate.is_valid else self.STATE_INVALID)
+        bank_code = getattr(certificate, 'bank_code', None)
+        if bank_code is not None:
+            self._by_bank_code.setdefault(bank_code, array('I')).append(position)
+        snils = getattr(certificate, 'snils', None)
+        if snils is not None:
+            self._by_snils.setdefault(snils, array('I')).append(position)
+        return position
+
+    def add(self, certificate: BankCertificateFile) -> None:
+        """
+        Добавить сертификат в индекс. Если сертификат с таким путём уже есть - он заменяется.
+        :param BankCertificateFile certificate: сертификат
+        """
+        self.remove(certificate.full_file_name)
+        position = self._append(certificate)
+        end_date = getattr(certificate, 'end_date', None)
+        if end_date is not None:
+            end_date_seconds = date_to_seconds(end_date)
+            insert_position = bisect.bisect_right(self._end_dates, end_date_seconds)
+            self._end_dates.insert(insert_position, end_date_seconds)
+            self._end_date_positions.insert(insert_position, position)
+
+    def remove(self, full_file_name: str) -> bool:
+        """
+        Удалить сертификат из индекса. Запись помечается удалённой и пропускается при поиске.
+        :param str full_file_name: полный путь файла сертификата
+        :return: bool: True если сертификат был в индексе
+        """
+        position = self._positions.pop(full_file_name, None)
+        if position is None:
+            return False
+        self._states[position] = self.STATE_REMOVED
+        self._removed_count += 1
+        if self._removed_count >= max(self.compact_min_removed, len(self._positions) * self.compact_ratio):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """
+        Перестроить индекс без удалённых записей. Порядок действующих сертификатов сохраняется
+        """
+        certificates = self.certificates
+        self.__init__(certificates[x] for x in sorted(self._positions.values()))
+
+    def _select(self, positions: typing.Iterable[int], valid_only: bool) -> list[BankCertificateFile]:
+        """
+        Получить сертификаты по номерам, пропуская удалённые и, при необходимости, невалидные
+        :param positions: номера сертификатов
+        :param bool valid_only: True если нужны только валидные сертификаты
+        :return: list[BankCertificateFile]: список сертификатов
+        """
+        states = self._states
+        certificates = self.certificates
+        if valid_only:
+            return [certificates[x] for x in positions if states[x] == self.STATE_VALID]
+        return [certificates[x] for x in positions if states[x] != self.STATE_REMOVED]
+
+    def get_by_bank_code(self, bank_code: str, valid_only: bool = True) -> list[BankCertificateFile]:
+        """
+        Получить сертификаты банка
+        :param str bank_code: код банка
+        :param bool valid_only: True если нужны только валидные сертификаты
+        :return: list[BankCertificateFile]: список сертификатов
+        """
+        return self._select(self._by_bank_code.get(bank_code, ()), valid_only)
+
+    def get_by_snils(self, snils: str, valid_only: bool = True) -> list[BankCertificateFile]:
+        """
+        Получить сертификаты по СНИЛС
+        :param str snils: СНИЛС
+        :param bool valid_only: True если нужны только валидные сертификаты
+        :return: list[BankCertificateFile]: список сертификатов
+        """
+        return self._select(self._by_snils.get(snils, ()), valid_only)
+
+    def get_by_end_date(self, start: typing.Optional[datetime.datetime] = None,
+                        end: typing.Optional[datetime.datetime] = None,
+                        valid_only: bool = True) -> list[BankCertificateFile]:
+        """
+        Получить сертификаты со сроком окончания в полуинтервале [start, end), по возрастанию срока
+        :param datetime.datetime start: начало интервала, None - без ограничения
+        :param datetime.datetime end: конец интервала (не включается), None - без ограничения
+        :param bool valid_only: True если нужны только валидные сертификаты
+        :return: list[BankCertificateFile]: список сертификатов
+        """
+        low = 0 if start is None else bisect.bisect_left(self._end_dates, date_to_seconds(start))
+        high = len(self._end_dates) if end is None else bisect.bisect_left(self._end_dates, date_to_seconds(end))
+        return self._select(self._end_date_positions[low:high], valid_only)
+
+    def get_bank_codes(self) -> list[str]:
+        """
+        Получить коды банков, по которым есть сертификаты
+        :return: list[str]: список кодов банков
+        """
+        return [x for x, positions in self._by_bank_code.items()
+                if any(self._states[y] != self.STATE_REMOVED for y in positions)]
+
+
+class CertificateExpiryScheduler:
+    """
+    Класс, предназначенный для отслеживания сроков окончания действующих сертификатов.
+    Действующий сертификат - валидный файл в состоянии 'cer', для которого нет файла 'del'
+    с тем же кодом банка, СНИЛС и сроком окончания. Сроки действующих сертификатов хранятся
+    в отсортированном массиве: границы интервала сроков находятся двоичным поиском за O(log n),
+    далее сертификаты интервала обходятся по порядку. Отбор по коду банка выполняется тем же обходом,
+    то есть линейно от количества сертификатов всех банков в интервале.
+    Построение расписания - одна сортировка, O(n log n), а добавление и удаление одного сертификата
+    сдвигает массив и занимает O(n).
+    """
+    __slots__ = ('last_check', '_end_dates', '_names', '_active', '_cer_names_by_key', '_cer_keys', '_del_keys',
+                 '_del_counts')
+
+    def __init__(self, certificates: typing.Iterable[BankCertificateFile] = (),
+                 last_check: typing.Optional[datetime.datetime] = None):
+        """
+        Класс конструктор. Строит расписание по переданным сертификатам.
+        :param certificates: сертификаты в любом состоянии
+        :param datetime.datetime last_check: время прошлой проверки для get_expired_since_last_check
+        """
+        self.last_check = last_check
+        self._end_dates = array('q')
+        self._names = []
+        self._active = {}
+        self._cer_names_by_key = {}
+        self._cer_keys = {}
+        self._del_keys = {}
+        self._del_counts = {}
+        for certificate in certificates:
+            self._register(certificate)
+        # При построении сортировка одна, без вставок по одному элементу
+        active_pairs = sorted((date_to_seconds(x.end_date), y) for y, x in self._active.items())
+        self._end_dates.extend(x[0] for x in active_pairs)
+        self._names.extend(x[1] for x in active_pairs)
+
+    def __len__(self) -> int:
+        """
+        Количество действующих сертификатов
+        :return: int: количество сертификатов
+        """
+        return len(self._active)
+
+    @staticmethod
+    def _get_key(certificate: BankCertificateFile) -> typing.Optional[tuple]:
+        """
+        Метод для получения ключа сертификата, общего для файлов 'cer' и 'del'
+        :param BankCertificateFile certificate: сертификат
+        :return: tuple: (код банка, СНИЛС, срок окончания) или None, если сертификат невалиден
+        """
+        if not certificate.is_valid:
+            return None
+        return certificate.bank_code, certificate.snils, certificate.end_date
+
+    def _register(self, certificate: BankCertificateFile) -> None:
+        """
+        Метод для учёта сертификата при построении, без изменения отсортированного массива
+        :param BankCertificateFile certificate: сертификат
+        """
+        key = self._get_key(certificate)
+        if key is None:
+            return
+        full_file_name = certificate.full_file_name
+        if certificate.certificate_condition == 'del':
+            for cer_name in self._cer_names_by_key.get(key, ()):
+                self._active.pop(cer_name, None)
+            self._del_keys[full_file_name] = key
+            self._del_counts[key] = self._del_counts.get(key, 0) + 1
+            return
+        self._cer_names_by_key.setdefault(key, {})[full_file_name] = certificate
+        self._cer_keys[full_file_name] = key
+        if key not in self._del_counts:
+            self._active[full_file_name] = certificate
+
+    def _insert(self, full_file_name: str, certificate: BankCertificateFile) -> None:
+        """
+        Метод для добавления действующего сертификата в отсортированный массив, O(n)
+        :param str full_file_name: полный путь файла сертификата
+        :param BankCertificateFile certificate: сертификат
+        """
+        self._active[full_file_name] = certificate
+        end_date_seconds = date_to_seconds(certificate.end_date)
+        insert_position = bisect.bisect_right(self._end_dates, end_date_seconds)
+        self._end_dates.insert(insert_position, end_date_seconds)
+        self._names.insert(insert_position, full_file_name)
+
+    def _delete(self, full_file_name: str) -> None:
+        """
+        Метод для удаления сертификата из действующих, O(n)
+        :param str full_file_name: полный путь файла сертификата
+        """
+        certificate = self._active.pop(full_file_name, None)
+        if certificate is None:
+            return
+        end_date_seconds = date_to_seconds(certificate.end_date)
+        position = bisect.bisect_left(self._end_dates, end_date_seconds)
+        while self._names[position] != full_file_name:
+            position += 1
+        del self._end_dates[position]
+        del self._names[position]
+
+    def add(self, certificate: BankCertificateFile) -> None:
+        """
+        Учесть появившийся или изменившийся файл сертификата. Файл 'del' снимает с расписания
+        сертификаты 'cer' с тем же ключом.
+        :param BankCertificateFile certificate: сертификат
+        """
+        full_file_name = certificate.full_file_name
+        self.remove(full_file_name)
+        key = self._get_key(certificate)
+        if key is None:
+            return
+        if certificate.certificate_condition == 'del':
+            if key not in self._del_counts:
+                for cer_name in self._cer_names_by_key.get(key, ()):
+                    self._delete(cer_name)
+            self._del_keys[full_file_name] = key
+            self._del_counts[key] = self._del_counts.get(key, 0) + 1
+            return
+        self._cer_names_by_key.setdefault(key, {})[full_file_name] = certificate
+        self._cer_keys[full_file_name] = key
+        if key not in self._del_counts:
+            self._insert(full_file_name, certificate)
+
+    def remove(self, full_file_name: str) -> None:
+        """
+        Учесть удаление файла сертификата. Удаление последнего файла 'del' возвращает
+        в расписание сертификаты 'cer' с тем же ключом.
+        :param str full_file_name: полный путь файла сертификата
+        """
+        key = self._del_keys.pop(full_file_name, None)
+        if key is not None:
+            self._del_counts[key] -= 1
+            if not self._del_counts[key]:
+                del self._del_counts[key]
+                for cer_name, certificate in self._cer_names_by_key.get(key, {}).items():
+                    self._insert(cer_name, certificate)
+            return
+        key = self._cer_keys.pop(full_file_name, None)
+        if key is None:
+            return
+        self._delete(full_file_name)
+        cer_names = self._cer_names_by_key[key]
+        del cer_names[full_file_name]
+        if not cer_names:
+            del self._cer_names_by_key[key]
+
+    def _iter_active(self, start: typing.Optional[datetime.datetime],
+                     end: typing.Optional[datetime.datetime]) -> typing.Iterator[BankCertificateFile]:
+        """
+        Метод для обхода действующих сертификатов со сроком окончания в [start, end) по возрастанию срока
+        :param datetime.datetime start: начало интервала, None - без ограничения
+        :param datetime.datetime end: конец интервала (не включается), None - без ограничения
+        :return: Iterator[BankCertificateFile]: генератор сертификатов
+        """
+        low = 0 if start is None else bisect.bisect_left(self._end_dates, date_to_seconds(start))
+        high = len(self._end_dates) if end is None else bisect.bisect_left(self._end_dates, date_to_seconds(end))
+        for position in range(low, high):
+            yield self._active[self._names[position]]
+
+    def get_next_expiring(self, count: int, now: typing.Optional[datetime.datetime] = None,
+                          bank_code: typing.Optional[str] = None) -> list[BankCertificateFile]:
+        """
+        Получить ближайшие по сроку окончания действующие сертификаты, срок которых ещё не наступил
+        :param int count: количество сертификатов
+        :param datetime.datetime now: текущее время, по умолчанию - datetime.now()
+        :param str bank_code: код банка, None - все банки
+        :return: list[BankCertificateFile]: не больше count сертификатов по возрастанию срока
+        """
+        now = now or datetime.datetime.now()
+        certificates = self._iter_active(now, None)
+        if bank_code is not None:
+            certificates = (x for x in certificates if x.bank_code == bank_code)
+        return list(itertools.islice(certificates, count))
+
+    def get_expiring_before(self, end: datetime.datetime, now: typing.Optional[datetime.datetime] = None,
+                            bank_code: typing.Optional[str] = None) -> list[BankCertificateFile]:
+        """
+        Получить действующие сертификаты, срок которых наступит до end
+        :param datetime.datetime end: граница срока (не включается)
+        :param datetime.datetime now: текущее время, по умолчанию - datetime.now()
+        :param str bank_code: код банка, None - все банки
+        :return: list[BankCertificateFile]: сертификаты по возрастанию срока
+        """
+        certificates = self._iter_active(now or datetime.datetime.now(), end)
+        if bank_code is None:
+            return list(certificates)
+        return [x for x in certificates if x.bank_code == bank_code]
+
+    def get_expiring_by_bank(self, end: datetime.datetime,
+                             now: typing.Optional[datetime.datetime] = None) -> dict[str, list[BankCertificateFile]]:
+        """
+        Получить действующие сертификаты, срок которых наступит до end, по кодам банков
+        :param datetime.datetime end: граница срока (не включается)
+        :param datetime.datetime now: текущее время, по умолчанию - datetime.now()
+        :return: dict[str, list[BankCertificateFile]]: код банка -> сертификаты по возрастанию срока
+        """
+        certificates_by_bank = {}
+        for certificate in self._iter_active(now or datetime.datetime.now(), end):
+            certificates_by_bank.setdefault(certificate.bank_code, []).append(certificate)
+        return certificates_by_bank
+
+    def get_expired_since_last_check(self, now: typing.Optional[datetime.datetime] = None
+                                     ) -> list[BankCertificateFile]:
+        """
+        Получить действующие сертификаты, срок которых наступил с прошлой проверки, и запомнить время проверки.
+        При первой проверке возвращаются все сертификаты с наступившим сроком.
+        :param datetime.datetime now: текущее время, по умолчанию - datetime.now()
+        :return: list[BankCertificateFile]: сертификаты по возрастанию срока
+        """
+        now = now or datetime.datetime.now()
+        expired_certificates = list(self._iter_active(self.last_check, now))
+        self.last_check = now
+        return expired_certificates
 
 
 class BankCertificatesContainer(StoredFileContainer):
@@ -63,25 +560,225 @@ class BankCertificatesContainer(StoredFileContainer):
     path_class: typing.Type[BankCertificateFile]
     path_class = BankCertificateFile
 
+    def __init__(self, file_directory: str, lazy: bool = False,
+                 file_filter: typing.Optional[StoredFileFilter] = None, watch: bool = False,
+                 parse_cache_path: typing.Union[str, bool, None] = None,
+                 tree_scanner: typing.Optional[DirectoryTreeScanner] = None):
+        """
+        Класс конструктор. В обычном режиме сразу строит индекс сертификатов,
+        в ленивом - индекс строится при первом поиске.
+        :param str file_directory: путь до папки с сертификатами
+        :param bool lazy: ленивый режим чтения директории
+        :param StoredFileFilter file_filter: условия отбора файлов при чтении директории
+        :param bool watch: отслеживать изменения директории для refresh
+        :param parse_cache_path: путь до файла кэша разбора имён (см. CertificateParseCache),
+        True - файл рядом с директорией (CertificateParseCache.get_default_cache_path).
+        Имена из кэша не разбираются заново, а если директория не менялась - она и не читается
+        :param DirectoryTreeScanner tree_scanner: чтение деревьев директорий (см. StoredFileContainer).
+        Кэш разбора имён при этом используется, а список имён из кэша - нет
+        """
+        self._certificates_index = None
+        self._expiry_scheduler = None
+        self.parse_cache = None
+        self.parse_cache_stats = {'hits': 0, 'misses': 0, 'listing_from_cache': False}
+        self._cached_directory_mtime_ns = None
+        self._cached_names = {}
+        self._parsed_names_to_save = {}
+        # Время изменения директории на момент последнего полного чтения
+        self._directory_mtime_ns = None
+        if parse_cache_path is True:
+            parse_cache_path = CertificateParseCache.get_default_cache_path(file_directory)
+        if parse_cache_path:
+            self.parse_cache = CertificateParseCache(parse_cache_path)
+            self._cached_directory_mtime_ns, self._cached_names = self.parse_cache.load(file_directory)
+        super().__init__(file_directory, lazy, file_filter, watch, tree_scanner)
+        if not lazy:
+            self._certificates_index = BankCertificatesIndex(self.files_list)
+
+    def create_stored_file(self, file_name: str, file_stat: typing.Optional[os.stat_result] = None,
+                           file_directory: typing.Optional[str] = None) -> BankCertificateFile:
+        """
+        Создать объект сертификата. Результат разбора имени берётся из кэша, если он там есть.
+        :param str file_name: имя файла с расширением
+        :param os.stat_result file_stat: информация о файле, если уже получена
+        :param str file_directory: директория файла, по умолчанию - директория контейнера
+        :return: BankCertificateFile: объект класса path_class
+        """
+        file_directory = file_directory or self.file_directory
+        cached_name = self._cached_names.get(file_name)
+        if cached_name is not None:
+            self.parse_cache_stats['hits'] += 1
+            if metrics.enabled:
+                metrics.increment('certificate_parse_cache_hits')
+            return self.path_class(file_directory, file_name, file_stat, ParsedCertificateName(*cached_name))
+        self.parse_cache_stats['misses'] += 1
+        if metrics.enabled:
+            start_time = time.perf_counter()
+            parsed_name = certificate_name_parser.parse(file_name)
+            metrics.observe('certificate_parse', time.perf_counter() - start_time)
+        else:
+            parsed_name = certificate_name_parser.parse(file_name)
+        if self.parse_cache is not None:
+            self._parsed_names_to_save[file_name] = (
+                parsed_name.is_valid, parsed_name.error_str, parsed_name.bank_code, parsed_name.snils,
+                parsed_name.end_date, parsed_name.certificate_condition)
+        return self.path_class(file_directory, file_name, file_stat, parsed_name)
+
+    def scan_files(self, file_filter: typing.Optional[StoredFileFilter] = None) -> typing.Iterator[StoredFile]:
+        """
+        Прочитать директорию. Если в кэше есть полный список имён для текущего времени
+        изменения директории - список берётся из кэша без чтения директории.
+        После полного обхода новые результаты разбора имён записываются в кэш, в том числе в ленивом режиме.
+        :param StoredFileFilter file_filter: условия отбора, по умолчанию - переданные в конструкторе
+        :return: Iterator[BankCertificateFile]: генератор сертификатов
+        """
+        file_filter = file_filter or self.file_filter
+        if self.parse_cache is None:
+            yield from super().scan_files(file_filter)
+            return
+        # Время изменения берётся до чтения директории: если она изменится во время чтения, кэш не будет полным
+        directory_mtime_ns = os.stat(self.file_directory).st_mtime_ns
+        if self._cached_directory_mtime_ns is None or self._cached_directory_mtime_ns != directory_mtime_ns or (
+                file_filter is not None and file_filter.need_stat) or self.tree_scanner is not None:
+            stored_files = super().scan_files(file_filter)
+        else:
+            self.parse_cache_stats['listing_from_cache'] = True
+            stored_files = (self.create_stored_file(x) for x in list(self._cached_names)
+                            if file_filter is None or file_filter.match_name(x))
+        current_names = set()
+        for stored_file in stored_files:
+            current_names.add(stored_file.file_name)
+            yield stored_file
+        if file_filter is None and self.tree_scanner is None:
+            self._directory_mtime_ns = directory_mtime_ns
+            self._save_parse_cache(current_names)
+        else:
+            self._save_parse_cache(None)
+
+    def save_parse_cache(self) -> None:
+        """
+        Записать в кэш новые результаты разбора имён и удалить из него исчезнувшие файлы.
+        Полный список имён запоминается только если одна директория читалась без отбора
+        и список файлов уже заполнен: в ленивом режиме директория для этого не читается.
+        """
+        if self.parse_cache is None:
+            return
+        if self.file_filter is None and self.tree_scanner is None and self._files_list is not None:
+            self._save_parse_cache({x.file_name for x in self._files_list})
+        else:
+            self._save_parse_cache(None)
+
+    def _save_parse_cache(self, current_names: typing.Optional[set[str]]) -> None:
+        """
+        Метод для записи в кэш новых результатов разбора имён и удаления исчезнувших файлов
+        :param set[str] current_names: имена полного чтения директории без отбора.
+        None - полного списка имён нет, список имён в кэше отмечается неполным
+        """
+        is_full_listing = current_names is not None
+        removed_names = [x for x in self._cached_names if x not in current_names] if is_full_listing else []
+        if not self._parsed_names_to_save and not removed_names and (
+                self._cached_directory_mtime_ns == self._directory_mtime_ns or not is_full_listing):
+            return
+        self._cached_directory_mtime_ns = self.parse_cache.save(
+            self.file_directory, self._directory_mtime_ns if is_full_listing else None,
+            self._parsed_names_to_save, removed_names)
+        self._cached_names.update(self._parsed_names_to_save)
+        for file_name in removed_names:
+            del self._cached_names[file_name]
+        self._parsed_names_to_save = {}
+
+    @StoredFileContainer.files_list.setter
+    def files_list(self, files_list: list[BankCertificateFile]):
+        self._files_list = files_list
+        self._certificates_index = None
+        self._expiry_scheduler = None
+
+    def apply_files_changes(self, files_change_set: FilesChangeSet) -> None:
+        """
+        Обновить индекс сертификатов и расписание сроков по изменениям списка файлов,
+        затем записать изменения в кэш разбора имён
+        :param FilesChangeSet files_change_set: изменения списка файлов
+        """
+        for certificates_structure in (self._certificates_index, self._expiry_scheduler):
+            if certificates_structure is None:
+                continue
+            for removed_certificate in files_change_set.removed:
+                certificates_structure.remove(removed_certificate.full_file_name)
+            for old_certificate, new_certificate in files_change_set.renamed:
+                certificates_structure.remove(old_certificate.full_file_name)
+                certificates_structure.add(new_certificate)
+            for certificate in files_change_set.added + files_change_set.modified:
+                certificates_structure.add(certificate)
+        if files_change_set and self.parse_cache is not None:
+            # После изменений директории список имён в кэше сохраняется без времени изменения
+            self._directory_mtime_ns = None
+            self.save_parse_cache()
+
+    def close(self) -> None:
+        """
+        Остановить наблюдение за директорией и закрыть кэш разбора имён
+        """
+        super().close()
+        if self.parse_cache is not None:
+            self.parse_cache.close()
+
+    @property
+    def certificates_index(self) -> BankCertificatesIndex:
+        """
+        Индекс сертификатов контейнера
+        :return: BankCertificatesIndex: индекс по коду банка, СНИЛС и сроку окончания
+        """
+        if self._certificates_index is None:
+            self._certificates_index = BankCertificatesIndex(self.files_list)
+        return self._certificates_index
+
+    @property
+    def expiry_scheduler(self) -> CertificateExpiryScheduler:
+        """
+        Расписание сроков окончания действующих сертификатов контейнера. Строится при первом обращении
+        и обновляется при refresh, поэтому в цикле опроса директории его достаточно запрашивать после refresh
+        :return: CertificateExpiryScheduler: расписание сроков
+        """
+        if self._expiry_scheduler is None:
+            self._expiry_scheduler = CertificateExpiryScheduler(self.files_list)
+        return self._expiry_scheduler
+
+    def iter_valid_certificates(self) -> typing.Iterator[BankCertificateFile]:
+        """
+        Обойти валидные сертификаты, не заполняя files_list в ленивом режиме.
+        :return: Iterator[BankCertificateFile]: генератор валидных сертификатов
+        """
+        for certificate in self.iter_files():
+            if certificate.is_valid:
+                yield certificate
+
     def get_valid_certificates_list(self) -> list[BankCertificateFile]:
         """
         метод, предназначенный для создания хранилища сертификатов.
         :return: list[str] certificates_list: список сертификатов
         """
-        certificates_list = []
-        for certificate in self.files_list:
-            if certificate.is_valid:
-                certificates_list.append(certificate)
-        return certificates_list
+        return list(self.iter_valid_certificates())
 
     def get_certificates_by_code(self, bank_code: str, valid_certificates: bool = True):
         """ Получить список сертификатов банка
         :param str bank_code: код банка
         :param bool valid_certificates: True если надо получить только валидные сертификаты
         """
-        return [
-            x for x in filter(
-                lambda x: x.bank_code == bank_code,
-                self.get_valid_certificates_list() if valid_certificates else self.files_list
-            )
-        ]
+        return self.certificates_index.get_by_bank_code(bank_code, valid_certificates)
+
+    def get_certificates_by_snils(self, snils: str, valid_certificates: bool = True):
+        """ Получить список сертификатов по СНИЛС
+        :param str snils: СНИЛС
+        :param bool valid_certificates: True если надо получить только валидные сертификаты
+        """
+        return self.certificates_index.get_by_snils(snils, valid_certificates)
+
+    def get_certificates_by_end_date(self, start: typing.Optional[datetime.datetime] = None,
+                                     end: typing.Optional[datetime.datetime] = None,
+                                     valid_certificates: bool = True):
+        """ Получить список сертификатов со сроком окончания в [start, end)
+        :param datetime.datetime start: начало интервала
+        :param datetime.datetime end: конец интервала (не включается)
+        :param bool valid_certificates: True если надо получить только валидные сертификаты
+        """
+        return self.certificates_index.get_by_end_date(start, end, valid_certificates)
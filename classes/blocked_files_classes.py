@@ -0,0 +1,143 @@
+import os
+import stat
+import threading
+import time
+import typing
+
+from typing import Dict, Optional, Set, Tuple
+
+
+PROC_DIRECTORY = '/proc'
+
+
+class OpenFilesSnapshot:
+    """
+    Класс, предназначенный для хранения снимка открытых в системе файлов.
+    Снимок строится один раз обходом /proc/*/fd и далее отвечает
+    на вопрос о блокировке любого количества файлов без обращения к /proc.
+    В Linux нет обязательных блокировок, поэтому заблокированным считается файл,
+    открытый на запись каким-либо процессом.
+    """
+    open_files: Dict[Tuple[int, int], int]
+
+    def __init__(self, proc_directory: str = PROC_DIRECTORY):
+        """
+        Класс конструктор. Строит таблицу (устройство, inode) -> режим открытия.
+        Режим открытия - объединение битов stat.S_IRUSR/stat.S_IWUSR всех дескрипторов файла.
+        :param str proc_directory: путь до файловой системы proc
+        """
+        self.created_at = time.monotonic()
+        self.open_files = {}
+        for pid in os.listdir(proc_directory):
+            if not pid.isdigit():
+                continue
+            fd_directory = os.path.join(proc_directory, pid, 'fd')
+            try:
+                fd_list = os.listdir(fd_directory)
+            except OSError:
+                # Процесс завершился или нет прав на чтение его дескрипторов
+                continue
+            for fd in fd_list:
+                fd_path = os.path.join(fd_directory, fd)
+                try:
+                    # Права ссылки в /proc/<pid>/fd отражают режим, в котором открыт файл
+                    fd_mode = os.lstat(fd_path).st_mode
+                    file_stat = os.stat(fd_path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(file_stat.st_mode):
+                    continue
+                file_key = (file_stat.st_dev, file_stat.st_ino)
+                self.open_files[file_key] = self.open_files.get(file_key, 0) | (fd_mode & (stat.S_IRUSR | stat.S_IWUSR))
+
+    @property
+    def age(self) -> float:
+        """
+        Возраст снимка
+        :return: float: количество секунд с момента создания снимка
+        """
+        return time.monotonic() - self.created_at
+
+    def stat_is_locked(self, file_stat: os.stat_result) -> bool:
+        """
+        Проверить, открыт ли файл на запись каким-либо процессом
+        :param os.stat_result file_stat: информация о файле
+        :return: bool: True если файл заблокирован
+        """
+        return bool(self.open_files.get((file_stat.st_dev, file_stat.st_ino), 0) & stat.S_IWUSR)
+
+    def file_is_locked(self, file_path: str) -> bool:
+        """
+        Проверить, открыт ли файл на запись каким-либо процессом
+        :param str file_path: полный путь файла
+        :return: bool: True если файл заблокирован. Несуществующий файл не считается заблокированным
+        """
+        try:
+            return self.stat_is_locked(os.stat(file_path))
+        except OSError:
+            return False
+
+
+class BulkBlockedFilesDetector:
+    """
+    Класс, предназначенный для пакетного определения заблокированных файлов.
+    Таблица открытых файлов строится один раз на пакет путей и может переиспользоваться
+    повторными запросами в пределах заданного возраста снимка.
+    Заблокированным считается файл, открытый на запись (см. OpenFilesSnapshot).
+    Детектор можно использовать из нескольких потоков: снимок обновляется под блокировкой.
+    """
+
+    def __init__(self, snapshot_max_age: float = 0.0, proc_directory: str = PROC_DIRECTORY):
+        """
+        Класс конструктор.
+        :param float snapshot_max_age: максимальный возраст снимка в секундах, при котором он
+        переиспользуется. 0 - снимок строится заново при каждом запросе
+        :param str proc_directory: путь до файловой системы proc
+        """
+        self.snapshot_max_age = snapshot_max_age
+        self.proc_directory = proc_directory
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+    @staticmethod
+    def is_supported(proc_directory: str = PROC_DIRECTORY) -> bool:
+        """
+        Проверить, доступна ли таблица открытых файлов в системе
+        :param str proc_directory: путь до файловой системы proc
+        :return: bool: True если /proc/self/fd доступен (Linux)
+        """
+        return os.path.isdir(os.path.join(proc_directory, 'self', 'fd'))
+
+    def get_snapshot(self, snapshot_max_age: Optional[float] = None) -> OpenFilesSnapshot:
+        """
+        Получить снимок открытых файлов. Если текущий снимок не старше допустимого возраста -
+        возвращается он, иначе строится новый.
+        :param float snapshot_max_age: допустимый возраст снимка, по умолчанию - переданный в конструкторе
+        :return: OpenFilesSnapshot: снимок открытых файлов
+        """
+        if snapshot_max_age is None:
+            snapshot_max_age = self.snapshot_max_age
+        with self._snapshot_lock:
+            if self._snapshot is None or snapshot_max_age <= 0 or self._snapshot.age > snapshot_max_age:
+                self._snapshot = OpenFilesSnapshot(self.proc_directory)
+            return self._snapshot
+
+    def get_locked_files(self, files_paths: typing.Iterable[str],
+                         snapshot_max_age: Optional[float] = None) -> Set[str]:
+        """
+        Отобрать заблокированные файлы из переданного набора
+        :param files_paths: полные пути файлов
+        :param float snapshot_max_age: допустимый возраст снимка
+        :return: set[str]: множество путей заблокированных файлов
+        """
+        snapshot = self.get_snapshot(snapshot_max_age)
+        return {file_path for file_path in files_paths if snapshot.file_is_locked(file_path)}
+
+    def file_is_locked(self, file_path: str, snapshot_max_age: Optional[float] = None) -> bool:
+        """
+        Проверить блокировку одного файла
+        :param str file_path: полный путь файла
+        :param float snapshot_max_age: допустимый возраст снимка
+        :return: bool: True если файл заблокирован
+        """
+        return self.get_snapshot(snapshot_max_age).file_is_locked(file_path)
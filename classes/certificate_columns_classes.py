@@ -0,0 +1,268 @@
+import collections
+import datetime
+import typing
+
+from classes.bank_certificates_classes import (BankCertificateFile, BankCertificatesContainer, CERTIFICATE_CONDITIONS,
+                                              certificate_name_parser, date_to_seconds)
+
+try:
+    import numpy
+except ImportError:
+    # Без numpy столбцы хранятся списками, а агрегаты считаются циклами Python
+    numpy = None
+
+
+# Длина имени КОДБ.СНИЛС.ГГГГММДДччммсс.cer и позиции точек в нём
+CERTIFICATE_NAME_LENGTH = 35
+_DOT_POSITIONS = (4, 16, 31)
+_HISTOGRAM_UNITS = ('Y', 'M', 'D')
+_EPOCH_SECONDS = date_to_seconds(datetime.datetime(1970, 1, 1))
+# Значение int64, которое datetime64 считает NaT
+_NAT_SECONDS = -2 ** 63
+
+
+class CertificateColumns:
+    """
+    Класс, предназначенный для хранения сведений о сертификатах по столбцам: file_name, bank_code, snils,
+    end_date, condition, is_valid. Если установлен numpy - столбцы являются массивами numpy
+    (end_date - datetime64[s], отсутствующий срок - NaT), иначе - списками (отсутствующий срок - None).
+    Отсутствующие строковые значения невалидных имён - пустые строки.
+    """
+    column_names = ('file_name', 'bank_code', 'snils', 'end_date', 'condition', 'is_valid')
+
+    def __init__(self, file_name: typing.Sequence[str], bank_code: typing.Sequence[str],
+                 snils: typing.Sequence[str], end_date: typing.Sequence, condition: typing.Sequence[str],
+                 is_valid: typing.Sequence[bool]):
+        """
+        Класс конструктор. При создании передаются столбцы одинаковой длины.
+        :param file_name: имена файлов
+        :param bank_code: коды банков
+        :param snils: СНИЛС
+        :param end_date: сроки окончания сертификатов
+        :param condition: состояния сертификатов
+        :param is_valid: признаки валидности имён
+        """
+        self.file_name = file_name
+        self.bank_code = bank_code
+        self.snils = snils
+        self.end_date = end_date
+        self.condition = condition
+        self.is_valid = is_valid
+
+    def __len__(self) -> int:
+        """
+        Количество сертификатов
+        :return: int: количество строк
+        """
+        return len(self.file_name)
+
+    @classmethod
+    def _from_lists(cls, file_name: list, bank_code: list, snils: list, end_date: list, condition: list,
+                    is_valid: list) -> 'CertificateColumns':
+        """
+        Метод для создания столбцов из списков, заполненных за один проход
+        :return: CertificateColumns: столбцы, при наличии numpy - массивы
+        """
+        if numpy is None:
+            return cls(file_name, bank_code, snils, end_date, condition, is_valid)
+        # Преобразование объектов datetime средствами numpy в несколько раз медленнее, чем через секунды
+        end_date_seconds = numpy.array([_NAT_SECONDS if x is None else date_to_seconds(x) - _EPOCH_SECONDS
+                                        for x in end_date], dtype=numpy.int64)
+        return cls(numpy.array(file_name, dtype=str), numpy.array(bank_code, dtype=str),
+                   numpy.array(snils, dtype=str), end_date_seconds.view('datetime64[s]'),
+                   numpy.array(condition, dtype=str), numpy.array(is_valid, dtype=bool))
+
+    @classmethod
+    def from_certificates(cls, certificates: typing.Iterable[BankCertificateFile]) -> 'CertificateColumns':
+        """
+        Создать столбцы по уже разобранным сертификатам за один проход
+        :param certificates: сертификаты, например files_list контейнера
+        :return: CertificateColumns: столбцы
+        """
+        file_name, bank_code, snils, end_date, condition, is_valid = [], [], [], [], [], []
+        for certificate in certificates:
+            # У невалидных имён атрибуты, до которых не дошёл разбор, не устанавливаются
+            file_name.append(certificate.file_name)
+            bank_code.append(getattr(certificate, 'bank_code', ''))
+            snils.append(getattr(certificate, 'snils', ''))
+            end_date.append(getattr(certificate, 'end_date', None))
+            condition.append(getattr(certificate, 'certificate_condition', ''))
+            is_valid.append(certificate.is_valid)
+        return cls._from_lists(file_name, bank_code, snils, end_date, condition, is_valid)
+
+    @classmethod
+    def from_container(cls, container: BankCertificatesContainer) -> 'CertificateColumns':
+        """
+        Создать столбцы по сертификатам контейнера. В ленивом режиме files_list не заполняется
+        :param BankCertificatesContainer container: контейнер сертификатов
+        :return: CertificateColumns: столбцы
+        """
+        return cls.from_certificates(container.iter_files())
+
+    @classmethod
+    def from_names(cls, files_names: typing.Iterable[str]) -> 'CertificateColumns':
+        """
+        Создать столбцы по именам файлов без создания объектов сертификатов.
+        При наличии numpy имена фиксированной длины разбираются векторно, остальные - CertificateNameParser
+        :param files_names: имена файлов, например результат os.listdir
+        :return: CertificateColumns: столбцы
+        """
+        files_names = list(files_names)
+        if numpy is None:
+            parsed_names = certificate_name_parser.parse_many(files_names)
+            return cls(files_names, [x.bank_code or '' for x in parsed_names], [x.snils or '' for x in parsed_names],
+                       [x.end_date for x in parsed_names], [x.certificate_condition or '' for x in parsed_names],
+                       [x.is_valid for x in parsed_names])
+        return cls._parse_names_vectorized(files_names)
+
+    @classmethod
+    def _parse_names_vectorized(cls, files_names: list[str]) -> 'CertificateColumns':
+        """
+        Метод для векторного разбора имён. Имя длиной CERTIFICATE_NAME_LENGTH из ASCII символов
+        с точками только на своих местах разбирается как матрица байтов. Имена, не прошедшие
+        какую-либо проверку, разбираются CertificateNameParser, поэтому результат совпадает с ним.
+        :param list[str] files_names: имена файлов
+        :return: CertificateColumns: столбцы
+        """
+        names_count = len(files_names)
+        file_name = numpy.array(files_names, dtype=str)
+        end_date = numpy.full(names_count, 'NaT', dtype='datetime64[s]')
+        is_valid = numpy.zeros(names_count, dtype=bool)
+        fixed_positions = numpy.array([x for x, y in enumerate(files_names)
+                                       if len(y) == CERTIFICATE_NAME_LENGTH and y.isascii()], dtype=numpy.intp)
+        names_bytes = ''.join(files_names[x] for x in fixed_positions).encode('ascii')
+        names_matrix = numpy.frombuffer(names_bytes, dtype=numpy.uint8).reshape(-1, CERTIFICATE_NAME_LENGTH)
+        digits = names_matrix[:, 17:31].astype(numpy.int64) - ord('0')
+        fixed_valid = (names_matrix == ord('.')).sum(axis=1) == len(_DOT_POSITIONS)
+        for dot_position in _DOT_POSITIONS:
+            fixed_valid &= names_matrix[:, dot_position] == ord('.')
+        fixed_valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        conditions_bytes = numpy.ascontiguousarray(names_matrix[:, 32:35]).view('S3').ravel()
+        fixed_valid &= numpy.isin(conditions_bytes, [x.encode('ascii') for x in CERTIFICATE_CONDITIONS])
+        year = digits[:, 0:4] @ numpy.array([1000, 100, 10, 1])
+        month, day, hour, minute, second = (digits[:, x:x + 2] @ numpy.array([10, 1]) for x in range(4, 14, 2))
+        is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        days_in_month = numpy.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[
+            numpy.clip(month, 0, 12)] + ((month == 2) & is_leap)
+        fixed_valid &= ((year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month) &
+                        (hour <= 23) & (minute <= 59) & (second <= 59))
+        valid_positions = fixed_positions[fixed_valid]
+        valid_matrix = names_matrix[fixed_valid]
+        months = (year[fixed_valid] - 1970) * 12 + month[fixed_valid] - 1
+        end_date[valid_positions] = (months.astype('datetime64[M]').astype('datetime64[D]') +
+                                     (day[fixed_valid] - 1).astype('timedelta64[D]') +
+                                     (hour[fixed_valid] * 3600 + minute[fixed_valid] * 60 +
+                                      second[fixed_valid]).astype('timedelta64[s]'))
+        is_valid[valid_positions] = True
+        parsed_by_vector = numpy.zeros(names_count, dtype=bool)
+        parsed_by_vector[valid_positions] = True
+        parsed_positions = numpy.flatnonzero(~parsed_by_vector)
+        parsed_names = certificate_name_parser.parse_many([files_names[x] for x in parsed_positions])
+        for position, parsed_name in zip(parsed_positions, parsed_names):
+            if parsed_name.end_date is not None:
+                end_date[position] = numpy.datetime64(parsed_name.end_date, 's')
+            is_valid[position] = parsed_name.is_valid
+        bank_code = cls._merge_string_column(
+            names_count, valid_positions, numpy.ascontiguousarray(valid_matrix[:, 0:4]).view('S4').ravel(),
+            parsed_positions, [x.bank_code or '' for x in parsed_names])
+        snils = cls._merge_string_column(
+            names_count, valid_positions, numpy.ascontiguousarray(valid_matrix[:, 5:16]).view('S11').ravel(),
+            parsed_positions, [x.snils or '' for x in parsed_names])
+        condition = cls._merge_string_column(
+            names_count, valid_positions, conditions_bytes[fixed_valid],
+            parsed_positions, [x.certificate_condition or '' for x in parsed_names])
+        return cls(file_name, bank_code, snils, end_date, condition, is_valid)
+
+    @staticmethod
+    def _merge_string_column(names_count: int, vector_positions, vector_values, parsed_positions,
+                             parsed_values: list[str]):
+        """
+        Метод для объединения строкового столбца из значений векторного разбора и значений CertificateNameParser.
+        Ширина столбца подбирается по самому длинному значению, поэтому значения невалидных имён не обрезаются
+        :param int names_count: количество строк
+        :param vector_positions: номера строк, разобранных векторно
+        :param vector_values: значения векторного разбора (массив байтовых строк фиксированной длины)
+        :param parsed_positions: номера строк, разобранных CertificateNameParser
+        :param list[str] parsed_values: значения CertificateNameParser
+        :return: numpy.ndarray: столбец строк
+        """
+        parsed_values = numpy.array(parsed_values, dtype=str)
+        column = numpy.full(names_count, '', dtype=numpy.promote_types(vector_values.dtype, parsed_values.dtype))
+        column[vector_positions] = vector_values
+        column[parsed_positions] = parsed_values
+        return column
+
+    def to_dict(self) -> dict:
+        """
+        Получить столбцы словарём, например для создания таблицы pandas
+        :return: dict: имя столбца -> столбец
+        """
+        return {x: getattr(self, x) for x in self.column_names}
+
+    def _get_selected(self, valid_only: bool, condition: typing.Optional[str]):
+        """
+        Метод для получения отбора строк
+        :param bool valid_only: только валидные имена
+        :param str condition: состояние сертификата, None - любое
+        :return: маска numpy или список номеров строк
+        """
+        if numpy is not None:
+            selected = numpy.ones(len(self), dtype=bool)
+            if valid_only:
+                selected &= self.is_valid
+            if condition is not None:
+                selected &= self.condition == condition
+            return selected
+        return [x for x in range(len(self)) if (not valid_only or self.is_valid[x]) and
+                (condition is None or self.condition[x] == condition)]
+
+    def count_by_bank(self, valid_only: bool = True, condition: typing.Optional[str] = None) -> dict[str, int]:
+        """
+        Посчитать сертификаты по кодам банков
+        :param bool valid_only: только валидные имена
+        :param str condition: состояние сертификата, None - любое
+        :return: dict[str, int]: код банка -> количество, по возрастанию кода
+        """
+        selected = self._get_selected(valid_only, condition)
+        if numpy is not None:
+            bank_codes, counts = numpy.unique(self.bank_code[selected], return_counts=True)
+            return dict(zip(bank_codes.tolist(), counts.tolist()))
+        return dict(sorted(collections.Counter(self.bank_code[x] for x in selected).items()))
+
+    def get_expiry_histogram(self, unit: str = 'M', valid_only: bool = True, condition: typing.Optional[str] = None,
+                             start: typing.Optional[datetime.datetime] = None,
+                             end: typing.Optional[datetime.datetime] = None) -> dict[str, int]:
+        """
+        Посчитать сертификаты по периодам срока окончания
+        :param str unit: период: 'Y' - год, 'M' - месяц, 'D' - день
+        :param bool valid_only: только валидные имена
+        :param str condition: состояние сертификата, None - любое
+        :param datetime.datetime start: начало интервала сроков, None - без ограничения
+        :param datetime.datetime end: конец интервала сроков (не включается), None - без ограничения
+        :return: dict[str, int]: начало периода в формате ISO ('2022', '2022-09', '2022-09-23') -> количество,
+        по возрастанию периода
+        """
+        if unit not in _HISTOGRAM_UNITS:
+            raise ValueError(f'Неверный период гистограммы: {unit}')
+        selected = self._get_selected(valid_only, condition)
+        if numpy is not None:
+            end_dates = self.end_date[selected]
+            end_dates = end_dates[~numpy.isnat(end_dates)]
+            if start is not None:
+                end_dates = end_dates[end_dates >= numpy.datetime64(start, 's')]
+            if end is not None:
+                end_dates = end_dates[end_dates < numpy.datetime64(end, 's')]
+            periods, counts = numpy.unique(end_dates.astype(f'datetime64[{unit}]'), return_counts=True)
+            return dict(zip(periods.astype(str).tolist(), counts.tolist()))
+        periods = collections.Counter()
+        for position in selected:
+            end_date = self.end_date[position]
+            if end_date is None or (start is not None and end_date < start) or (end is not None and end_date >= end):
+                continue
+            if unit == 'Y':
+                periods[f'{end_date.year:04d}'] += 1
+            elif unit == 'M':
+                periods[f'{end_date.year:04d}-{end_date.month:02d}'] += 1
+            else:
+                periods[end_date.date().isoformat()] += 1
+        return dict(sorted(periods.items()))
@@ -0,0 +1,101 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class CertificateParseCache:
+    """
+    Класс, предназначенный для хранения результатов разбора имён сертификатов в файле SQLite.
+    Для каждой директории хранятся время её изменения и разобранные поля всех имён,
+    чтобы после перезапуска не разбирать имена заново.
+    Кэш можно использовать из любого потока (например, refresh контейнера в пуле потоков):
+    соединение общее и защищено блокировкой.
+    """
+    # Время изменения директории не запоминается, если с него прошло меньше этого времени:
+    # файл, созданный в ту же единицу времени файловой системы, мог не изменить его
+    racy_mtime_ns = 2 * 10 ** 9
+
+    def __init__(self, cache_path: str):
+        """
+        Класс конструктор. Открывает файл кэша и создаёт таблицы, если их нет.
+        :param str cache_path: путь до файла кэша
+        """
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS directories (directory TEXT PRIMARY KEY, mtime_ns INTEGER)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS certificates (directory TEXT, file_name TEXT, is_valid INTEGER, '
+                'error_str TEXT, bank_code TEXT, snils TEXT, end_date TEXT, certificate_condition TEXT, '
+                'PRIMARY KEY (directory, file_name))')
+
+    @staticmethod
+    def get_default_cache_path(file_directory: str) -> str:
+        """
+        Получить путь файла кэша рядом с директорией (не внутри, чтобы он не попадал в список файлов)
+        :param str file_directory: путь до директории с сертификатами
+        :return: str: путь до файла кэша
+        """
+        file_directory = os.path.abspath(file_directory)
+        return os.path.join(os.path.dirname(file_directory), f'.{os.path.basename(file_directory)}.parse_cache.sqlite')
+
+    def close(self) -> None:
+        """
+        Закрыть файл кэша. Повторный вызов ничего не делает
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def load(self, file_directory: str) -> Tuple[Optional[int], Dict[str, tuple]]:
+        """
+        Прочитать кэш директории
+        :param str file_directory: путь до директории с сертификатами
+        :return: (int, dict[str, tuple]): время изменения директории на момент сохранения (или None)
+        и имя файла -> (is_valid, error_str, bank_code, snils, end_date, certificate_condition)
+        """
+        file_directory = os.path.abspath(file_directory)
+        with self._lock:
+            directory_row = self._connection.execute('SELECT mtime_ns FROM directories WHERE directory = ?',
+                                                     (file_directory,)).fetchone()
+            rows = self._connection.execute(
+                'SELECT file_name, is_valid, error_str, bank_code, snils, end_date, certificate_condition '
+                'FROM certificates WHERE directory = ? ORDER BY rowid', (file_directory,)).fetchall()
+        parsed_names = {}
+        for row in rows:
+            end_date = row[5]
+            parsed_names[row[0]] = (bool(row[1]), row[2], row[3], row[4],
+                                    None if end_date is None else datetime.datetime.fromisoformat(end_date), row[6])
+        return None if directory_row is None else directory_row[0], parsed_names
+
+    def save(self, file_directory: str, directory_mtime_ns: Optional[int], parsed_names: Dict[str, tuple],
+             removed_names: Iterable[str] = ()) -> Optional[int]:
+        """
+        Записать изменения кэша директории одной транзакцией
+        :param str file_directory: путь до директории с сертификатами
+        :param int directory_mtime_ns: время изменения директории, для которого кэш полон. None - кэш неполон
+        :param dict[str, tuple] parsed_names: новые и изменившиеся имена в формате load
+        :param removed_names: имена файлов, которых больше нет в директории
+        :return: int: сохранённое время изменения директории (None, если оно слишком свежее)
+        """
+        file_directory = os.path.abspath(file_directory)
+        if directory_mtime_ns is not None and time.time_ns() - directory_mtime_ns < self.racy_mtime_ns:
+            directory_mtime_ns = None
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?)',
+                                     (file_directory, directory_mtime_ns))
+            self._connection.executemany(
+                'DELETE FROM certificates WHERE directory = ? AND file_name = ?',
+                ((file_directory, x) for x in removed_names))
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO certificates VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((file_directory, file_name, int(x[0]), x[1], x[2], x[3], None if x[4] is None else str(x[4]), x[5])
+                 for file_name, x in parsed_names.items()))
+        return directory_mtime_ns
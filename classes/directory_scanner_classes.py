@@ -0,0 +1,158 @@
+import concurrent.futures
+import fnmatch
+import logging
+import os
+import re
+import threading
+import time
+import typing
+
+from typing import Iterator, List, Optional
+
+from classes.metrics_classes import metrics
+
+
+class DirectoryListing:
+    """
+    Класс, предназначенный для хранения результата чтения одной директории дерева.
+    """
+    __slots__ = ('directory', 'files', 'subdirectories')
+
+    def __init__(self, directory: str, files: List[tuple], subdirectories: List[concurrent.futures.Future]):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str directory: путь до директории
+        :param list[tuple] files: пары (имя файла, os.stat_result или None) по возрастанию имени
+        :param list[Future] subdirectories: задачи чтения поддиректорий по возрастанию имени
+        """
+        self.directory = directory
+        self.files = files
+        self.subdirectories = subdirectories
+
+
+def _compile_patterns(patterns: Optional[typing.Iterable[str]]) -> Optional[typing.Pattern]:
+    """
+    Объединить шаблоны fnmatch в одно регулярное выражение
+    :param patterns: шаблоны или None
+    :return: Pattern: регулярное выражение или None, если шаблонов нет
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(x)})' for x in patterns))
+
+
+class DirectoryTreeScanner:
+    """
+    Класс, предназначенный для чтения нескольких деревьев директорий в пуле потоков.
+    Каждая директория читается отдельной задачей, которая сразу ставит в пул чтение своих поддиректорий.
+    Файлы возвращаются в стабильном порядке независимо от порядка выполнения задач:
+    корни - в порядке передачи, внутри директории - сначала файлы по имени, затем поддиректории по имени.
+    Шаблоны include и exclude (fnmatch) проверяются для пути относительно корня с разделителем '/',
+    exclude также отсекает поддиректории целиком. Возвращаются только обычные файлы: символические ссылки
+    (в том числе на директории) и специальные файлы пропускаются, поэтому обход не зацикливается.
+    """
+
+    def __init__(self, roots: Optional[typing.Sequence[str]] = None, recursive: bool = True,
+                 max_depth: Optional[int] = None, include: Optional[typing.Iterable[str]] = None,
+                 exclude: Optional[typing.Iterable[str]] = None, workers: int = 4,
+                 max_open_dirs: Optional[int] = None):
+        """
+        Класс конструктор.
+        :param roots: корневые директории. None - директория контейнера
+        :param bool recursive: если False - читаются только сами корни
+        :param int max_depth: глубина поддиректорий (0 - только корни), None - без ограничения
+        :param include: шаблоны путей файлов, которые надо вернуть. None - все файлы
+        :param exclude: шаблоны путей файлов и поддиректорий, которые надо пропустить
+        :param int workers: количество потоков чтения
+        :param int max_open_dirs: количество одновременно открытых директорий, по умолчанию - workers
+        """
+        self.roots = None if roots is None else list(roots)
+        self.max_depth = max_depth if recursive else 0
+        self.include = _compile_patterns(include)
+        self.exclude = _compile_patterns(exclude)
+        self.workers = workers
+        self.max_open_dirs = max_open_dirs or workers
+        # Поддиректории, которые не удалось прочитать при последнем обходе
+        self.errors: List[typing.Tuple[str, OSError]] = []
+
+    def _scan_directory(self, executor: concurrent.futures.Executor, open_dirs: threading.Semaphore,
+                        directory: str, relative_path: str, depth: int, file_filter,
+                        need_stat: bool) -> DirectoryListing:
+        """
+        Метод для чтения одной директории, выполняется в пуле потоков
+        :param executor: пул потоков для чтения поддиректорий
+        :param threading.Semaphore open_dirs: ограничение количества открытых директорий
+        :param str directory: путь до директории
+        :param str relative_path: путь относительно корня с '/' на конце (для корня - пустая строка)
+        :param int depth: глубина директории
+        :param StoredFileFilter file_filter: условия отбора файлов или None
+        :param bool need_stat: получить информацию о всех файлах, даже если отбор её не требует
+        :return: DirectoryListing: файлы и задачи чтения поддиректорий
+        """
+        files = []
+        subdirectories = []
+        entries_count = 0
+        start_time = time.perf_counter()
+        try:
+            with open_dirs, os.scandir(directory) as dir_entries:
+                for dir_entry in dir_entries:
+                    entries_count += 1
+                    relative_name = relative_path + dir_entry.name
+                    if self.exclude is not None and self.exclude.match(relative_name):
+                        continue
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        if self.max_depth is None or depth < self.max_depth:
+                            subdirectories.append(dir_entry.name)
+                        continue
+                    if not dir_entry.is_file(follow_symlinks=False):
+                        continue
+                    if self.include is not None and not self.include.match(relative_name):
+                        continue
+                    file_stat = None
+                    if file_filter is not None:
+                        if not file_filter.match_name(dir_entry.name):
+                            continue
+                        if file_filter.need_stat:
+                            file_stat = dir_entry.stat()
+                            if not file_filter.match_stat(file_stat):
+                                continue
+                    if need_stat and file_stat is None:
+                        file_stat = dir_entry.stat()
+                    files.append((dir_entry.name, file_stat))
+        except OSError as error:
+            if depth == 0:
+                raise
+            logging.error(f'Не удалось прочитать директорию {directory}: {error}')
+            self.errors.append((directory, error))
+        finally:
+            metrics.observe('listdir', time.perf_counter() - start_time)
+            metrics.increment('listdir_entries', entries_count)
+        files.sort()
+        subdirectories.sort()
+        # Поддиректории ставятся в пул после закрытия директории, чтобы не держать её открытой
+        return DirectoryListing(directory, files, [executor.submit(
+            self._scan_directory, executor, open_dirs, os.path.join(directory, x), f'{relative_path}{x}/', depth + 1,
+            file_filter, need_stat) for x in subdirectories])
+
+    def scan(self, default_root: str, file_filter=None,
+             need_stat: bool = False) -> Iterator[typing.Tuple[str, str, Optional[os.stat_result]]]:
+        """
+        Прочитать деревья директорий. Обход можно прервать в любой момент, невыполненные задачи отменяются
+        :param str default_root: корень, если roots не переданы в конструкторе
+        :param StoredFileFilter file_filter: условия отбора файлов или None
+        :param bool need_stat: получить информацию о всех файлах
+        :return: Iterator[tuple]: тройки (директория, имя файла, os.stat_result или None) в стабильном порядке
+        """
+        self.errors = []
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        open_dirs = threading.Semaphore(self.max_open_dirs)
+        try:
+            stack = [executor.submit(self._scan_directory, executor, open_dirs, x, '', 0, file_filter, need_stat)
+                     for x in reversed(self.roots or [default_root])]
+            while stack:
+                directory_listing = stack.pop().result()
+                for file_name, file_stat in directory_listing.files:
+                    yield directory_listing.directory, file_name, file_stat
+                stack.extend(reversed(directory_listing.subdirectories))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
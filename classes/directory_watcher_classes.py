@@ -0,0 +1,244 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import typing
+
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class DirectoryChanges:
+    """
+    Класс, предназначенный для хранения изменений директории между двумя опросами.
+    Хранятся имена файлов без пути.
+    """
+
+    def __init__(self, added: Optional[List[str]] = None, removed: Optional[List[str]] = None,
+                 renamed: Optional[List[Tuple[str, str]]] = None, modified: Optional[List[str]] = None):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param list[str] added: появившиеся файлы
+        :param list[str] removed: удалённые файлы
+        :param list[tuple[str, str]] renamed: переименованные файлы (старое имя, новое имя)
+        :param list[str] modified: файлы, у которых изменились размер, время изменения или inode
+        """
+        self.added = added or []
+        self.removed = removed or []
+        self.renamed = renamed or []
+        self.modified = modified or []
+
+    def __bool__(self) -> bool:
+        """
+        Есть ли изменения
+        :return: bool: True если хотя бы один файл изменился
+        """
+        return bool(self.added or self.removed or self.renamed or self.modified)
+
+
+class PollingDirectoryWatcher:
+    """
+    Класс, предназначенный для отслеживания изменений директории опросом.
+    Хранит снимок директории (имя -> inode, время изменения, размер) и при опросе сравнивает его с текущим.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Класс конструктор. Делает начальный снимок директории.
+        :param str directory: путь до директории
+        """
+        self.directory = directory
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int, int]]:
+        """
+        Метод для получения снимка директории
+        :return: dict[str, tuple[int, int, int]]: имя -> (inode, время изменения в нс, размер)
+        """
+        snapshot = {}
+        with os.scandir(self.directory) as dir_entries:
+            for dir_entry in dir_entries:
+                try:
+                    file_stat = dir_entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                snapshot[dir_entry.name] = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        return snapshot
+
+    def _stat_names(self, names: typing.Iterable[str]) -> Dict[str, Tuple[int, int, int]]:
+        """
+        Метод для получения информации только о переданных файлах
+        :param names: имена файлов
+        :return: dict[str, tuple[int, int, int]]: снимок существующих файлов из переданных
+        """
+        snapshot = {}
+        for name in names:
+            try:
+                file_stat = os.lstat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            snapshot[name] = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+        return snapshot
+
+    def get_known_names(self) -> Set[str]:
+        """
+        Получить имена файлов директории на момент последнего опроса
+        :return: set[str]: имена файлов
+        """
+        return set(self._snapshot)
+
+    def _get_changed_names(self) -> Optional[Set[str]]:
+        """
+        Метод для получения имён, которые могли измениться с прошлого опроса
+        :return: set[str]: имена файлов или None, если надо сравнить всю директорию
+        """
+        return None
+
+    def get_changes(self) -> DirectoryChanges:
+        """
+        Получить изменения директории с прошлого опроса. Переименование определяется
+        по совпадению inode удалённого и появившегося файла.
+        :return: DirectoryChanges: изменения директории
+        """
+        changed_names = self._get_changed_names()
+        if changed_names is None:
+            old_snapshot = self._snapshot
+            new_snapshot = self._take_snapshot()
+            self._snapshot = new_snapshot
+        else:
+            old_snapshot = {x: self._snapshot[x] for x in changed_names if x in self._snapshot}
+            new_snapshot = self._stat_names(changed_names)
+            for name in changed_names:
+                if name in new_snapshot:
+                    self._snapshot[name] = new_snapshot[name]
+                else:
+                    self._snapshot.pop(name, None)
+        changes = DirectoryChanges()
+        removed_by_inode = {}
+        for name, file_info in old_snapshot.items():
+            if name not in new_snapshot:
+                removed_by_inode[file_info[0]] = name
+        for name, file_info in new_snapshot.items():
+            old_file_info = old_snapshot.get(name)
+            if old_file_info is None:
+                old_name = removed_by_inode.pop(file_info[0], None)
+                if old_name is None:
+                    changes.added.append(name)
+                else:
+                    changes.renamed.append((old_name, name))
+            elif old_file_info != file_info:
+                changes.modified.append(name)
+        changes.removed.extend(removed_by_inode.values())
+        return changes
+
+    def close(self) -> None:
+        """
+        Освободить ресурсы. Для опроса ресурсов нет.
+        """
+
+
+class InotifyDirectoryWatcher(PollingDirectoryWatcher):
+    """
+    Класс, предназначенный для отслеживания изменений директории через inotify (Linux).
+    События говорят, какие имена надо проверить, поэтому при опросе директория не перечитывается.
+    При переполнении очереди событий директория сравнивается целиком.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    watch_mask = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                  IN_DELETE_SELF | IN_MOVE_SELF)
+    rescan_mask = IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+    event_header = struct.Struct('iIII')
+    _libc = None
+
+    def __init__(self, directory: str):
+        """
+        Класс конструктор. Подписывается на события директории до начального снимка,
+        чтобы не пропустить изменения между ними.
+        :param str directory: путь до директории
+        """
+        self._inotify_fd = -1
+        libc = self.get_libc()
+        if libc is None:
+            raise OSError('inotify недоступен')
+        self._inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._inotify_fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        if libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), self.watch_mask) < 0:
+            error_number = ctypes.get_errno()
+            os.close(self._inotify_fd)
+            self._inotify_fd = -1
+            raise OSError(error_number, os.strerror(error_number), directory)
+        super().__init__(directory)
+
+    @classmethod
+    def get_libc(cls) -> Optional[ctypes.CDLL]:
+        """
+        Получить libc с функциями inotify
+        :return: ctypes.CDLL: libc или None, если inotify недоступен
+        """
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            except OSError:
+                libc = None
+            cls._libc = libc if hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch') else False
+        return cls._libc or None
+
+    def _get_changed_names(self) -> Optional[Set[str]]:
+        """
+        Метод для чтения накопившихся событий inotify
+        :return: set[str]: имена файлов из событий или None, если надо сравнить всю директорию
+        """
+        changed_names = set()
+        need_rescan = False
+        while True:
+            try:
+                events_data = os.read(self._inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(events_data):
+                _, event_mask, _, name_length = self.event_header.unpack_from(events_data, position)
+                position += self.event_header.size
+                if event_mask & self.rescan_mask:
+                    need_rescan = True
+                elif name_length:
+                    changed_names.add(os.fsdecode(events_data[position:position + name_length].rstrip(b'\0')))
+                position += name_length
+        return None if need_rescan else changed_names
+
+    def close(self) -> None:
+        """
+        Закрыть дескриптор inotify
+        """
+        if self._inotify_fd >= 0:
+            os.close(self._inotify_fd)
+            self._inotify_fd = -1
+
+    def __del__(self):
+        self.close()
+
+
+def create_directory_watcher(directory: str, use_inotify: bool = True) -> PollingDirectoryWatcher:
+    """
+    Функция для создания наблюдателя за директорией: inotify, если он доступен, иначе опрос.
+    :param str directory: путь до директории
+    :param bool use_inotify: False - всегда использовать опрос
+    :return: PollingDirectoryWatcher: наблюдатель
+    """
+    if use_inotify and InotifyDirectoryWatcher.get_libc() is not None:
+        try:
+            return InotifyDirectoryWatcher(directory)
+        except OSError:
+            pass
+    return PollingDirectoryWatcher(directory)
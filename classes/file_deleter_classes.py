@@ -0,0 +1,291 @@
+import concurrent.futures
+import os
+import uuid
+
+from typing import Iterable, List, Optional
+
+from classes.metrics_classes import metrics
+from classes.stored_file_classes import StoredFile
+
+
+class FileDeleteResult:
+    """
+    Класс, предназначенный для хранения результата удаления одного файла.
+    """
+
+    def __init__(self, stored_file: StoredFile, error: Optional[OSError] = None, rolled_back: bool = False):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param StoredFile stored_file: файл
+        :param OSError error: ошибка удаления или None, если файл удалён
+        :param bool rolled_back: True если файл не удалялся, так как транзакция удаления была отменена
+        """
+        self.stored_file = stored_file
+        self.error = error
+        self.rolled_back = rolled_back
+
+    @property
+    def is_deleted(self) -> bool:
+        """
+        Удалён ли файл
+        :return: bool: True если файл удалён
+        """
+        return self.error is None and not self.rolled_back
+
+
+class FileDeleteReport:
+    """
+    Класс, предназначенный для хранения результатов удаления набора файлов в порядке передачи файлов.
+    """
+
+    def __init__(self, results: List[FileDeleteResult]):
+        """
+        Класс конструктор.
+        :param list[FileDeleteResult] results: результаты по каждому файлу
+        """
+        self.results = results
+
+    @property
+    def deleted(self) -> List[FileDeleteResult]:
+        """
+        Удалённые файлы
+        :return: list[FileDeleteResult]: результаты удалённых файлов
+        """
+        return [x for x in self.results if x.is_deleted]
+
+    @property
+    def failed(self) -> List[FileDeleteResult]:
+        """
+        Файлы, которые не удалось удалить (включая возвращённые на место при отмене транзакции)
+        :return: list[FileDeleteResult]: результаты неудалённых файлов
+        """
+        return [x for x in self.results if not x.is_deleted]
+
+    def __bool__(self) -> bool:
+        """
+        Удалены ли все файлы
+        :return: bool: True если ошибок нет
+        """
+        return all(x.is_deleted for x in self.results)
+
+
+class BulkFileDeleter:
+    """
+    Класс, предназначенный для удаления большого количества файлов. Файлы группируются по директориям,
+    удаляются пачками в пуле потоков относительно открытого дескриптора директории (dir_fd),
+    чтобы не разбирать полный путь для каждого файла. В транзакционном режиме файлы сначала
+    переименовываются в служебную директорию, и если хотя бы один файл переименовать не удалось -
+    все файлы возвращаются на место.
+    """
+    staging_prefix = '.delete_staging_'
+
+    def __init__(self, workers: int = 4, batch_size: int = 256, transactional: bool = False):
+        """
+        Класс конструктор.
+        :param int workers: количество потоков. 1 - файлы удаляются в текущем потоке
+        :param int batch_size: количество файлов в одной задаче пула
+        :param bool transactional: если True - файлы удаляются либо все, либо ни один
+        (кроме ошибок при удалении уже переименованных файлов)
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.transactional = transactional
+
+    @staticmethod
+    def _open_directory(file_directory: str) -> Optional[int]:
+        """
+        Метод для открытия директории, относительно которой будут удаляться файлы
+        :param str file_directory: путь до директории
+        :return: int: дескриптор директории или None, если dir_fd не поддерживается или директорию не открыть
+        """
+        if os.unlink not in os.supports_dir_fd or os.rename not in os.supports_dir_fd:
+            return None
+        try:
+            return os.open(file_directory, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        except OSError:
+            return None
+
+    @staticmethod
+    def _unlink_batch(file_directory: str, directory_fd: Optional[int], names: List[str]) -> List[Optional[OSError]]:
+        """
+        Метод для удаления пачки файлов одной директории
+        :param str file_directory: путь до директории
+        :param int directory_fd: дескриптор директории или None
+        :param list[str] names: имена файлов (или пути относительно директории)
+        :return: list[OSError]: ошибка для каждого файла или None
+        """
+        errors = []
+        for name in names:
+            try:
+                if directory_fd is None:
+                    os.unlink(os.path.join(file_directory, name))
+                else:
+                    os.unlink(name, dir_fd=directory_fd)
+                errors.append(None)
+            except OSError as error:
+                errors.append(error)
+        return errors
+
+    @staticmethod
+    def _rename_batch(file_directory: str, directory_fd: Optional[int],
+                      renames: List[tuple]) -> List[Optional[OSError]]:
+        """
+        Метод для переименования пачки файлов одной директории
+        :param str file_directory: путь до директории
+        :param int directory_fd: дескриптор директории или None
+        :param list[tuple] renames: пары (старый путь, новый путь) относительно директории
+        :return: list[OSError]: ошибка для каждого файла или None
+        """
+        errors = []
+        for old_name, new_name in renames:
+            try:
+                if directory_fd is None:
+                    os.rename(os.path.join(file_directory, old_name), os.path.join(file_directory, new_name))
+                else:
+                    os.rename(old_name, new_name, src_dir_fd=directory_fd, dst_dir_fd=directory_fd)
+                errors.append(None)
+            except OSError as error:
+                errors.append(error)
+        return errors
+
+    def _run_batches(self, executor: Optional[concurrent.futures.Executor], function, file_directory: str,
+                     directory_fd: Optional[int], items: list) -> List[Optional[OSError]]:
+        """
+        Метод для выполнения операции над элементами пачками по batch_size
+        :param executor: пул потоков или None для выполнения в текущем потоке
+        :param function: _unlink_batch или _rename_batch
+        :param str file_directory: путь до директории
+        :param int directory_fd: дескриптор директории или None
+        :param list items: элементы операции
+        :return: list[OSError]: ошибки в порядке элементов
+        """
+        batches = [items[x:x + self.batch_size] for x in range(0, len(items), self.batch_size)]
+        if executor is None:
+            batches_errors = [function(file_directory, directory_fd, x) for x in batches]
+        else:
+            batches_errors = executor.map(lambda x: function(file_directory, directory_fd, x), batches)
+        return [error for batch_errors in batches_errors for error in batch_errors]
+
+    @staticmethod
+    def _remove_staging(file_directory: str, staging_name: str) -> None:
+        """
+        Метод для удаления служебной директории. Если в ней остались неудалённые файлы - она сохраняется
+        :param str file_directory: путь до директории
+        :param str staging_name: имя служебной директории
+        """
+        try:
+            os.rmdir(os.path.join(file_directory, staging_name))
+        except OSError:
+            pass
+
+    def _stage_files(self, executor: Optional[concurrent.futures.Executor], file_directory: str,
+                     directory_fd: Optional[int],
+                     names: List[str]) -> (Optional[str], List[str], List[Optional[OSError]]):
+        """
+        Метод для переименования файлов директории в новую служебную директорию.
+        В служебной директории файлы получают плоские имена по порядковому номеру,
+        поэтому имена с поддиректориями не требуют создания поддиректорий.
+        :param executor: пул потоков или None
+        :param str file_directory: путь до директории
+        :param int directory_fd: дескриптор директории или None
+        :param list[str] names: имена файлов
+        :return: (str, list[str], list[OSError]): имя служебной директории (None, если её не удалось создать),
+        пути файлов в служебной директории и ошибки переименования в порядке файлов
+        """
+        staging_name = f'{self.staging_prefix}{uuid.uuid4().hex}'
+        staged_names = [os.path.join(staging_name, str(x)) for x in range(len(names))]
+        try:
+            os.mkdir(os.path.join(file_directory, staging_name))
+        except OSError as error:
+            return None, staged_names, [error] * len(names)
+        return staging_name, staged_names, self._run_batches(executor, self._rename_batch, file_directory,
+                                                             directory_fd, list(zip(names, staged_names)))
+
+    def delete_files(self, stored_files: Iterable[StoredFile]) -> FileDeleteReport:
+        """
+        Удалить файлы
+        :param stored_files: файлы для удаления
+        :return: FileDeleteReport: результат по каждому файлу в порядке передачи
+        """
+        stored_files = list(stored_files)
+        files_by_directory = {}
+        unique_indexes = {}
+        for index, stored_file in enumerate(stored_files):
+            # Файл, переданный несколько раз, удаляется один раз
+            if unique_indexes.setdefault(stored_file.full_file_name, index) == index:
+                files_by_directory.setdefault(stored_file.file_path, []).append(index)
+        errors: List[Optional[OSError]] = [None] * len(stored_files)
+        rolled_back = False
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        directory_fds = {x: self._open_directory(x) for x in files_by_directory}
+        try:
+            with metrics.timer('delete'):
+                if not self.transactional:
+                    for file_directory, indexes in files_by_directory.items():
+                        directory_errors = self._run_batches(executor, self._unlink_batch, file_directory,
+                                                             directory_fds[file_directory],
+                                                             [stored_files[x].file_name for x in indexes])
+                        for index, error in zip(indexes, directory_errors):
+                            errors[index] = error
+                else:
+                    rolled_back = self._delete_transactional(executor, stored_files, files_by_directory,
+                                                             directory_fds, errors)
+        finally:
+            for directory_fd in directory_fds.values():
+                if directory_fd is not None:
+                    os.close(directory_fd)
+            if executor is not None:
+                executor.shutdown()
+        delete_report = FileDeleteReport([FileDeleteResult(x, errors[unique_indexes[x.full_file_name]],
+                                                           rolled_back and errors[unique_indexes[x.full_file_name]]
+                                                           is None) for x in stored_files])
+        metrics.increment('deleted_files', len({x.stored_file.full_file_name for x in delete_report.deleted}))
+        return delete_report
+
+    def _delete_transactional(self, executor: Optional[concurrent.futures.Executor], stored_files: List[StoredFile],
+                              files_by_directory: dict, directory_fds: dict, errors: list) -> bool:
+        """
+        Метод для удаления файлов в транзакционном режиме. Сначала все файлы всех директорий
+        переименовываются в служебные директории. При первой ошибке переименованные файлы возвращаются
+        на место, иначе служебные директории удаляются вместе с файлами. Файл, который не удалось вернуть
+        на место, получает ошибку с путём служебной директории, где он остался.
+        :param executor: пул потоков или None
+        :param list[StoredFile] stored_files: все файлы
+        :param dict files_by_directory: директория -> индексы файлов
+        :param dict directory_fds: директория -> дескриптор или None
+        :param list errors: ошибки по индексам файлов, заполняются методом
+        :return: bool: True если транзакция отменена
+        """
+        staged_directories = []
+        for file_directory, indexes in files_by_directory.items():
+            names = [stored_files[x].file_name for x in indexes]
+            staging_name, staged_names, rename_errors = self._stage_files(
+                executor, file_directory, directory_fds[file_directory], names)
+            staged_directories.append((file_directory, staging_name, indexes, names, staged_names, rename_errors))
+            for index, error in zip(indexes, rename_errors):
+                errors[index] = error
+            if any(x is not None for x in rename_errors):
+                break
+        else:
+            for file_directory, staging_name, indexes, _, staged_names, _ in staged_directories:
+                unlink_errors = self._run_batches(executor, self._unlink_batch, file_directory,
+                                                  directory_fds[file_directory], staged_names)
+                for index, error in zip(indexes, unlink_errors):
+                    errors[index] = error
+                self._remove_staging(file_directory, staging_name)
+            return False
+        for file_directory, staging_name, indexes, names, staged_names, rename_errors in staged_directories:
+            if staging_name is None:
+                continue
+            staged_files = [(index, name, staged_name) for index, name, staged_name, error
+                            in zip(indexes, names, staged_names, rename_errors) if error is None]
+            rollback_errors = self._run_batches(executor, self._rename_batch, file_directory,
+                                                directory_fds[file_directory], [(x[2], x[1]) for x in staged_files])
+            for (index, name, staged_name), error in zip(staged_files, rollback_errors):
+                if error is not None:
+                    staged_path = os.path.join(file_directory, staged_name)
+                    errors[index] = OSError(error.errno, f'Файл {name} не удалось вернуть на место, он остался в '
+                                                         f'служебной директории как {staged_path}: {error.strerror}',
+                                            staged_path)
+            self._remove_staging(file_directory, staging_name)
+        return True
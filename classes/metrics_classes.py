@@ -0,0 +1,277 @@
+import os
+import re
+import threading
+import time
+import typing
+
+from typing import Dict, List, Optional
+
+
+COUNTER = 'counter'
+TIMER = 'timer'
+
+
+class MetricsRegistry:
+    """
+    Класс, предназначенный для накопления метрик в памяти процесса.
+    Для счётчиков хранится сумма, для таймеров - количество замеров, суммарное и максимальное время.
+    """
+
+    def __init__(self):
+        """
+        Класс конструктор. Создаёт пустые таблицы метрик.
+        """
+        self.counters: Dict[str, float] = {}
+        self.timers: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float) -> None:
+        """
+        Учесть значение метрики. Вызывается из разных потоков
+        :param str kind: COUNTER или TIMER
+        :param str name: имя метрики
+        :param float value: приращение счётчика или время в секундах
+        """
+        with self._lock:
+            if kind == COUNTER:
+                self.counters[name] = self.counters.get(name, 0) + value
+            else:
+                timer = self.timers.get(name)
+                if timer is None:
+                    self.timers[name] = [1, value, value]
+                else:
+                    timer[0] += 1
+                    timer[1] += value
+                    if value > timer[2]:
+                        timer[2] = value
+
+    def get_counter(self, name: str) -> float:
+        """
+        Получить значение счётчика
+        :param str name: имя метрики
+        :return: float: значение, 0 если метрика не учитывалась
+        """
+        return self.counters.get(name, 0)
+
+    def get_timer(self, name: str) -> (int, float, float):
+        """
+        Получить значения таймера
+        :param str name: имя метрики
+        :return: (int, float, float): количество замеров, суммарное и максимальное время в секундах
+        """
+        count, total, maximum = self.timers.get(name, (0, 0.0, 0.0))
+        return int(count), total, maximum
+
+    def reset(self) -> None:
+        """
+        Очистить накопленные метрики
+        """
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def to_prometheus(self, prefix: str = '') -> str:
+        """
+        Получить метрики в текстовом формате Prometheus. Счётчики выводятся с суффиксом _total,
+        таймеры - как summary с суффиксом _seconds и отдельный gauge с максимальным временем.
+        :param str prefix: префикс имён метрик
+        :return: str: текст в формате exposition
+        """
+        prefix = f'{prefix}_' if prefix else ''
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted((x, list(y)) for x, y in self.timers.items())
+        lines = []
+        for name, value in counters:
+            metric_name = get_prometheus_name(f'{prefix}{name}_total')
+            lines.extend((f'# TYPE {metric_name} counter', f'{metric_name} {value:g}'))
+        for name, (count, total, maximum) in timers:
+            metric_name = get_prometheus_name(f'{prefix}{name}_seconds')
+            lines.extend((f'# TYPE {metric_name} summary', f'{metric_name}_count {int(count)}',
+                          f'{metric_name}_sum {total:.9g}', f'# TYPE {metric_name}_max gauge',
+                          f'{metric_name}_max {maximum:.9g}'))
+        return '\n'.join(lines) + '\n'
+
+
+def get_prometheus_name(name: str) -> str:
+    """
+    Привести имя метрики к допустимому в Prometheus
+    :param str name: имя метрики
+    :return: str: имя из латинских букв, цифр и подчёркиваний
+    """
+    return re.sub(r'[^a-zA-Z0-9_:]', '_', name)
+
+
+class PrometheusFileSink:
+    """
+    Класс, предназначенный для записи метрик в файл в текстовом формате Prometheus
+    (например, для textfile collector node_exporter). Метрики накапливаются в своём реестре,
+    файл перезаписывается атомарно при вызове flush или не чаще заданного интервала.
+    """
+
+    def __init__(self, file_path: str, prefix: str = 'utilities_for_reuse', flush_interval: Optional[float] = None):
+        """
+        Класс конструктор.
+        :param str file_path: путь до файла метрик
+        :param str prefix: префикс имён метрик
+        :param float flush_interval: интервал автоматической записи файла в секундах.
+        None - файл записывается только при вызове flush
+        """
+        self.file_path = file_path
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.registry = MetricsRegistry()
+        self._last_flush = time.monotonic()
+
+    def record(self, kind: str, name: str, value: float) -> None:
+        """
+        Учесть значение метрики
+        :param str kind: COUNTER или TIMER
+        :param str name: имя метрики
+        :param float value: приращение счётчика или время в секундах
+        """
+        self.registry.record(kind, name, value)
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Записать накопленные метрики в файл. Запись идёт во временный файл, который затем
+        заменяет основной, чтобы читатель не увидел файл частично записанным
+        """
+        self._last_flush = time.monotonic()
+        temporary_path = f'{self.file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(self.registry.to_prometheus(self.prefix))
+        os.replace(temporary_path, self.file_path)
+
+
+class CallbackSink:
+    """
+    Класс, предназначенный для передачи каждого значения метрики в пользовательскую функцию
+    """
+
+    def __init__(self, callback: typing.Callable[[str, str, float], None]):
+        """
+        Класс конструктор.
+        :param callback: функция (вид метрики, имя метрики, значение)
+        """
+        self.callback = callback
+
+    def record(self, kind: str, name: str, value: float) -> None:
+        """
+        Передать значение метрики в функцию
+        :param str kind: COUNTER или TIMER
+        :param str name: имя метрики
+        :param float value: приращение счётчика или время в секундах
+        """
+        self.callback(kind, name, value)
+
+
+class _Timer:
+    """
+    Контекстный менеджер замера времени блока кода
+    """
+    __slots__ = ('metrics', 'name', 'start_time')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start_time = 0.0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start_time)
+
+
+class _NullTimer:
+    """
+    Контекстный менеджер, который ничего не делает. Используется при выключенных метриках
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Класс, предназначенный для учёта таймеров и счётчиков операций с файлами.
+    Значения передаются во все подключённые приёмники (MetricsRegistry, PrometheusFileSink, CallbackSink).
+    Пока приёмников нет, метрики выключены: в горячих местах код проверяет только атрибут enabled.
+    """
+
+    def __init__(self):
+        """
+        Класс конструктор. Метрики создаются выключенными.
+        """
+        self.sinks = []
+        self.enabled = False
+
+    def add_sink(self, sink) -> None:
+        """
+        Подключить приёмник метрик и включить учёт
+        :param sink: объект с методом record(kind, name, value)
+        """
+        self.sinks = self.sinks + [sink]
+        self.enabled = True
+
+    def remove_sink(self, sink) -> None:
+        """
+        Отключить приёмник метрик. Без приёмников учёт выключается
+        :param sink: ранее подключённый приёмник
+        """
+        self.sinks = [x for x in self.sinks if x is not sink]
+        self.enabled = bool(self.sinks)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        Увеличить счётчик
+        :param str name: имя метрики
+        :param float value: приращение
+        """
+        if self.enabled:
+            for sink in self.sinks:
+                sink.record(COUNTER, name, value)
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Учесть замер времени
+        :param str name: имя метрики
+        :param float seconds: время в секундах
+        """
+        if self.enabled:
+            for sink in self.sinks:
+                sink.record(TIMER, name, seconds)
+
+    def timer(self, name: str):
+        """
+        Получить контекстный менеджер замера времени блока кода
+        :param str name: имя метрики
+        :return: контекстный менеджер, при выключенных метриках - пустой
+        """
+        if self.enabled:
+            return _Timer(self, name)
+        return _NULL_TIMER
+
+    def flush(self) -> None:
+        """
+        Записать накопленные метрики приёмниками, которые это поддерживают (PrometheusFileSink)
+        """
+        for sink in self.sinks:
+            flush = getattr(sink, 'flush', None)
+            if flush is not None:
+                flush()
+
+
+# Общий объект метрик, через который учитываются операции всех классов пакета
+metrics = Metrics()
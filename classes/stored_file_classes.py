@@ -1,8 +1,14 @@
 import os
+import datetime
 from classes.misc_classes import BlockedFilesDetector
+from classes.blocked_files_classes import BulkBlockedFilesDetector
+from classes.directory_scanner_classes import DirectoryTreeScanner
+from classes.directory_watcher_classes import PollingDirectoryWatcher, create_directory_watcher
+from classes.metrics_classes import metrics
+import time
 import typing
 
-from typing import List
+from typing import Dict, Iterator, List, Optional
 
 
 class StoredFile:
@@ -11,14 +17,17 @@ class StoredFile:
     и статусе файла, включая данные о его блокировке.
     """
 
-    def __init__(self, file_path: str, file_name: str):
+    def __init__(self, file_path: str, file_name: str, file_stat: Optional[os.stat_result] = None):
         """
         Конструктор класса. При создании передаются хранимые атрибуты
         :param str file_path: путь файла, без имени файла
         :param str file_name: имя файла с расширением
+        :param os.stat_result file_stat: уже полученная информация о файле (например, из os.DirEntry).
+        Если не передана - будет получена при первом обращении к get_file_stat
         """
         self.file_path = file_path
         self.file_name = file_name
+        self.file_stat = file_stat
         self.is_valid, self.error_str = self.check_element_values()
 
     def check_element_values(self) -> (bool, str):
@@ -48,6 +57,125 @@ class StoredFile:
         """
         return os.path.join(self.file_path, self.file_name)
 
+    def get_file_stat(self) -> os.stat_result:
+        """
+        Получить информацию о файле. Результат os.stat запоминается,
+        повторные вызовы не обращаются к файловой системе.
+        :return: os.stat_result: информация о файле
+        """
+        if self.file_stat is None:
+            self.file_stat = os.stat(self.full_file_name)
+        return self.file_stat
+
+
+def _to_timestamp(date_value: typing.Union[datetime.datetime, float, None]) -> Optional[float]:
+    """
+    Привести дату к timestamp.
+    :param date_value: datetime, timestamp или None
+    :return: float: timestamp или None
+    """
+    if isinstance(date_value, datetime.datetime):
+        return date_value.timestamp()
+    return date_value
+
+
+class StoredFileFilter:
+    """
+    Класс, предназначенный для отбора файлов при чтении директории.
+    Условия по имени проверяются до обращения к файловой системе,
+    условия по размеру и дате изменения - по stat, закэшированному в os.DirEntry.
+    """
+
+    def __init__(self, extensions: Optional[typing.Iterable[str]] = None, name_prefix: Optional[str] = None,
+                 min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 modified_after: typing.Union[datetime.datetime, float, None] = None,
+                 modified_before: typing.Union[datetime.datetime, float, None] = None):
+        """
+        Класс конструктор. Все условия необязательные, не переданные условия не проверяются.
+        :param extensions: допустимые расширения файла (например, ('cer', 'del') или ('.zip',))
+        :param str name_prefix: начало имени файла
+        :param int min_size: минимальный размер файла в байтах
+        :param int max_size: максимальный размер файла в байтах
+        :param modified_after: файл изменён не раньше указанной даты (datetime или timestamp)
+        :param modified_before: файл изменён раньше указанной даты (datetime или timestamp)
+        """
+        self.extensions = None if extensions is None else tuple(
+            '.' + extension.lstrip('.') for extension in extensions)
+        self.name_prefix = name_prefix
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = _to_timestamp(modified_after)
+        self.modified_before = _to_timestamp(modified_before)
+
+    @property
+    def need_stat(self) -> bool:
+        """
+        Нужна ли информация о файле для проверки условий
+        :return: bool: True если есть условия по размеру или дате изменения
+        """
+        return any(value is not None for value in (self.min_size, self.max_size,
+                                                   self.modified_after, self.modified_before))
+
+    def match_name(self, file_name: str) -> bool:
+        """
+        Проверить имя файла
+        :param str file_name: имя файла с расширением
+        :return: bool: True если имя подходит
+        """
+        if self.name_prefix is not None and not file_name.startswith(self.name_prefix):
+            return False
+        if self.extensions is not None and not file_name.endswith(self.extensions):
+            return False
+        return True
+
+    def match_stat(self, file_stat: os.stat_result) -> bool:
+        """
+        Проверить размер и дату изменения файла
+        :param os.stat_result file_stat: информация о файле
+        :return: bool: True если файл подходит
+        """
+        if self.min_size is not None and file_stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and file_stat.st_size > self.max_size:
+            return False
+        if self.modified_after is not None and file_stat.st_mtime < self.modified_after:
+            return False
+        if self.modified_before is not None and file_stat.st_mtime >= self.modified_before:
+            return False
+        return True
+
+    def match_file(self, stored_file: StoredFile) -> bool:
+        """
+        Проверить уже созданный объект файла
+        :param StoredFile stored_file: объект файла
+        :return: bool: True если файл подходит
+        """
+        if not self.match_name(stored_file.file_name):
+            return False
+        return not self.need_stat or self.match_stat(stored_file.get_file_stat())
+
+
+class FilesChangeSet:
+    """
+    Класс, предназначенный для хранения изменений списка файлов контейнера после обновления.
+    """
+
+    def __init__(self):
+        """
+        Класс конструктор. Создаёт пустые списки изменений.
+        """
+        self.added: List[StoredFile] = []
+        self.removed: List[StoredFile] = []
+        self.renamed: List[typing.Tuple[StoredFile, StoredFile]] = []
+        self.modified: List[StoredFile] = []
+
+    def __bool__(self) -> bool:
+        """
+        Есть ли изменения
+        :return: bool: True если хотя бы один файл изменился
+        """
+        return bool(self.added or self.removed or self.renamed or self.modified)
+
 
 class StoredFileContainer:
     """
@@ -56,26 +184,302 @@ class StoredFileContainer:
     """
     path_class: typing.Type[StoredFile]
     path_class = StoredFile
+    # Общий для всех контейнеров детектор, чтобы повторные опросы могли переиспользовать снимок.
+    # Обновление снимка защищено блокировкой внутри детектора
+    bulk_blocked_files_detector = BulkBlockedFilesDetector()
 
-    def __init__(self, file_directory: str):
+    def __init__(self, file_directory: str, lazy: bool = False, file_filter: Optional[StoredFileFilter] = None,
+                 watch: bool = False, tree_scanner: Optional[DirectoryTreeScanner] = None):
         """
         Класс конструктор. Заполняет полными директориями файлов
         список для последующего использования класса
         :param str file_directory: путь файла без имени файла
+        :param bool lazy: если True - директория не читается в конструкторе, файлы создаются
+        по мере обхода iter_files, а files_list заполняется только при первом обращении
+        :param StoredFileFilter file_filter: условия отбора файлов при чтении директории
+        :param bool watch: если True - изменения директории отслеживаются (inotify или опрос)
+        и применяются к списку файлов методом refresh
+        :param DirectoryTreeScanner tree_scanner: если передан - читаются деревья директорий (корни сканера
+        или file_directory) в пуле потоков, а refresh сверяет список файлов с новым обходом.
+        Не совместим с watch
         """
+        if watch and tree_scanner is not None:
+            raise ValueError('Наблюдение за директорией не поддерживается при чтении дерева директорий')
         self.file_directory = file_directory
-        self.files_list = []
-        for files_instance in os.listdir(file_directory):
-            self.files_list.append(self.path_class(file_directory, files_instance))
+        self.file_filter = file_filter
+        self.tree_scanner = tree_scanner
+        self._files_list = None
+        # Позиции файлов в списке по имени для refresh и список, для которого они построены
+        self._file_positions: Dict[str, int] = {}
+        self._positions_list: Optional[List[StoredFile]] = None
+        self.directory_watcher: Optional[PollingDirectoryWatcher] = None
+        if watch:
+            # Наблюдатель создаётся до чтения директории, чтобы не пропустить изменения
+            self.directory_watcher = create_directory_watcher(file_directory)
+        if not lazy:
+            self._files_list = list(self.scan_files())
+
+    @property
+    def files_list(self) -> List[StoredFile]:
+        """
+        Список файлов директории. В ленивом режиме директория читается при первом обращении.
+        :return: list[StoredFile]: список файлов
+        """
+        if self._files_list is None:
+            self._files_list = list(self.scan_files())
+        return self._files_list
+
+    @files_list.setter
+    def files_list(self, files_list: List[StoredFile]):
+        self._files_list = files_list
+
+    def create_stored_file(self, file_name: str, file_stat: Optional[os.stat_result] = None,
+                           file_directory: Optional[str] = None) -> StoredFile:
+        """
+        Создать объект файла директории контейнера
+        :param str file_name: имя файла с расширением
+        :param os.stat_result file_stat: информация о файле, если уже получена
+        :param str file_directory: директория файла, по умолчанию - директория контейнера
+        :return: StoredFile: объект класса path_class
+        """
+        return self.path_class(file_directory or self.file_directory, file_name, file_stat)
+
+    def scan_files(self, file_filter: Optional[StoredFileFilter] = None) -> Iterator[StoredFile]:
+        """
+        Прочитать директорию через os.scandir и по одному возвращать объекты файлов.
+        Объекты создаются только для файлов, прошедших отбор, обход можно прервать в любой момент.
+        :param StoredFileFilter file_filter: условия отбора, по умолчанию - переданные в конструкторе
+        :return: Iterator[StoredFile]: генератор объектов класса path_class
+        """
+        file_filter = file_filter or self.file_filter
+        if self.tree_scanner is not None:
+            # Информация о файлах нужна refresh для поиска изменившихся файлов, в пуле она получается параллельно
+            for file_directory, file_name, file_stat in self.tree_scanner.scan(self.file_directory, file_filter,
+                                                                                need_stat=True):
+                yield self.create_stored_file(file_name, file_stat, file_directory)
+            return
+        # Учитывается только время внутри генератора, без времени обработки файлов вызывающим кодом
+        metrics_enabled = metrics.enabled
+        entries_count = 0
+        elapsed = 0.0
+        start_time = time.perf_counter() if metrics_enabled else 0.0
+        try:
+            with os.scandir(self.file_directory) as dir_entries:
+                for dir_entry in dir_entries:
+                    entries_count += 1
+                    file_stat = None
+                    if file_filter is not None:
+                        if not file_filter.match_name(dir_entry.name):
+                            continue
+                        if file_filter.need_stat:
+                            file_stat = dir_entry.stat()
+                            if not file_filter.match_stat(file_stat):
+                                continue
+                    stored_file = self.create_stored_file(dir_entry.name, file_stat)
+                    if metrics_enabled:
+                        elapsed += time.perf_counter() - start_time
+                    yield stored_file
+                    if metrics_enabled:
+                        start_time = time.perf_counter()
+            if metrics_enabled:
+                elapsed += time.perf_counter() - start_time
+        finally:
+            if metrics_enabled:
+                metrics.observe('listdir', elapsed)
+                metrics.increment('listdir_entries', entries_count)
+
+    def iter_files(self) -> Iterator[StoredFile]:
+        """
+        Обойти файлы контейнера. Если список файлов уже заполнен - обходится он,
+        иначе директория читается заново без заполнения files_list.
+        :return: Iterator[StoredFile]: генератор объектов класса path_class
+        """
+        if self._files_list is not None:
+            return iter(self._files_list)
+        return self.scan_files()
+
+    def _create_changed_file(self, file_name: str) -> Optional[StoredFile]:
+        """
+        Метод для создания объекта файла, появившегося или изменившегося в директории
+        :param str file_name: имя файла с расширением
+        :return: StoredFile: объект файла или None, если файл не прошёл отбор или уже удалён
+        """
+        if self.file_filter is not None and not self.file_filter.match_name(file_name):
+            return None
+        try:
+            file_stat = os.stat(os.path.join(self.file_directory, file_name))
+        except OSError:
+            return None
+        if self.file_filter is not None and not self.file_filter.match_stat(file_stat):
+            return None
+        return self.create_stored_file(file_name, file_stat)
+
+    def apply_files_changes(self, files_change_set: FilesChangeSet) -> None:
+        """
+        Метод, вызываемый после применения изменений к списку файлов.
+        Наследники обновляют в нём свои индексы.
+        :param FilesChangeSet files_change_set: изменения списка файлов
+        """
+
+    def _get_file_positions(self) -> Dict[str, int]:
+        """
+        Метод для получения позиций файлов в files_list по имени.
+        Позиции строятся заново, только если список файлов был заменён или изменён снаружи
+        :return: dict[str, int]: позиция файла по имени
+        """
+        files_list = self.files_list
+        if self._positions_list is not files_list or len(self._file_positions) != len(files_list):
+            self._file_positions = {x.file_name: i for i, x in enumerate(files_list)}
+            self._positions_list = files_list
+        return self._file_positions
+
+    def _set_file(self, file_name: str, new_file: Optional[StoredFile]) -> Optional[StoredFile]:
+        """
+        Метод для замены файла списка по имени без перестроения списка: новый файл занимает место старого,
+        при удалении на место файла переносится последний файл списка
+        :param str file_name: имя заменяемого файла
+        :param StoredFile new_file: новый файл или None, чтобы удалить файл из списка
+        :return: StoredFile: заменённый файл или None, если файла с таким именем не было
+        """
+        files_list = self.files_list
+        file_positions = self._get_file_positions()
+        position = file_positions.pop(file_name, None)
+        if position is None:
+            if new_file is not None:
+                file_positions[new_file.file_name] = len(files_list)
+                files_list.append(new_file)
+            return None
+        old_file = files_list[position]
+        if new_file is None:
+            new_file = files_list.pop()
+            if position == len(files_list):
+                return old_file
+        files_list[position] = new_file
+        file_positions[new_file.file_name] = position
+        return old_file
+
+    def refresh(self) -> FilesChangeSet:
+        """
+        Применить к списку файлов изменения директории с прошлого обновления.
+        Заново создаются только появившиеся, переименованные и изменившиеся файлы, список обновляется на месте:
+        изменившийся или переименованный файл остаётся на своей позиции, появившийся добавляется в конец,
+        на место удалённого переносится последний файл списка.
+        Если наблюдение не было включено в конструкторе - оно включается, а список файлов
+        сверяется с директорией по именам.
+        :return: FilesChangeSet: изменения списка файлов
+        """
+        if self.tree_scanner is not None:
+            return self._refresh_tree()
+        files_change_set = FilesChangeSet()
+        file_positions = self._get_file_positions()
+        if self.directory_watcher is None:
+            self.directory_watcher = create_directory_watcher(self.file_directory)
+            known_names = self.directory_watcher.get_known_names()
+            added_names = [x for x in known_names if x not in file_positions]
+            removed_names = [x for x in file_positions if x not in known_names]
+            renamed_names = []
+            modified_names = []
+        else:
+            directory_changes = self.directory_watcher.get_changes()
+            if not directory_changes:
+                return files_change_set
+            added_names = directory_changes.added
+            removed_names = directory_changes.removed
+            renamed_names = directory_changes.renamed
+            modified_names = directory_changes.modified
+        for file_name in removed_names:
+            removed_file = self._set_file(file_name, None)
+            if removed_file is not None:
+                files_change_set.removed.append(removed_file)
+        for old_file_name, new_file_name in renamed_names:
+            new_file = self._create_changed_file(new_file_name)
+            if new_file is not None and new_file_name != old_file_name:
+                # Файл мог быть переименован поверх другого файла списка
+                replaced_file = self._set_file(new_file_name, None)
+                if replaced_file is not None:
+                    files_change_set.removed.append(replaced_file)
+            old_file = self._set_file(old_file_name, new_file)
+            if old_file is not None and new_file is not None:
+                files_change_set.renamed.append((old_file, new_file))
+            elif old_file is not None:
+                files_change_set.removed.append(old_file)
+            elif new_file is not None:
+                files_change_set.added.append(new_file)
+        for file_name in list(added_names) + list(modified_names):
+            new_file = self._create_changed_file(file_name)
+            old_file = self._set_file(file_name, new_file)
+            if new_file is not None:
+                (files_change_set.added if old_file is None else files_change_set.modified).append(new_file)
+            elif old_file is not None:
+                files_change_set.removed.append(old_file)
+        self.apply_files_changes(files_change_set)
+        return files_change_set
+
+    def _refresh_tree(self) -> FilesChangeSet:
+        """
+        Метод для обновления списка файлов дерева директорий: деревья читаются заново,
+        файл считается изменившимся, если у него изменились размер или время изменения.
+        Объекты создаются только для появившихся и изменившихся файлов
+        :return: FilesChangeSet: изменения списка файлов
+        """
+        files_change_set = FilesChangeSet()
+        old_files = {x.full_file_name: x for x in self.files_list}
+        files_list = []
+        for file_directory, file_name, file_stat in self.tree_scanner.scan(self.file_directory, self.file_filter,
+                                                                            need_stat=True):
+            old_file = old_files.pop(os.path.join(file_directory, file_name), None)
+            if old_file is not None and old_file.file_stat is not None and (
+                    old_file.file_stat.st_mtime_ns, old_file.file_stat.st_size) == (
+                    file_stat.st_mtime_ns, file_stat.st_size):
+                files_list.append(old_file)
+                continue
+            new_file = self.create_stored_file(file_name, file_stat, file_directory)
+            files_list.append(new_file)
+            (files_change_set.added if old_file is None else files_change_set.modified).append(new_file)
+        files_change_set.removed.extend(old_files.values())
+        self._files_list = files_list
+        self.apply_files_changes(files_change_set)
+        return files_change_set
+
+    def close(self) -> None:
+        """
+        Остановить наблюдение за директорией
+        """
+        if self.directory_watcher is not None:
+            self.directory_watcher.close()
+            self.directory_watcher = None
 
-    def get_unlocked_files(self) -> List[StoredFile]:
+    def get_unlocked_files(self, snapshot_max_age: float = 0.0) -> List[StoredFile]:
         """
-        Проверить блокирован ли файл и отобрать неблокированные файлы
+        Проверить блокирован ли файл и отобрать неблокированные файлы.
+        Если доступна таблица открытых файлов (Linux) - она строится один раз на все файлы,
+        иначе каждый файл проверяется отдельно. В Linux заблокированным считается файл,
+        открытый на запись каким-либо процессом, а не только файл с блокировкой. Информация о файлах
+        при этом получается заново, а не из запомненного os.stat: файл мог быть заменён переименованием.
+        Исчезнувшие и недоступные файлы в результат не попадают.
+        :param float snapshot_max_age: допустимый возраст таблицы открытых файлов в секундах.
+        0 - таблица строится заново при каждом вызове
         :return: list[StoredFile]: список незаблокированных файлов
         """
         unlocked_files_list = []
-        block_files_det_obj = BlockedFilesDetector()
-        for processed_stored_file_obj in self.files_list:
-            if not block_files_det_obj.file_is_locked(processed_stored_file_obj.full_file_name):
-                unlocked_files_list.append(processed_stored_file_obj)
+        probed_files_count = 0
+        with metrics.timer('lock_probe'):
+            if self.bulk_blocked_files_detector.is_supported():
+                snapshot = self.bulk_blocked_files_detector.get_snapshot(snapshot_max_age)
+                for processed_stored_file_obj in self.iter_files():
+                    probed_files_count += 1
+                    try:
+                        is_locked = snapshot.stat_is_locked(os.stat(processed_stored_file_obj.full_file_name))
+                    except OSError:
+                        is_locked = True
+                    if not is_locked:
+                        unlocked_files_list.append(processed_stored_file_obj)
+            else:
+                block_files_det_obj = BlockedFilesDetector()
+                for processed_stored_file_obj in self.iter_files():
+                    probed_files_count += 1
+                    if not block_files_det_obj.file_is_locked(processed_stored_file_obj.full_file_name):
+                        unlocked_files_list.append(processed_stored_file_obj)
+        metrics.increment('lock_probe_files', probed_files_count)
+        metrics.increment('locked_files', probed_files_count - len(unlocked_files_list))
         return unlocked_files_list
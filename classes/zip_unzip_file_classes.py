@@ -1,9 +1,37 @@
 import zipfile
 import os
+import zlib
+import bz2
+import collections
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import queue
+import struct
+import threading
+import time
+import typing
 from classes.stored_file_classes import StoredFile
+from classes.bank_certificates_classes import certificate_name_parser
+from classes.file_deleter_classes import BulkFileDeleter, FileDeleteReport
+from classes.metrics_classes import metrics
 import logging
 
 
+COPY_CHUNK_SIZE = 1024 * 1024
+# Сигнатура дескриптора данных, который записывается после сжатых данных файла
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+# Внутренние атрибуты zipfile.ZipFile, через которые write_raw_member записывает уже сжатые данные
+RAW_WRITE_ATTRIBUTES = ('_lock', '_writecheck', '_didModify', 'fp', 'start_dir', 'filelist', 'NameToInfo')
+
+
+class OperationCancelledError(Exception):
+    """
+    Исключение, которое возникает при отмене архивации или разархивации через cancel_event
+    """
+
+
 def error_message_for_zipfile(message_value: str) -> (bool, str):
     """
     Функция для создания return.
@@ -11,24 +39,850 @@ def error_message_for_zipfile(message_value: str) -> (bool, str):
     :return (bool, str): возвращает True и строку с сообщением
     """
     logging.error(message_value)
+    metrics.increment('zip_errors')
     return True, message_value
 
 
+def get_compressor(compress_type: int, compresslevel: typing.Optional[int] = None):
+    """
+    Функция для создания компрессора, совместимого с форматом zip (raw поток без заголовков).
+    :param int compress_type: метод сжатия zipfile.ZIP_*
+    :param int compresslevel: уровень сжатия, None - уровень по умолчанию
+    :return: объект с методами compress/flush или None для ZIP_STORED
+    """
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel,
+                                zlib.DEFLATED, -15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if compresslevel is None else compresslevel)
+    if compress_type == zipfile.ZIP_LZMA:
+        return zipfile.LZMACompressor()
+    return None
+
+
+def get_decompressor(compress_type: int):
+    """
+    Функция для создания декомпрессора сжатых данных файла zip (raw поток без заголовков).
+    :param int compress_type: метод сжатия zipfile.ZIP_*
+    :return: объект с методом decompress или None для ZIP_STORED
+    """
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Decompressor()
+    if compress_type == zipfile.ZIP_LZMA:
+        return zipfile.LZMADecompressor()
+    raise NotImplementedError(f'Метод сжатия {compress_type} не поддерживается')
+
+
+class CompressionPolicy:
+    """
+    Класс, предназначенный для хранения настроек сжатия файлов в архиве.
+    """
+
+    def __init__(self, compress_type: int = zipfile.ZIP_DEFLATED, compresslevel: typing.Optional[int] = None,
+                 store_incompressible: bool = False, sample_size: int = 64 * 1024):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param int compress_type: метод сжатия: zipfile.ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2 или ZIP_LZMA
+        :param int compresslevel: уровень сжатия, None - уровень по умолчанию для метода
+        :param bool store_incompressible: если True - первый блок файла пробно сжимается,
+        и если он не уменьшился, файл сохраняется без сжатия
+        :param int sample_size: размер пробного блока в байтах
+        """
+        self.compress_type = compress_type
+        self.compresslevel = compresslevel
+        self.store_incompressible = store_incompressible
+        self.sample_size = sample_size
+
+    def is_compressible(self, sample: bytes) -> bool:
+        """
+        Проверить, уменьшается ли пробный блок при сжатии
+        :param bytes sample: первый блок файла
+        :return: bool: True если сжатие уменьшает размер блока
+        """
+        compressor = get_compressor(self.compress_type, self.compresslevel)
+        if compressor is None or not sample:
+            return True
+        return len(compressor.compress(sample)) + len(compressor.flush()) < len(sample)
+
+    def resolve(self, file_path: str) -> (int, typing.Optional[int]):
+        """
+        Определить метод и уровень сжатия для файла
+        :param str file_path: полный путь файла
+        :return: (int, int): метод и уровень сжатия
+        """
+        if self.store_incompressible and self.compress_type != zipfile.ZIP_STORED:
+            with open(file_path, 'rb') as source_file:
+                if not self.is_compressible(source_file.read(self.sample_size)):
+                    return zipfile.ZIP_STORED, None
+        return self.compress_type, self.compresslevel
+
+
+class CompressedMember:
+    """
+    Класс, предназначенный для хранения сжатых данных файла, готовых к записи в архив.
+    """
+
+    def __init__(self, compress_type: int, crc: int, file_size: int, raw_data: bytes, elapsed: float = 0.0):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param int compress_type: метод сжатия zipfile.ZIP_*, которым получены raw_data
+        :param int crc: CRC32 исходных данных
+        :param int file_size: размер исходных данных
+        :param bytes raw_data: сжатые данные (bytes или memoryview, например ArchiveView.get_raw_view)
+        :param float elapsed: время сжатия в секундах
+        """
+        self.compress_type = compress_type
+        self.crc = crc
+        self.file_size = file_size
+        self.raw_data = raw_data
+        self.elapsed = elapsed
+
+
+def compress_member(file_path: str, compression_policy: CompressionPolicy) -> CompressedMember:
+    """
+    Функция для сжатия файла в отдельном процессе. Результат записывается в архив через write_raw_member.
+    :param str file_path: полный путь файла
+    :param CompressionPolicy compression_policy: настройки сжатия
+    :return: CompressedMember: сжатые данные файла
+    """
+    start_time = time.perf_counter()
+    compress_type, compresslevel = compression_policy.resolve(file_path)
+    compressor = get_compressor(compress_type, compresslevel)
+    crc = 0
+    file_size = 0
+    compressed_chunks = []
+    with open(file_path, 'rb') as source_file:
+        while True:
+            chunk = source_file.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            compressed_chunks.append(chunk if compressor is None else compressor.compress(chunk))
+    if compressor is not None:
+        compressed_chunks.append(compressor.flush())
+    return CompressedMember(compress_type, crc, file_size, b''.join(compressed_chunks),
+                            time.perf_counter() - start_time)
+
+
+def can_write_raw_member(zip_obj: zipfile.ZipFile) -> bool:
+    """
+    Функция для проверки, можно ли записать в архив уже сжатые данные без повторного сжатия.
+    Для этого нужны внутренние атрибуты zipfile, которых может не быть в другой версии Python,
+    архив с перемещением по файлу и отсутствие другого открытого на запись файла архива.
+    :param zipfile.ZipFile zip_obj: архив, открытый на запись
+    :return: bool: True если write_raw_member запишет данные как есть
+    """
+    return (all(hasattr(zip_obj, x) for x in RAW_WRITE_ATTRIBUTES) and hasattr(zipfile.ZipInfo, 'FileHeader') and
+            getattr(zip_obj, '_seekable', False) and not getattr(zip_obj, '_writing', True))
+
+
+def write_recompressed_member(zip_obj: zipfile.ZipFile, zip_info: zipfile.ZipInfo,
+                              compressed_member: CompressedMember) -> None:
+    """
+    Функция для записи сжатых данных через ZipFile.open, если их нельзя записать как есть:
+    данные распаковываются по частям и сжимаются заново тем же методом.
+    :param zipfile.ZipFile zip_obj: архив, открытый на запись
+    :param zipfile.ZipInfo zip_info: описание файла в архиве с заполненными методом сжатия и размером
+    :param CompressedMember compressed_member: сжатые данные файла
+    """
+    if zip_info.flag_bits & 0x1:
+        raise NotImplementedError(f'Зашифрованный файл {zip_info.filename} нельзя записать без внутренних '
+                                  f'атрибутов zipfile')
+    decompressor = get_decompressor(compressed_member.compress_type)
+    raw_view = memoryview(compressed_member.raw_data).cast('B')
+    crc = 0
+    try:
+        with zip_obj.open(zip_info, 'w') as member_file:
+            for chunk_start in range(0, len(raw_view), COPY_CHUNK_SIZE):
+                chunk = raw_view[chunk_start:chunk_start + COPY_CHUNK_SIZE]
+                data = chunk if decompressor is None else decompressor.decompress(chunk)
+                crc = zlib.crc32(data, crc)
+                member_file.write(data)
+    finally:
+        raw_view.release()
+    if crc != compressed_member.crc:
+        raise zipfile.BadZipFile(f'Bad CRC-32 for file {zip_info.filename!r}')
+
+
+def write_raw_member(zip_obj: zipfile.ZipFile, zip_info: zipfile.ZipInfo, compressed_member: CompressedMember) -> None:
+    """
+    Функция для записи в архив уже сжатых данных без повторного сжатия.
+    Если can_write_raw_member не разрешает запись как есть, файл перепаковывается write_recompressed_member.
+    У зашифрованных файлов сохраняется флаг дескриптора данных: от него зависит проверочный байт
+    заголовка шифрования, поэтому для них после данных записывается дескриптор.
+    :param zipfile.ZipFile zip_obj: архив, открытый на запись
+    :param zipfile.ZipInfo zip_info: описание файла в архиве
+    :param CompressedMember compressed_member: сжатые данные файла
+    """
+    zip_info.compress_type = compressed_member.compress_type
+    zip_info.CRC = compressed_member.crc
+    zip_info.file_size = compressed_member.file_size
+    zip_info.compress_size = len(compressed_member.raw_data)
+    if not can_write_raw_member(zip_obj):
+        write_recompressed_member(zip_obj, zip_info, compressed_member)
+        return
+    if not zip_info.flag_bits & 0x1:
+        # Размеры известны заранее, дескриптор данных после файла не нужен
+        zip_info.flag_bits &= ~0x08
+    zip64 = zip_info.file_size > zipfile.ZIP64_LIMIT or zip_info.compress_size > zipfile.ZIP64_LIMIT
+    with zip_obj._lock:
+        zip_obj._writecheck(zip_info)
+        zip_obj._didModify = True
+        zip_obj.fp.seek(zip_obj.start_dir)
+        zip_info.header_offset = zip_obj.fp.tell()
+        zip_obj.fp.write(zip_info.FileHeader(zip64))
+        zip_obj.fp.write(compressed_member.raw_data)
+        if zip_info.flag_bits & 0x08:
+            zip_obj.fp.write(struct.pack('<LLQQ' if zip64 else '<LLLL', DATA_DESCRIPTOR_SIGNATURE, zip_info.CRC,
+                                         zip_info.compress_size, zip_info.file_size))
+        zip_obj.filelist.append(zip_info)
+        zip_obj.NameToInfo[zip_info.filename] = zip_info
+        zip_obj.start_dir = zip_obj.fp.tell()
+
+
+def advise_file(file_descriptor: int, offset: int, length: int, advice_name: str) -> None:
+    """
+    Функция для передачи ядру подсказки о порядке чтения файла (posix_fadvise).
+    На системах без posix_fadvise ничего не делает.
+    :param int file_descriptor: дескриптор файла
+    :param int offset: начало диапазона
+    :param int length: длина диапазона, 0 - до конца файла
+    :param str advice_name: имя подсказки без префикса POSIX_FADV_, например 'SEQUENTIAL'
+    """
+    advice = getattr(os, f'POSIX_FADV_{advice_name}', None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(file_descriptor, offset, length, advice)
+    except OSError:
+        # Подсказка необязательна, например файловая система может её не поддерживать
+        pass
+
+
+def write_member_streamed(zip_obj: zipfile.ZipFile, file_path: str, arcname: str, compress_type: int,
+                          compresslevel: typing.Optional[int], buffer: bytearray,
+                          force_zip64: bool = False,
+                          progress_callback: typing.Optional[typing.Callable[[str, int, int], None]] = None) -> None:
+    """
+    Функция для записи файла в архив частями через переданный буфер. Память не зависит от размера файла:
+    файл читается в буфер, уже прочитанные страницы убираются из кэша, следующие подгружаются заранее.
+    :param zipfile.ZipFile zip_obj: архив, открытый на запись
+    :param str file_path: полный путь файла
+    :param str arcname: имя файла в архиве
+    :param int compress_type: метод сжатия zipfile.ZIP_*
+    :param int compresslevel: уровень сжатия
+    :param bytearray buffer: буфер, размер которого задаёт размер части
+    :param bool force_zip64: True - всегда писать заголовки Zip64, иначе zipfile пишет их сам,
+    если размер файла с запасом на сжатие больше zipfile.ZIP64_LIMIT (2 ГБ)
+    :param progress_callback: функция (имя в архиве, записано байт, размер файла), вызывается после каждой части
+    """
+    zip_info = zipfile.ZipInfo.from_file(file_path, arcname)
+    zip_info.compress_type = compress_type
+    zip_info._compresslevel = compresslevel
+    file_size = zip_info.file_size
+    buffer_view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as source_file, \
+            zip_obj.open(zip_info, 'w', force_zip64=force_zip64) as member_file:
+        file_descriptor = source_file.fileno()
+        advise_file(file_descriptor, 0, 0, 'SEQUENTIAL')
+        advise_file(file_descriptor, 0, len(buffer), 'WILLNEED')
+        written_size = 0
+        while True:
+            read_size = source_file.readinto(buffer)
+            if not read_size:
+                break
+            advise_file(file_descriptor, written_size + read_size, len(buffer), 'WILLNEED')
+            member_file.write(buffer_view[:read_size])
+            advise_file(file_descriptor, written_size, read_size, 'DONTNEED')
+            written_size += read_size
+            if progress_callback is not None:
+                progress_callback(arcname, written_size, file_size)
+    buffer_view.release()
+
+
+def fsync_file(file_path: str) -> None:
+    """
+    Функция для сброса содержимого файла на диск
+    :param str file_path: полный путь файла
+    """
+    with open(file_path, 'rb+') as synced_file:
+        os.fsync(synced_file.fileno())
+
+
+def fsync_directory(directory: str) -> None:
+    """
+    Функция для сброса на диск записей директории, чтобы созданный или заменённый через os.replace файл
+    не пропал после сбоя питания. В Windows директорию открыть нельзя, там функция ничего не делает
+    :param str directory: путь директории
+    """
+    if os.name == 'nt':
+        return
+    directory_descriptor = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(directory_descriptor)
+    finally:
+        os.close(directory_descriptor)
+
+
+def iter_compressed_members(executor: concurrent.futures.Executor,
+                            members: typing.Iterable[typing.Tuple[str, CompressionPolicy]],
+                            max_pending: int) -> typing.Iterator[CompressedMember]:
+    """
+    Функция для сжатия файлов в пуле с сохранением порядка. Одновременно в работе
+    не больше max_pending файлов, чтобы сжатые данные не копились в памяти.
+    :param concurrent.futures.Executor executor: пул процессов
+    :param members: пары (полный путь файла, настройки сжатия)
+    :param int max_pending: максимальное количество файлов в работе
+    :return: Iterator[CompressedMember]: результаты compress_member в порядке файлов
+    """
+    members = iter(members)
+    pending_futures = collections.deque()
+
+    def submit_next_member():
+        member = next(members, None)
+        if member is not None:
+            pending_futures.append(executor.submit(compress_member, *member))
+
+    for _ in range(max_pending):
+        submit_next_member()
+    while pending_futures:
+        result = pending_futures.popleft().result()
+        submit_next_member()
+        yield result
+
+
+class ZipMemberReport:
+    """
+    Класс, предназначенный для хранения результата добавления файла в архив.
+    """
+
+    def __init__(self, file_name: str, compress_type: int, file_size: int, compress_size: int, elapsed: float):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str file_name: имя файла в архиве
+        :param int compress_type: использованный метод сжатия zipfile.ZIP_*
+        :param int file_size: размер исходного файла
+        :param int compress_size: размер файла в архиве
+        :param float elapsed: время сжатия в секундах
+        """
+        self.file_name = file_name
+        self.compress_type = compress_type
+        self.file_size = file_size
+        self.compress_size = compress_size
+        self.elapsed = elapsed
+
+    @property
+    def ratio(self) -> float:
+        """
+        Степень сжатия
+        :return: float: отношение размера в архиве к исходному размеру (1.0 для пустого файла)
+        """
+        return self.compress_size / self.file_size if self.file_size else 1.0
+
+
+def get_member_data_offset(archive_file: typing.BinaryIO, zip_info: zipfile.ZipInfo) -> int:
+    """
+    Функция для получения смещения сжатых данных файла в архиве по его локальному заголовку.
+    :param archive_file: архив, открытый на чтение в двоичном режиме (файл или mmap)
+    :param zipfile.ZipInfo zip_info: описание файла в архиве
+    :return: int: смещение первого байта сжатых данных от начала архива
+    """
+    archive_file.seek(zip_info.header_offset)
+    return parse_member_data_offset(archive_file.read(zipfile.sizeFileHeader), zip_info)
+
+
+def parse_member_data_offset(file_header: bytes, zip_info: zipfile.ZipInfo) -> int:
+    """
+    Функция для получения смещения сжатых данных файла из уже прочитанного локального заголовка
+    :param bytes file_header: первые zipfile.sizeFileHeader байт локального заголовка
+    :param zipfile.ZipInfo zip_info: описание файла в архиве
+    :return: int: смещение первого байта сжатых данных от начала архива
+    """
+    if len(file_header) != zipfile.sizeFileHeader or file_header[0:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f'Неверный локальный заголовок файла {zip_info.filename}')
+    file_name_length, extra_length = struct.unpack('<HH', file_header[26:30])
+    return zip_info.header_offset + zipfile.sizeFileHeader + file_name_length + extra_length
+
+
+def read_raw_member(archive_file: typing.BinaryIO, zip_info: zipfile.ZipInfo) -> CompressedMember:
+    """
+    Функция для чтения сжатых данных файла архива без распаковки.
+    :param archive_file: архив, открытый на чтение в двоичном режиме
+    :param zipfile.ZipInfo zip_info: описание файла в архиве
+    :return: CompressedMember: сжатые данные файла
+    """
+    archive_file.seek(get_member_data_offset(archive_file, zip_info))
+    raw_data = archive_file.read(zip_info.compress_size)
+    if len(raw_data) != zip_info.compress_size:
+        raise zipfile.BadZipFile(f'Неожиданный конец сжатых данных файла {zip_info.filename}')
+    return CompressedMember(zip_info.compress_type, zip_info.CRC, zip_info.file_size, raw_data)
+
+
+def strip_zip64_extra(extra: bytes) -> bytes:
+    """
+    Функция для удаления записи zip64 из дополнительного поля заголовка.
+    Запись zip64 формируется заново при записи файла в новый архив.
+    :param bytes extra: дополнительное поле заголовка
+    :return: bytes: дополнительное поле без записи zip64
+    """
+    stripped_extra = []
+    position = 0
+    while position + 4 <= len(extra):
+        extra_type, extra_length = struct.unpack('<HH', extra[position:position + 4])
+        if extra_type != 0x0001:
+            stripped_extra.append(extra[position:position + 4 + extra_length])
+        position += 4 + extra_length
+    return b''.join(stripped_extra)
+
+
+def copy_zip_info(zip_info: zipfile.ZipInfo, filename: typing.Optional[str] = None) -> zipfile.ZipInfo:
+    """
+    Функция для создания описания файла для записи в другой архив.
+    :param zipfile.ZipInfo zip_info: описание файла в исходном архиве
+    :param str filename: новое имя файла, по умолчанию - прежнее
+    :return: zipfile.ZipInfo: новое описание файла
+    """
+    new_zip_info = zipfile.ZipInfo(filename or zip_info.filename, zip_info.date_time)
+    for attribute in ('compress_type', 'comment', 'create_system', 'create_version', 'extract_version',
+                      'flag_bits', 'volume', 'internal_attr', 'external_attr'):
+        setattr(new_zip_info, attribute, getattr(zip_info, attribute))
+    new_zip_info.extra = strip_zip64_extra(zip_info.extra)
+    return new_zip_info
+
+
+def get_file_sha256(file_path: str) -> str:
+    """
+    Функция для подсчёта SHA-256 файла
+    :param str file_path: полный путь файла
+    :return: str: SHA-256 в шестнадцатеричном виде
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as source_file:
+        while True:
+            chunk = source_file.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class ArchiveManifest:
+    """
+    Класс, предназначенный для хранения описания файлов архива в файле рядом с архивом.
+    По описанию можно определить изменившиеся файлы, не открывая архив.
+    """
+    manifest_suffix = '.manifest.json'
+
+    def __init__(self, members: typing.Optional[dict[str, dict]] = None):
+        """
+        Класс конструктор.
+        :param dict[str, dict] members: имя файла в архиве -> {'size', 'mtime_ns', 'crc', 'sha256'}
+        """
+        self.members = members or {}
+
+    @classmethod
+    def get_manifest_path(cls, archive_full_path: str) -> str:
+        """
+        Получить путь файла описания архива
+        :param str archive_full_path: полный путь архива
+        :return: str: полный путь файла описания
+        """
+        return archive_full_path + cls.manifest_suffix
+
+    @classmethod
+    def load(cls, archive_full_path: str) -> typing.Optional['ArchiveManifest']:
+        """
+        Прочитать описание архива
+        :param str archive_full_path: полный путь архива
+        :return: ArchiveManifest: описание или None, если файла описания нет или он испорчен
+        """
+        try:
+            with open(cls.get_manifest_path(archive_full_path), 'r', encoding='utf-8') as manifest_file:
+                return cls(json.load(manifest_file)['members'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, archive_full_path: str) -> None:
+        """
+        Записать описание архива. Файл заменяется целиком, чтобы не остался записанным наполовину.
+        :param str archive_full_path: полный путь архива
+        """
+        manifest_path = self.get_manifest_path(archive_full_path)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+            json.dump({'members': self.members}, manifest_file, ensure_ascii=False, indent=1)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    @staticmethod
+    def remove(archive_full_path: str) -> None:
+        """
+        Удалить описание архива, если оно есть
+        :param str archive_full_path: полный путь архива
+        """
+        try:
+            os.remove(ArchiveManifest.get_manifest_path(archive_full_path))
+        except FileNotFoundError:
+            pass
+
+    def set_member(self, member_name: str, file_stat: os.stat_result, crc: int,
+                   sha256: typing.Optional[str] = None) -> None:
+        """
+        Записать описание файла
+        :param str member_name: имя файла в архиве
+        :param os.stat_result file_stat: информация об исходном файле на момент добавления
+        :param int crc: CRC32 файла
+        :param str sha256: SHA-256 файла, если подсчитан
+        """
+        self.members[member_name] = {'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns, 'crc': crc}
+        if sha256 is not None:
+            self.members[member_name]['sha256'] = sha256
+
+
 class ZipFile:
     """
     Компонента предназначенная для архивации файлов в архив
     """
+    # Файлы больше этого размера не сжимаются в пуле процессов, так как пул держит сжатые данные файла
+    # в памяти целиком, а записываются частями в текущем процессе
+    parallel_member_max_size = 64 * 1024 * 1024
 
-    def __init__(self, archive_path: str, archive_name: str, files_to_zip: list[StoredFile]):
+    def __init__(self, archive_path: str, archive_name: str, files_to_zip: list[StoredFile], workers: int = 1,
+                 compression_policy: typing.Optional[CompressionPolicy] = None,
+                 member_policies: typing.Optional[dict[str, CompressionPolicy]] = None,
+                 update_mode: bool = False, change_detection: str = 'stat',
+                 cancel_event: typing.Optional[threading.Event] = None, chunk_size: typing.Optional[int] = None,
+                 force_zip64: bool = False, fsync: bool = False,
+                 progress_callback: typing.Optional[typing.Callable[[str, int, int], None]] = None,
+                 write_manifest: bool = False, file_deleter: typing.Optional[BulkFileDeleter] = None):
         """
         Класс конструктор. При создании передаются хранимые атрибуты.
         :param str archive_path: путь, по которому будет создан архив
         :param str archive_name: имя архива
         :param list[StoredFile] files_to_zip: список передаваемых экземпляров класса StoredFile
+        :param int workers: количество процессов для сжатия файлов. 1 - файлы сжимаются в текущем процессе
+        :param CompressionPolicy compression_policy: настройки сжатия архива, по умолчанию - ZIP_DEFLATED
+        :param dict[str, CompressionPolicy] member_policies: настройки сжатия по расширению файла,
+        например {'.pdf': CompressionPolicy(zipfile.ZIP_STORED)}
+        :param bool update_mode: если True и архив уже есть - в него добавляются только новые и изменившиеся
+        файлы, а рядом с архивом ведётся файл описания ArchiveManifest
+        :param str change_detection: способ определения изменившихся файлов: 'stat' - по размеру и
+        времени изменения, 'hash' - по размеру и SHA-256 содержимого
+        :param threading.Event cancel_event: признак отмены архивации. Проверяется перед каждым файлом,
+        при отмене архив возвращается в состояние до вызова make_zip_files
+        :param int chunk_size: размер части для потоковой записи файлов через переиспользуемый буфер.
+        None - файлы записываются zipfile.ZipFile.write
+        :param bool force_zip64: заголовки Zip64 при потоковой записи: True - всегда, False - только для файлов,
+        которые с запасом на сжатие больше zipfile.ZIP64_LIMIT (2 ГБ). Если файл при этом вырастет во время записи
+        больше ограничения, make_zip_files вернёт ошибку
+        :param bool fsync: если True - архив и запись о нём в директории сбрасываются на диск
+        перед возвратом результата
+        :param progress_callback: функция (имя в архиве, записано байт, размер файла). При потоковой записи
+        вызывается после каждой части, иначе - после записи файла
+        :param bool write_manifest: если True - рядом с архивом записывается ArchiveManifest с SHA-256
+        каждого файла, по которому UnZipFile.verify_archive проверяет содержимое
+        :param BulkFileDeleter file_deleter: способ удаления исходных файлов, по умолчанию - пачками в пуле потоков.
+        Для удаления по принципу "все или ничего" - BulkFileDeleter(transactional=True)
         """
         self.archive_path = archive_path
         self.archive_name = archive_name
         self.files_to_zip = files_to_zip
+        self.workers = workers
+        self.compression_policy = compression_policy or CompressionPolicy()
+        self.member_policies = {x.lower(): y for x, y in (member_policies or {}).items()}
+        self.update_mode = update_mode
+        self.change_detection = change_detection
+        self.cancel_event = cancel_event
+        self.chunk_size = chunk_size
+        self.force_zip64 = force_zip64
+        self.fsync = fsync
+        self.progress_callback = progress_callback
+        self.write_manifest = write_manifest
+        self.file_deleter = file_deleter or BulkFileDeleter()
+        self.report: list[ZipMemberReport] = []
+        self.delete_report: typing.Optional[FileDeleteReport] = None
+
+    def get_member_policy(self, stored_file: StoredFile) -> CompressionPolicy:
+        """
+        Получить настройки сжатия файла
+        :param StoredFile stored_file: файл
+        :return: CompressionPolicy: настройки по расширению файла или настройки архива
+        """
+        extension = os.path.splitext(stored_file.file_name)[1].lower()
+        return self.member_policies.get(extension, self.compression_policy)
+
+    def _write_members(self, my_zip: zipfile.ZipFile, files_to_zip: list[StoredFile],
+                       manifest: typing.Optional[ArchiveManifest]) -> typing.Optional[tuple]:
+        """
+        Метод для добавления файлов в открытый на запись архив.
+        :param zipfile.ZipFile my_zip: архив
+        :param list[StoredFile] files_to_zip: файлы для добавления
+        :param ArchiveManifest manifest: описание архива, в которое записываются добавленные файлы
+        :return: tuple: (StoredFile, FileNotFoundError) для файла, который не удалось добавить, или None
+        """
+        executor = None
+        compressed_members = None
+        buffer = bytearray(self.chunk_size) if self.chunk_size else None
+        pooled_indexes = set()
+        if self.workers > 1:
+            for index, unzipped_file in enumerate(files_to_zip):
+                try:
+                    file_stat = os.stat(unzipped_file.full_file_name)
+                except OSError:
+                    continue
+                if os.path.isdir(unzipped_file.full_file_name):
+                    continue
+                if file_stat.st_size <= self.parallel_member_max_size:
+                    pooled_indexes.add(index)
+                elif buffer is None:
+                    # Большие файлы записываются частями и без заданного chunk_size
+                    buffer = bytearray(COPY_CHUNK_SIZE)
+            executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+            compressed_members = iter_compressed_members(
+                executor, ((x.full_file_name, self.get_member_policy(x)) for index, x in enumerate(files_to_zip)
+                           if index in pooled_indexes), self.workers * 2)
+        try:
+            for index, unzipped_file in enumerate(files_to_zip):
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise OperationCancelledError(f'Архивация {self.archive_name} отменена')
+                unzipped_file_path = unzipped_file.full_file_name
+                streamed = False
+                try:
+                    file_stat = os.stat(unzipped_file_path)
+                    start_time = time.perf_counter()
+                    if os.path.isdir(unzipped_file_path):
+                        my_zip.write(unzipped_file_path, unzipped_file.file_name)
+                    elif index not in pooled_indexes:
+                        compress_type, compresslevel = self.get_member_policy(unzipped_file).resolve(
+                            unzipped_file_path)
+                        if buffer is None:
+                            my_zip.write(unzipped_file_path, unzipped_file.file_name,
+                                         compress_type=compress_type, compresslevel=compresslevel)
+                        else:
+                            write_member_streamed(my_zip, unzipped_file_path, unzipped_file.file_name,
+                                                  compress_type, compresslevel, buffer, self.force_zip64,
+                                                  self.progress_callback)
+                            streamed = True
+                    else:
+                        zip_info = zipfile.ZipInfo.from_file(unzipped_file_path, unzipped_file.file_name)
+                        compressed_member = next(compressed_members)
+                        write_raw_member(my_zip, zip_info, compressed_member)
+                        # Сжатие выполнено в пуле, учитывается его время, а не время записи
+                        start_time = time.perf_counter() - compressed_member.elapsed
+                    elapsed = time.perf_counter() - start_time
+                    zip_info = my_zip.filelist[-1]
+                    if self.progress_callback is not None and not streamed:
+                        self.progress_callback(zip_info.filename, zip_info.file_size, zip_info.file_size)
+                    self.report.append(ZipMemberReport(zip_info.filename, zip_info.compress_type,
+                                                       zip_info.file_size, zip_info.compress_size, elapsed))
+                    if metrics.enabled:
+                        metrics.observe('zip_member_compress', elapsed)
+                        metrics.increment('zip_bytes_in', zip_info.file_size)
+                        metrics.increment('zip_bytes_out', zip_info.compress_size)
+                    if manifest is not None:
+                        need_sha256 = self.change_detection == 'hash' or self.write_manifest
+                        manifest.set_member(zip_info.filename, file_stat, zip_info.CRC, get_file_sha256(
+                            unzipped_file_path) if need_sha256 and not zip_info.is_dir() else None)
+                    logging.info(f'Файл {unzipped_file.file_name} был успешно добавлен в архив {self.archive_name}')
+                except FileNotFoundError as fnfe:
+                    return unzipped_file, fnfe
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return None
+
+    def _file_is_changed(self, stored_file: StoredFile, zip_info: zipfile.ZipInfo,
+                         manifest_member: typing.Optional[dict]) -> bool:
+        """
+        Метод для проверки, изменился ли файл с момента добавления в архив.
+        Если описания файла нет - файл сравнивается с заголовком в архиве.
+        :param StoredFile stored_file: файл
+        :param zipfile.ZipInfo zip_info: описание файла в архиве
+        :param dict manifest_member: описание файла из ArchiveManifest
+        :return: bool: True если файл надо записать в архив заново
+        """
+        file_stat = os.stat(stored_file.full_file_name)
+        if file_stat.st_size != zip_info.file_size:
+            return True
+        if self.change_detection == 'hash':
+            if manifest_member is not None and 'sha256' in manifest_member:
+                return get_file_sha256(stored_file.full_file_name) != manifest_member['sha256']
+            crc = 0
+            with open(stored_file.full_file_name, 'rb') as source_file:
+                for chunk in iter(lambda: source_file.read(COPY_CHUNK_SIZE), b''):
+                    crc = zlib.crc32(chunk, crc)
+            return crc != zip_info.CRC
+        if manifest_member is not None:
+            return file_stat.st_mtime_ns != manifest_member.get('mtime_ns')
+        # В заголовке zip время хранится с точностью до 2 секунд
+        file_date_time = time.localtime(file_stat.st_mtime)[:6]
+        return file_date_time[:5] + (file_date_time[5] // 2 * 2,) != zip_info.date_time
+
+    def _create_archive(self, archive_full_path: str) -> typing.Optional[tuple]:
+        """
+        Метод для создания архива из всех переданных файлов. При ошибке архив удаляется.
+        :param str archive_full_path: полный путь архива
+        :return: tuple: результат make_zip_files при ошибке или None
+        """
+        my_zip = zipfile.ZipFile(archive_full_path, mode='w', compression=zipfile.ZIP_DEFLATED)
+        if not os.path.isfile(archive_full_path):
+            return error_message_for_zipfile(f'Архив {self.archive_name} не был найден!')
+        manifest = ArchiveManifest() if self.update_mode or self.write_manifest else None
+        try:
+            failed_member = self._write_members(my_zip, self.files_to_zip, manifest)
+        except BaseException:
+            # Закрытие тоже может завершиться ошибкой, например если файл вырос больше ограничения без Zip64
+            try:
+                my_zip.close()
+            finally:
+                os.remove(archive_full_path)
+            raise
+        my_zip.close()
+        if failed_member is not None:
+            os.remove(archive_full_path)
+            unzipped_file, fnfe = failed_member
+            return error_message_for_zipfile(f'Файла {unzipped_file.file_name} не найдено по пути '
+                                             f'{unzipped_file.file_path}! Ошибка {fnfe}')
+        if len(my_zip.infolist()) < 1:
+            os.remove(archive_full_path)
+            return error_message_for_zipfile(f'Архив {archive_full_path} пуст!')
+        if manifest is not None:
+            manifest.save(archive_full_path)
+        else:
+            # Описание от предыдущего архива с тем же именем больше не соответствует архиву
+            ArchiveManifest.remove(archive_full_path)
+        return None
+
+    def _update_archive(self, archive_full_path: str) -> typing.Optional[tuple]:
+        """
+        Метод для добавления в существующий архив новых и изменившихся файлов.
+        Новые файлы дописываются в конец архива. Если есть изменившиеся файлы - архив собирается
+        заново во временный файл: неизменившиеся файлы копируются без повторного сжатия.
+        При ошибке архив остаётся в прежнем состоянии.
+        :param str archive_full_path: полный путь архива
+        :return: tuple: результат make_zip_files при ошибке или None
+        """
+        manifest = ArchiveManifest.load(archive_full_path)
+        with zipfile.ZipFile(archive_full_path, mode='r') as existing_zip:
+            existing_members = {x.filename: x for x in existing_zip.infolist()}
+        if manifest is None:
+            manifest = ArchiveManifest()
+        new_files = []
+        changed_files = []
+        for stored_file in self.files_to_zip:
+            zip_info = existing_members.get(stored_file.file_name)
+            try:
+                if zip_info is None:
+                    new_files.append(stored_file)
+                elif self._file_is_changed(stored_file, zip_info, manifest.members.get(stored_file.file_name)):
+                    changed_files.append(stored_file)
+            except FileNotFoundError as fnfe:
+                return error_message_for_zipfile(f'Файла {stored_file.file_name} не найдено по пути '
+                                                 f'{stored_file.file_path}! Ошибка {fnfe}')
+        if changed_files:
+            failed_member = self._rebuild_archive(archive_full_path, existing_members, changed_files + new_files,
+                                                  manifest)
+        elif new_files:
+            failed_member = self._append_to_archive(archive_full_path, new_files, manifest)
+        else:
+            failed_member = None
+        if failed_member is not None:
+            unzipped_file, fnfe = failed_member
+            return error_message_for_zipfile(f'Файла {unzipped_file.file_name} не найдено по пути '
+                                             f'{unzipped_file.file_path}! Ошибка {fnfe}')
+        written_members = {x.file_name for x in self.report}
+        for member_name in list(manifest.members):
+            if member_name not in existing_members and member_name not in written_members:
+                del manifest.members[member_name]
+        manifest.save(archive_full_path)
+        logging.info(f'Архив {self.archive_name}: добавлено файлов {len(new_files)}, '
+                     f'заменено файлов {len(changed_files)}')
+        return None
+
+    def _append_to_archive(self, archive_full_path: str, new_files: list[StoredFile],
+                           manifest: ArchiveManifest) -> typing.Optional[tuple]:
+        """
+        Метод для дописывания новых файлов в конец архива. Новые файлы записываются на место
+        центрального каталога, поэтому он сохраняется и при любой ошибке записи или закрытия архива
+        (в том числе при отмене) возвращается на место.
+        :param str archive_full_path: полный путь архива
+        :param list[StoredFile] new_files: новые файлы
+        :param ArchiveManifest manifest: описание архива
+        :return: tuple: (StoredFile, FileNotFoundError) для файла, который не удалось добавить, или None
+        """
+        my_zip = zipfile.ZipFile(archive_full_path, mode='a', compression=zipfile.ZIP_DEFLATED)
+        try:
+            central_directory_offset = my_zip.start_dir
+            my_zip.fp.seek(central_directory_offset)
+            central_directory = my_zip.fp.read()
+        except BaseException:
+            # Архив ещё не менялся, его достаточно закрыть
+            my_zip.close()
+            raise
+        try:
+            try:
+                failed_member = self._write_members(my_zip, new_files, manifest)
+            finally:
+                my_zip.close()
+        except BaseException:
+            self._restore_central_directory(archive_full_path, central_directory_offset, central_directory)
+            raise
+        if failed_member is not None:
+            self._restore_central_directory(archive_full_path, central_directory_offset, central_directory)
+        return failed_member
+
+    @staticmethod
+    def _restore_central_directory(archive_full_path: str, central_directory_offset: int,
+                                   central_directory: bytes) -> None:
+        """
+        Метод для возврата архива в состояние до дописывания файлов
+        :param str archive_full_path: полный путь архива
+        :param int central_directory_offset: смещение центрального каталога до дописывания
+        :param bytes central_directory: центральный каталог до дописывания
+        """
+        with open(archive_full_path, 'r+b') as archive_file:
+            archive_file.seek(central_directory_offset)
+            archive_file.write(central_directory)
+            archive_file.truncate()
+
+    def _rebuild_archive(self, archive_full_path: str, existing_members: dict[str, zipfile.ZipInfo],
+                         files_to_write: list[StoredFile], manifest: ArchiveManifest) -> typing.Optional[tuple]:
+        """
+        Метод для сборки архива заново во временный файл. Файлы, которые не надо перезаписывать,
+        копируются из старого архива в сжатом виде.
+        :param str archive_full_path: полный путь архива
+        :param dict[str, zipfile.ZipInfo] existing_members: файлы существующего архива
+        :param list[StoredFile] files_to_write: новые и изменившиеся файлы
+        :param ArchiveManifest manifest: описание архива
+        :return: tuple: (StoredFile, FileNotFoundError) для файла, который не удалось добавить, или None
+        """
+        names_to_write = {x.file_name for x in files_to_write}
+        temporary_archive_path = archive_full_path + '.tmp'
+        my_zip = zipfile.ZipFile(temporary_archive_path, mode='w', compression=zipfile.ZIP_DEFLATED)
+        try:
+            with open(archive_full_path, 'rb') as existing_archive:
+                for member_name, zip_info in existing_members.items():
+                    if member_name not in names_to_write:
+                        write_raw_member(my_zip, copy_zip_info(zip_info), read_raw_member(existing_archive, zip_info))
+            failed_member = self._write_members(my_zip, files_to_write, manifest)
+        except BaseException:
+            try:
+                my_zip.close()
+            finally:
+                os.remove(temporary_archive_path)
+            raise
+        my_zip.close()
+        if failed_member is not None:
+            os.remove(temporary_archive_path)
+            return failed_member
+        if self.fsync:
+            # Иначе после сбоя питания на месте архива может оказаться недописанный файл
+            fsync_file(temporary_archive_path)
+        os.replace(temporary_archive_path, archive_full_path)
+        return None
 
     def make_zip_files(self, delete_base_file: bool) -> (bool, str):
         """
@@ -39,37 +893,43 @@ class ZipFile:
         :return: (bool, str): возврат True или False и лога с описанием.
         """
         archive_full_path = os.path.join(self.archive_path, self.archive_name)
+        self.report = []
+        self.delete_report = None
         try:
-            my_zip = zipfile.ZipFile(archive_full_path, mode='w', compression=zipfile.ZIP_DEFLATED)
-            if not os.path.isfile(archive_full_path):
-                return error_message_for_zipfile(f'Архив {self.archive_name} не был найден!')
-            for unzipped_file in self.files_to_zip:
-                unzipped_file_path = unzipped_file.full_file_name
-                try:
-                    my_zip.write(unzipped_file_path, unzipped_file.file_name)
-                    logging.info(f'Файл {unzipped_file.file_name} был успешно добавлен в архив {self.archive_name}')
-                except FileNotFoundError as fnfe:
-                    my_zip.close()
-                    os.remove(archive_full_path)
-                    return error_message_for_zipfile(f'Файла {unzipped_file.file_name} не найдено по пути '
-                                                     f'{unzipped_file.file_path}! Ошибка {fnfe}')
-            my_zip.close()
-            if len(my_zip.infolist()) < 1:
-                os.remove(archive_full_path)
-                return error_message_for_zipfile(f'Архив {archive_full_path} пуст!')
+            if self.update_mode and os.path.isfile(archive_full_path):
+                error_result = self._update_archive(archive_full_path)
+                archive_action = 'обновлён'
+            else:
+                error_result = self._create_archive(archive_full_path)
+                archive_action = 'создан'
+            if error_result is not None:
+                return error_result
+            if self.fsync:
+                fsync_file(archive_full_path)
+                fsync_directory(self.archive_path)
         except PermissionError as pe:
             return error_message_for_zipfile(f'Не хватает прав доступа для записи файлов в архив {self.archive_name}! '
                                              f'Ошибка {pe}')
-        created_archive_message = f'{archive_full_path} - Архив по пути {self.archive_path} был успешно создан'
+        except zipfile.BadZipFile as bzf:
+            return error_message_for_zipfile(f'Архив {self.archive_name} сломан, обновление невозможно! Ошибка {bzf}')
+        except OperationCancelledError as oce:
+            return error_message_for_zipfile(f'{oce}. Архив {archive_full_path} возвращён в исходное состояние')
+        except RuntimeError as re:
+            # zipfile отказывается закрыть файл больше ограничения, если заголовки Zip64 не были записаны
+            return error_message_for_zipfile(f'Файл слишком большой для архива {self.archive_name} без Zip64! '
+                                             f'Ошибка {re}')
+        created_archive_message = (f'{archive_full_path} - Архив по пути {self.archive_path} '
+                                   f'был успешно {archive_action}')
         if delete_base_file:
             message = f'Все исходные файлы были успешно удалены.'
-            for already_zipped_file in self.files_to_zip:
-                file_to_delete = already_zipped_file.full_file_name
-                try:
-                    os.remove(file_to_delete)
-                except OSError as er:
-                    return error_message_for_zipfile(
-                        f'Удаление исходного файла {file_to_delete} не было завершено успешно! Ошибка {er}')
+            self.delete_report = self.file_deleter.delete_files(self.files_to_zip)
+            failed_results = self.delete_report.failed
+            if failed_results:
+                failed_result = next(x for x in failed_results if x.error is not None)
+                return error_message_for_zipfile(
+                    f'Удаление исходного файла {failed_result.stored_file.full_file_name} не было завершено '
+                    f'успешно! Ошибка {failed_result.error}. Не удалено файлов: {len(failed_results)} '
+                    f'из {len(self.files_to_zip)}')
         else:
             message = f'Исходные файлы были сохранены'
         good_message = '. '.join([created_archive_message, message])
@@ -77,6 +937,157 @@ class ZipFile:
         return False, good_message
 
 
+class ArchiveView:
+    """
+    Компонента, предназначенная для чтения файлов архива без распаковки на диск.
+    Архив отображается в память через mmap: данные несжатых файлов возвращаются
+    срезами memoryview без копирования, сжатые - распаковываются по частям в буфер вызывающего.
+    """
+
+    def __init__(self, archive_full_path: str):
+        """
+        Класс конструктор. Открывает архив и отображает его в память.
+        :param str archive_full_path: полный путь архива
+        """
+        self.archive_full_path = archive_full_path
+        self._archive_file = open(archive_full_path, 'rb')
+        try:
+            self._zip_file = zipfile.ZipFile(self._archive_file, 'r')
+            self._mmap = mmap.mmap(self._archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (zipfile.BadZipFile, OSError, ValueError):
+            self._archive_file.close()
+            raise
+        self._data_offsets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Закрыть архив. Полученные ранее memoryview должны быть освобождены до вызова.
+        """
+        self._zip_file.close()
+        self._mmap.close()
+        self._archive_file.close()
+
+    def infolist(self) -> list[zipfile.ZipInfo]:
+        """
+        Получить описания файлов архива
+        :return: list[zipfile.ZipInfo]: список описаний файлов
+        """
+        return self._zip_file.infolist()
+
+    def get_raw_view(self, member: typing.Union[str, zipfile.ZipInfo]) -> memoryview:
+        """
+        Получить сжатые данные файла без копирования
+        :param member: имя файла в архиве или его описание
+        :return: memoryview: срез отображения архива
+        """
+        zip_info = member if isinstance(member, zipfile.ZipInfo) else self._zip_file.getinfo(member)
+        data_offset = self._data_offsets.get(zip_info.header_offset)
+        if data_offset is None:
+            # Заголовок читается срезом, а не seek/read, чтобы файлы можно было читать из разных потоков
+            data_offset = parse_member_data_offset(
+                self._mmap[zip_info.header_offset:zip_info.header_offset + zipfile.sizeFileHeader], zip_info)
+            self._data_offsets[zip_info.header_offset] = data_offset
+        raw_view = memoryview(self._mmap)[data_offset:data_offset + zip_info.compress_size]
+        if len(raw_view) != zip_info.compress_size:
+            raw_view.release()
+            raise zipfile.BadZipFile(f'Неожиданный конец сжатых данных файла {zip_info.filename}')
+        return raw_view
+
+    def get_member_view(self, member: typing.Union[str, zipfile.ZipInfo], check_crc: bool = False) -> memoryview:
+        """
+        Получить данные несжатого (ZIP_STORED) файла без копирования
+        :param member: имя файла в архиве или его описание
+        :param bool check_crc: проверить CRC32 данных
+        :return: memoryview: срез отображения архива
+        """
+        zip_info = member if isinstance(member, zipfile.ZipInfo) else self._zip_file.getinfo(member)
+        if zip_info.compress_type != zipfile.ZIP_STORED or zip_info.flag_bits & 0x1:
+            raise ValueError(f'Файл {zip_info.filename} сжат или зашифрован, используйте iter_member_chunks')
+        member_view = self.get_raw_view(zip_info)
+        if check_crc and zlib.crc32(member_view) != zip_info.CRC:
+            member_view.release()
+            raise zipfile.BadZipFile(f'Bad CRC-32 for file {zip_info.filename!r}')
+        return member_view
+
+    def iter_member_chunks(self, member: typing.Union[str, zipfile.ZipInfo],
+                           buffer: typing.Union[bytearray, memoryview]) -> typing.Iterator[memoryview]:
+        """
+        Распаковать файл по частям в буфер вызывающего. Каждая часть перезаписывает буфер,
+        поэтому её нужно обработать до получения следующей. CRC32 проверяется после последней части.
+        :param member: имя файла в архиве или его описание
+        :param buffer: буфер для распакованных данных
+        :return: Iterator[memoryview]: заполненная часть буфера
+        """
+        zip_info = member if isinstance(member, zipfile.ZipInfo) else self._zip_file.getinfo(member)
+        buffer_view = memoryview(buffer).cast('B')
+        buffer_size = len(buffer_view)
+        if zip_info.flag_bits & 0x1 or zip_info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            # Остальные методы и шифрование - через стандартный поток zipfile, CRC проверяет он
+            with self._zip_file.open(zip_info) as member_file:
+                while True:
+                    read_size = member_file.readinto(buffer_view)
+                    if not read_size:
+                        break
+                    yield buffer_view[:read_size]
+            return
+        raw_view = self.get_raw_view(zip_info)
+        try:
+            crc = 0
+            if zip_info.compress_type == zipfile.ZIP_STORED:
+                for chunk_start in range(0, len(raw_view), buffer_size):
+                    chunk = raw_view[chunk_start:chunk_start + buffer_size]
+                    buffer_view[:len(chunk)] = chunk
+                    crc = zlib.crc32(chunk, crc)
+                    yield buffer_view[:len(chunk)]
+            else:
+                decompressor = zlib.decompressobj(-15)
+                raw_position = 0
+                while not decompressor.eof:
+                    raw_chunk = raw_view[raw_position:raw_position + buffer_size]
+                    raw_position += len(raw_chunk)
+                    data = decompressor.decompress(raw_chunk, buffer_size)
+                    while True:
+                        if data:
+                            buffer_view[:len(data)] = data
+                            crc = zlib.crc32(data, crc)
+                            yield buffer_view[:len(data)]
+                        if not decompressor.unconsumed_tail:
+                            break
+                        data = decompressor.decompress(decompressor.unconsumed_tail, buffer_size)
+                    if not raw_chunk and not decompressor.eof:
+                        raise zipfile.BadZipFile(f'Неожиданный конец сжатых данных файла {zip_info.filename}')
+        finally:
+            # Отображение архива нельзя закрыть, пока на него есть memoryview
+            raw_view.release()
+        if crc != zip_info.CRC:
+            raise zipfile.BadZipFile(f'Bad CRC-32 for file {zip_info.filename!r}')
+
+
+def get_member_target_path(zip_info: zipfile.ZipInfo, target_directory: str) -> str:
+    """
+    Функция для получения пути, по которому zipfile.ZipFile.extract запишет файл архива.
+    Имя очищается так же, как в zipfile: убираются диск, '.', '..' и лишние разделители.
+    :param zipfile.ZipInfo zip_info: описание файла в архиве
+    :param str target_directory: директория распаковки
+    :return: str: полный путь файла или директории
+    """
+    arcname = zip_info.filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x not in invalid_path_parts)
+    if os.path.sep == '\\':
+        arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.path.sep)
+    return os.path.normpath(os.path.join(target_directory, arcname))
+
+
 def error_message_for_unzipfile(message_value: str, files_list) -> (bool, list[StoredFile], str):
     """
     Функция для создания return.
@@ -85,6 +1096,7 @@ def error_message_for_unzipfile(message_value: str, files_list) -> (bool, list[S
     :return: (bool, list[StoredFile], str): возвращает True, список объектов класса, и строку с сообщением
     """
     logging.error(message_value)
+    metrics.increment('unzip_errors')
     return True, files_list, message_value
 
 
@@ -93,58 +1105,339 @@ class UnZipFile:
     Компонента, предназначенная для разархивации файлов из архива
     """
 
-    def __init__(self, archive_path: str, archive_name: str, path_to_unzip: str):
+    def __init__(self, archive_path: str, archive_name: str, path_to_unzip: str,
+                 cancel_event: typing.Optional[threading.Event] = None):
         """
         Класс конструктор. При создании передаются хранимые атрибуты.
         :param str archive_path: путь до архива
         :param str archive_name: имя архива
         :param str path_to_unzip: путь, в который надо будет распаковать файлы из архива
+        :param threading.Event cancel_event: признак отмены распаковки. Проверяется перед каждым файлом,
+        при отмене уже распакованные файлы удаляются
         """
         self.archive_path = archive_path
         self.archive_name = archive_name
         self.path_to_unzip = path_to_unzip
+        self.cancel_event = cancel_event
+        self.unzip_error = None
 
-    def make_unzip_files(self, delete_archive: bool) -> (bool, list[StoredFile], str):
+    def open_archive_view(self) -> ArchiveView:
         """
-        Метод, который разархивировывает файлы из архива в указанную директорию,
-        и в зависимости от True/False удаляет или не удаляет архив.
-        :param bool delete_archive: передает True/False.
-        Если True - удаляет архив, False - оставляет архив.
-        :return: (bool, list[StoreFile], str) - возвращает True/False, список объектов класса и строку
+        Открыть архив для чтения файлов без распаковки на диск
+        :return: ArchiveView: архив, отображённый в память. Используется в with
+        """
+        return ArchiveView(os.path.join(self.archive_path, self.archive_name))
+
+    def _verify_member(self, archive_view: ArchiveView, zip_info: zipfile.ZipInfo,
+                       manifest_member: typing.Optional[dict], stop_event: threading.Event) -> typing.Optional[str]:
+        """
+        Метод для проверки одного файла архива: данные распаковываются по частям в память,
+        CRC32 и размер сверяются с центральным каталогом, SHA-256 - с описанием архива.
+        :param ArchiveView archive_view: архив, отображённый в память
+        :param zipfile.ZipInfo zip_info: описание файла в архиве
+        :param dict manifest_member: описание файла из ArchiveManifest или None
+        :param threading.Event stop_event: признак того, что ошибка уже найдена и проверку можно прервать
+        :return: str: сообщение об ошибке или None, если файл цел
+        """
+        if stop_event.is_set() or zip_info.is_dir():
+            return None
+        member_hash = hashlib.sha256() if manifest_member is not None and 'sha256' in manifest_member else None
+        file_size = 0
+        try:
+            for chunk in archive_view.iter_member_chunks(zip_info, bytearray(COPY_CHUNK_SIZE)):
+                file_size += len(chunk)
+                if member_hash is not None:
+                    member_hash.update(chunk)
+        except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError) as error:
+            return self._get_unzip_error_message(zip_info, zipfile.BadZipFile(error))
+        if file_size != zip_info.file_size:
+            return self._get_unzip_error_message(zip_info, zipfile.BadZipFile(
+                f'Размер {file_size} не совпадает с центральным каталогом ({zip_info.file_size})'))
+        if manifest_member is not None:
+            if manifest_member.get('crc', zip_info.CRC) != zip_info.CRC:
+                return self._get_unzip_error_message(zip_info, zipfile.BadZipFile(
+                    'CRC-32 не совпадает с описанием архива'))
+            if member_hash is not None and member_hash.hexdigest() != manifest_member['sha256']:
+                return self._get_unzip_error_message(zip_info, zipfile.BadZipFile(
+                    'SHA-256 не совпадает с описанием архива'))
+        return None
+
+    def verify_archive(self, workers: int = 1, check_manifest: bool = True) -> (bool, str):
+        """
+        Метод, который проверяет целостность архива без распаковки на диск. Архив отображается в память,
+        каждый файл распаковывается по частям и сверяется с центральным каталогом. Если рядом с архивом
+        есть ArchiveManifest - состав архива, CRC32 и SHA-256 сверяются и с ним.
+        :param int workers: количество потоков, проверяющих разные файлы архива
+        :param bool check_manifest: False - не сверять архив с ArchiveManifest
+        :return: (bool, str): True и сообщение об ошибке, если архив испорчен, иначе False и сообщение
+        """
+        archive_full_path = os.path.join(self.archive_path, self.archive_name)
+        manifest = ArchiveManifest.load(archive_full_path) if check_manifest else None
+        try:
+            archive_view = ArchiveView(archive_full_path)
+        except (zipfile.BadZipFile, OSError, ValueError) as error:
+            error_message = self._get_unzip_error_message(None, error)
+            logging.error(error_message)
+            return True, error_message
+        with archive_view:
+            members = archive_view.infolist()
+            error_message = None
+            if manifest is not None:
+                archive_names = {x.filename for x in members}
+                missing_names = sorted(x for x in manifest.members if x not in archive_names)
+                unknown_names = sorted(x for x in archive_names if x not in manifest.members)
+                if missing_names or unknown_names:
+                    error_message = (f'Состав архива {self.archive_name} не совпадает с описанием архива! '
+                                     f'Нет файлов: {missing_names}. Лишние файлы: {unknown_names}')
+            if error_message is None:
+                stop_event = threading.Event()
+
+                def verify_member(zip_info: zipfile.ZipInfo) -> typing.Optional[str]:
+                    member_error = self._verify_member(archive_view, zip_info, None if manifest is None else
+                                                       manifest.members.get(zip_info.filename), stop_event)
+                    if member_error is not None:
+                        stop_event.set()
+                    return member_error
+
+                if workers > 1:
+                    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                        members_errors = list(executor.map(verify_member, members))
+                else:
+                    members_errors = [verify_member(x) for x in members]
+                error_message = next((x for x in members_errors if x is not None), None)
+        if error_message is not None:
+            logging.error(error_message)
+            return True, error_message
+        message = f'Архив {self.archive_name} цел, проверено файлов: {len(members)}'
+        logging.info(message)
+        return False, message
+
+    def _extract_members(self, archive_full_path: str, members: list[zipfile.ZipInfo],
+                         results_queue: queue.Queue, stop_event: threading.Event) -> None:
         """
+        Метод для распаковки части файлов архива в отдельном потоке со своим дескриптором архива.
+        Результат по каждому файлу кладётся в очередь: (файл в архиве, StoredFile или None, ошибка или None).
+        :param str archive_full_path: полный путь архива
+        :param list[zipfile.ZipInfo] members: файлы архива, которые распаковывает поток
+        :param queue.Queue results_queue: очередь результатов
+        :param threading.Event stop_event: признак остановки распаковки
+        """
+        try:
+            with zipfile.ZipFile(archive_full_path, 'r') as zip_file:
+                for zipped_file in members:
+                    if stop_event.is_set() or (self.cancel_event is not None and self.cancel_event.is_set()):
+                        break
+                    try:
+                        start_time = time.perf_counter()
+                        zip_file.extract(zipped_file, self.path_to_unzip)
+                        if metrics.enabled:
+                            metrics.observe('unzip_member_extract', time.perf_counter() - start_time)
+                            metrics.increment('unzip_bytes_in', zipped_file.compress_size)
+                            metrics.increment('unzip_bytes_out', zipped_file.file_size)
+                        results_queue.put((zipped_file, StoredFile(self.path_to_unzip, zipped_file.filename), None))
+                    except zipfile.BadZipFile as error:
+                        # Сломанный файл уже записан на диск частично
+                        broken_file_path = get_member_target_path(zipped_file, self.path_to_unzip)
+                        if os.path.isfile(broken_file_path):
+                            os.remove(broken_file_path)
+                        results_queue.put((zipped_file, None, error))
+                        break
+                    except OSError as error:
+                        results_queue.put((zipped_file, None, error))
+                        break
+        except (zipfile.BadZipFile, OSError) as error:
+            results_queue.put((None, None, error))
+        finally:
+            # Признак завершения работы потока
+            results_queue.put(None)
+
+    def _iter_extracted_members(self, archive_full_path: str, members: list[zipfile.ZipInfo], workers: int,
+                                stop_event: threading.Event) -> typing.Iterator[tuple]:
+        """
+        Метод для распаковки файлов архива в пуле потоков. Каждый поток распаковывает
+        свою часть файлов, результаты возвращаются по мере готовности.
+        :param str archive_full_path: полный путь архива
+        :param list[zipfile.ZipInfo] members: файлы архива
+        :param int workers: количество потоков
+        :param threading.Event stop_event: признак остановки распаковки
+        :return: Iterator[tuple]: результаты в формате _extract_members
+        """
+        results_queue = queue.Queue()
+        workers = max(1, min(workers, len(members)))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for worker_number in range(workers):
+                executor.submit(self._extract_members, archive_full_path, members[worker_number::workers],
+                                results_queue, stop_event)
+            finished_workers = 0
+            try:
+                while finished_workers < workers:
+                    result = results_queue.get()
+                    if result is None:
+                        finished_workers += 1
+                    else:
+                        yield result
+            finally:
+                # Обход прерван - потоки завершают текущий файл и останавливаются
+                stop_event.set()
+
+    @staticmethod
+    def _create_directories(members: list[zipfile.ZipInfo], path_to_unzip: str) -> list[str]:
+        """
+        Метод для создания всех директорий распаковки до запуска потоков. Иначе потоки, распаковывающие
+        файлы одной новой директории, создают её одновременно и получают FileExistsError
+        :param list[zipfile.ZipInfo] members: файлы архива
+        :param str path_to_unzip: директория распаковки
+        :return: list[str]: созданные директории в порядке создания
+        """
+        created_directories = []
+        for zip_info in members:
+            target_path = get_member_target_path(zip_info, path_to_unzip)
+            directory = target_path if zip_info.is_dir() else os.path.dirname(target_path)
+            missing_directories = []
+            while directory != path_to_unzip and not os.path.isdir(directory):
+                missing_directories.append(directory)
+                directory = os.path.dirname(directory)
+            for missing_directory in reversed(missing_directories):
+                os.mkdir(missing_directory)
+                created_directories.append(missing_directory)
+        return created_directories
+
+    @staticmethod
+    def _remove_unzipped(unzipped_members: list[zipfile.ZipInfo], created_directories: list[str],
+                         path_to_unzip: str) -> None:
+        """
+        Метод для удаления распакованных файлов и созданных директорий при ошибке распаковки.
+        Файлы, которые уже удалены или перенесены, пропускаются
+        :param list[zipfile.ZipInfo] unzipped_members: распакованные файлы архива
+        :param list[str] created_directories: директории, созданные при распаковке
+        :param str path_to_unzip: директория распаковки
+        """
+        for zip_info in unzipped_members:
+            if zip_info.is_dir():
+                continue
+            try:
+                os.remove(get_member_target_path(zip_info, path_to_unzip))
+            except FileNotFoundError:
+                pass
+        for directory in reversed(created_directories):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # В директории остались файлы, которые распаковка не создавала
+                pass
+
+    def iter_unzip_files(self, workers: int = 1, verify: bool = False) -> typing.Iterator[StoredFile]:
+        """
+        Метод, который разархивировывает файлы из архива в указанную директорию и возвращает
+        каждый файл сразу после записи на диск. При ошибке удаляются распакованные файлы, которые ещё
+        не были возвращены, а unzip_error заполняется результатом в формате make_unzip_files.
+        :param int workers: количество потоков распаковки. 1 - файлы распаковываются по очереди
+        :param bool verify: если True - архив сначала проверяется verify_archive и испорченный архив
+        не распаковывается совсем
+        :return: Iterator[StoredFile]: генератор распакованных файлов
+        """
+        return self._iter_unzip_files(workers, verify, False)
+
+    def _iter_unzip_files(self, workers: int, verify: bool, remove_returned: bool) -> typing.Iterator[StoredFile]:
+        """
+        Метод для распаковки с возвратом файлов по мере записи на диск
+        :param int workers: количество потоков распаковки
+        :param bool verify: если True - архив сначала проверяется verify_archive
+        :param bool remove_returned: если True - при ошибке удаляются и уже возвращённые файлы
+        (вызывающий код сам отвечает за них, как make_unzip_files)
+        :return: Iterator[StoredFile]: генератор распакованных файлов
+        """
+        self.unzip_error = None
         unzipped_files_list = []
         archive_full_path = os.path.join(self.archive_path, self.archive_name)
         if not os.path.isfile(archive_full_path):
-            return error_message_for_unzipfile(f'Архив {archive_full_path} не найден!', unzipped_files_list)
+            self.unzip_error = error_message_for_unzipfile(f'Архив {archive_full_path} не найден!',
+                                                           unzipped_files_list)
+            return
         if not os.path.isdir(self.path_to_unzip):
-            return error_message_for_unzipfile(f'Папка {self.path_to_unzip} не найдена!', unzipped_files_list)
+            self.unzip_error = error_message_for_unzipfile(f'Папка {self.path_to_unzip} не найдена!',
+                                                           unzipped_files_list)
+            return
         try:
             with zipfile.ZipFile(archive_full_path, 'r') as zip_file:
-                for zipped_file in zip_file.infolist():
-                    try:
-                        zip_file.extract(zipped_file.filename, self.path_to_unzip)
-                        unzipped_files_list.append(StoredFile(self.path_to_unzip,
-                                                              zipped_file.filename))
-                    except zipfile.BadZipFile as bzf:
-                        for unzipped_file in unzipped_files_list:
-                            os.remove(unzipped_file.full_file_name)
-                        return error_message_for_unzipfile(f'Файл {zipped_file} в архиве {self.archive_name} сломан! '
-                                                           f'Разархивация невозможна!'
-                                                           f'\n Ошибка {bzf}!', unzipped_files_list)
-                    except OSError as ose:
-                        for unzipped_file in unzipped_files_list:
-                            os.remove(unzipped_file.full_file_name)
-                        return error_message_for_unzipfile(f'Произошла системная ошибка при разархивации '
-                                                           f'файла {zipped_file} из архива {self.archive_name}!'
-                                                           f' Ошибка {ose}!', unzipped_files_list)
+                members = zip_file.infolist()
         except zipfile.BadZipFile as bzf:
-            return error_message_for_unzipfile(f'С архивом {self.archive_name} что-то не так. Возможно архив сломан! '
-                                               f'Ошибка {bzf}', unzipped_files_list)
+            self.unzip_error = error_message_for_unzipfile(f'С архивом {self.archive_name} что-то не так. '
+                                                           f'Возможно архив сломан! Ошибка {bzf}', unzipped_files_list)
+            return
+        if verify:
+            is_broken, verify_message = self.verify_archive(workers)
+            if is_broken:
+                self.unzip_error = error_message_for_unzipfile(verify_message, unzipped_files_list)
+                return
+        try:
+            created_directories = self._create_directories(members, self.path_to_unzip)
+        except OSError as er:
+            self.unzip_error = error_message_for_unzipfile(f'Не удалось создать директории для распаковки архива '
+                                                           f'{self.archive_name}! Ошибка {er}', unzipped_files_list)
+            return
+        unzipped_members = []
+        stop_event = threading.Event()
+        extracted_members = self._iter_extracted_members(archive_full_path, members, workers, stop_event)
+        try:
+            for zipped_file, unzipped_file, error in extracted_members:
+                if unzipped_file is not None:
+                    unzipped_files_list.append(unzipped_file)
+                    if self.unzip_error is None:
+                        yield unzipped_file
+                        if not remove_returned:
+                            # Возвращённый файл принадлежит вызывающему коду и при ошибке не удаляется
+                            continue
+                    unzipped_members.append(zipped_file)
+                elif self.unzip_error is None:
+                    self.unzip_error = self._get_unzip_error_message(zipped_file, error)
+                    stop_event.set()
+        finally:
+            extracted_members.close()
+        if self.unzip_error is None and self.cancel_event is not None and self.cancel_event.is_set():
+            self.unzip_error = f'Распаковка архива {self.archive_name} отменена'
+        if self.unzip_error is not None:
+            # Директории с возвращёнными файлами не пусты и остаются на месте
+            self._remove_unzipped(unzipped_members, created_directories, self.path_to_unzip)
+            self.unzip_error = error_message_for_unzipfile(self.unzip_error, unzipped_files_list)
+
+    def _get_unzip_error_message(self, zipped_file: typing.Optional[zipfile.ZipInfo], error: Exception) -> str:
+        """
+        Метод для создания сообщения об ошибке распаковки
+        :param zipfile.ZipInfo zipped_file: файл архива, None если ошибка при открытии архива
+        :param Exception error: ошибка
+        :return: str: сообщение об ошибке
+        """
+        if zipped_file is None:
+            return f'С архивом {self.archive_name} что-то не так. Возможно архив сломан! Ошибка {error}'
+        if isinstance(error, zipfile.BadZipFile):
+            return (f'Файл {zipped_file} в архиве {self.archive_name} сломан! Разархивация невозможна!'
+                    f'\n Ошибка {error}!')
+        return (f'Произошла системная ошибка при разархивации файла {zipped_file} из архива {self.archive_name}!'
+                f' Ошибка {error}!')
+
+    def make_unzip_files(self, delete_archive: bool, workers: int = 1,
+                         verify: bool = False) -> (bool, list[StoredFile], str):
+        """
+        Метод, который разархивировывает файлы из архива в указанную директорию,
+        и в зависимости от True/False удаляет или не удаляет архив.
+        :param bool delete_archive: передает True/False.
+        Если True - удаляет архив, False - оставляет архив.
+        :param int workers: количество потоков распаковки
+        :param bool verify: если True - архив проверяется verify_archive до распаковки
+        :return: (bool, list[StoreFile], str) - возвращает True/False, список объектов класса и строку
+        """
+        archive_full_path = os.path.join(self.archive_path, self.archive_name)
+        unzipped_files_list = list(self._iter_unzip_files(workers, verify, True))
+        if self.unzip_error is not None:
+            return self.unzip_error
         archive_unpack_message = f'{self.archive_name} - Архив был успешно распакован по пути: {self.path_to_unzip}'
         if delete_archive:
             message = f'Удаление архива {self.archive_name} прошло успешно'
             try:
-                os.remove(archive_full_path)
+                with metrics.timer('delete'):
+                    os.remove(archive_full_path)
+                metrics.increment('deleted_files')
                 logging.info(message)
             except OSError as er:
                 return error_message_for_unzipfile(f'{archive_full_path} - Удаление архива не было завершено успешно!'
@@ -154,3 +1447,226 @@ class UnZipFile:
         output_message = '. '.join([archive_unpack_message, message])
         logging.info(output_message)
         return False, unzipped_files_list, output_message
+
+
+def route_by_bank_code(zip_info: zipfile.ZipInfo) -> typing.Optional[str]:
+    """
+    Функция для распределения сертификатов по архивам банков для ZipRepacker
+    :param zipfile.ZipInfo zip_info: описание файла в исходном архиве
+    :return: str: имя архива вида КОДБ.zip или None, если имя файла не является именем сертификата
+    """
+    parsed_name = certificate_name_parser.parse(os.path.basename(zip_info.filename))
+    if not parsed_name.is_valid:
+        return None
+    return f'{parsed_name.bank_code}.zip'
+
+
+class ZipRepacker:
+    """
+    Компонента, предназначенная для переноса файлов из архива в другие архивы без распаковки на диск.
+    Файлы распределяются по архивам функцией route. Если метод сжатия файла не меняется, его сжатые данные
+    копируются из отображения исходного архива в память без распаковки и повторного сжатия,
+    иначе файл перепаковывается по частям через буфер. Архивы собираются во временных файлах
+    и заменяют существующие только после записи всех файлов, файлы существующих архивов сохраняются.
+    Описание архива (ArchiveManifest) собирается из описаний исходного и существующего архивов,
+    если в них есть все файлы нового архива, иначе описание удаляется.
+    """
+
+    def __init__(self, archive_path: str, archive_name: str, target_path: str,
+                 route: typing.Callable[[zipfile.ZipInfo], typing.Optional[str]],
+                 compression_policy: typing.Optional[CompressionPolicy] = None,
+                 cancel_event: typing.Optional[threading.Event] = None, chunk_size: int = COPY_CHUNK_SIZE,
+                 fsync: bool = False):
+        """
+        Класс конструктор. При создании передаются хранимые атрибуты.
+        :param str archive_path: путь до исходного архива
+        :param str archive_name: имя исходного архива
+        :param str target_path: путь, по которому будут созданы или дополнены архивы
+        :param route: функция (описание файла) -> имя архива или None, если файл переносить не надо,
+        например route_by_bank_code
+        :param CompressionPolicy compression_policy: метод и уровень сжатия в новых архивах.
+        None - метод сжатия каждого файла сохраняется. store_incompressible не учитывается
+        :param threading.Event cancel_event: признак отмены. Проверяется перед каждым файлом,
+        при отмене архивы остаются в исходном состоянии
+        :param int chunk_size: размер части при перепаковке файлов
+        :param bool fsync: если True - архивы сбрасываются на диск перед заменой, а директория - после неё
+        """
+        self.archive_path = archive_path
+        self.archive_name = archive_name
+        self.target_path = target_path
+        self.route = route
+        self.compression_policy = compression_policy
+        self.cancel_event = cancel_event
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        # Имя архива -> имена перенесённых в него файлов, файлы без архива
+        self.routed_members: dict[str, list[str]] = {}
+        self.skipped_members: list[str] = []
+
+    def _copy_member(self, archive_view: ArchiveView, zip_info: zipfile.ZipInfo, target_zip: zipfile.ZipFile,
+                     buffer: bytearray) -> None:
+        """
+        Метод для переноса одного файла в архив
+        :param ArchiveView archive_view: исходный архив
+        :param zipfile.ZipInfo zip_info: описание файла в исходном архиве
+        :param zipfile.ZipFile target_zip: архив, открытый на запись
+        :param bytearray buffer: буфер для перепаковки
+        """
+        start_time = time.perf_counter()
+        new_zip_info = copy_zip_info(zip_info)
+        if (self.compression_policy is None or self.compression_policy.compress_type == zip_info.compress_type or
+                zip_info.flag_bits & 0x1 or zip_info.is_dir()):
+            # Зашифрованные файлы и директории переносятся как есть
+            raw_view = archive_view.get_raw_view(zip_info)
+            try:
+                write_raw_member(target_zip, new_zip_info, CompressedMember(
+                    zip_info.compress_type, zip_info.CRC, zip_info.file_size, raw_view))
+            finally:
+                raw_view.release()
+            metrics.increment('repack_raw_members')
+        else:
+            new_zip_info.compress_type = self.compression_policy.compress_type
+            new_zip_info._compresslevel = self.compression_policy.compresslevel
+            # Флаги исходного метода сжатия (например, уровень deflate) к новому методу не относятся
+            new_zip_info.flag_bits &= ~0x06
+            # Заголовки Zip64 для больших файлов zipfile включает сам по размеру из описания
+            new_zip_info.file_size = zip_info.file_size
+            with target_zip.open(new_zip_info, 'w') as member_file:
+                for chunk in archive_view.iter_member_chunks(zip_info, buffer):
+                    member_file.write(chunk)
+            metrics.increment('repack_recompressed_members')
+        metrics.observe('repack_member', time.perf_counter() - start_time)
+        metrics.increment('repack_bytes', zip_info.file_size)
+
+    def _finish_target(self, target_name: str, target_zip: zipfile.ZipFile,
+                       source_manifest: typing.Optional[ArchiveManifest]) -> (str, typing.Optional[ArchiveManifest]):
+        """
+        Метод для дописывания в новый архив файлов существующего архива, кроме перезаписанных
+        :param str target_name: имя архива
+        :param zipfile.ZipFile target_zip: временный архив, открытый на запись
+        :param ArchiveManifest source_manifest: описание исходного архива или None
+        :return: (str, ArchiveManifest): полный путь временного архива и описание нового архива
+        (None, если описания есть не для всех файлов)
+        """
+        target_full_path = os.path.join(self.target_path, target_name)
+        routed_names = set(target_zip.NameToInfo)
+        target_manifest = None
+        if os.path.isfile(target_full_path):
+            target_manifest = ArchiveManifest.load(target_full_path)
+            with ArchiveView(target_full_path) as existing_archive:
+                for zip_info in existing_archive.infolist():
+                    if zip_info.filename in target_zip.NameToInfo:
+                        continue
+                    raw_view = existing_archive.get_raw_view(zip_info)
+                    try:
+                        write_raw_member(target_zip, copy_zip_info(zip_info), CompressedMember(
+                            zip_info.compress_type, zip_info.CRC, zip_info.file_size, raw_view))
+                    finally:
+                        raw_view.release()
+        target_zip.close()
+        manifest = ArchiveManifest()
+        for member_name in target_zip.NameToInfo:
+            members_manifest = source_manifest if member_name in routed_names else target_manifest
+            member = None if members_manifest is None else members_manifest.members.get(member_name)
+            if member is None:
+                return target_zip.filename, None
+            manifest.members[member_name] = member
+        return target_zip.filename, manifest
+
+    def repack(self) -> dict[str, list[str]]:
+        """
+        Перенести файлы исходного архива в архивы, выбранные route
+        :return: dict[str, list[str]]: имя архива -> имена перенесённых в него файлов
+        """
+        archive_full_path = os.path.join(self.archive_path, self.archive_name)
+        self.routed_members = {}
+        self.skipped_members = []
+        target_zips: dict[str, zipfile.ZipFile] = {}
+        buffer = bytearray(self.chunk_size)
+        source_manifest = ArchiveManifest.load(archive_full_path)
+        try:
+            with metrics.timer('repack'), ArchiveView(archive_full_path) as archive_view:
+                for zip_info in archive_view.infolist():
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        raise OperationCancelledError(f'Перепаковка архива {self.archive_name} отменена')
+                    target_name = self.route(zip_info)
+                    if target_name is None:
+                        self.skipped_members.append(zip_info.filename)
+                        continue
+                    target_zip = target_zips.get(target_name)
+                    if target_zip is None:
+                        target_zip = zipfile.ZipFile(os.path.join(self.target_path, target_name + '.tmp'), 'w')
+                        target_zips[target_name] = target_zip
+                    self._copy_member(archive_view, zip_info, target_zip, buffer)
+                    self.routed_members.setdefault(target_name, []).append(zip_info.filename)
+                finished_targets = {x: self._finish_target(x, y, source_manifest) for x, y in target_zips.items()}
+            for target_name, (temporary_path, manifest) in finished_targets.items():
+                if self.fsync:
+                    fsync_file(temporary_path)
+                target_full_path = os.path.join(self.target_path, target_name)
+                os.replace(temporary_path, target_full_path)
+                if manifest is not None:
+                    manifest.save(target_full_path)
+                else:
+                    # Описание прежнего архива больше не соответствует архиву
+                    ArchiveManifest.remove(target_full_path)
+            if self.fsync:
+                fsync_directory(self.target_path)
+        except BaseException:
+            # Временные архивы удаляются, даже если закрытие одного из них не удалось.
+            # Уже заменённые архивы остаются новыми, их временных файлов больше нет
+            for target_zip in target_zips.values():
+                try:
+                    target_zip.close()
+                except Exception as er:
+                    logging.error(f'Не удалось закрыть временный архив {target_zip.filename}! Ошибка {er}')
+                try:
+                    os.remove(target_zip.filename)
+                except FileNotFoundError:
+                    pass
+                except OSError as er:
+                    logging.error(f'Не удалось удалить временный архив {target_zip.filename}! Ошибка {er}')
+            raise
+        return self.routed_members
+
+    def make_repack_files(self, delete_archive: bool) -> (bool, str):
+        """
+        Метод, который переносит файлы исходного архива в другие архивы
+        и, в зависимости от True/False, удаляет или оставляет исходный архив.
+        Архив не удаляется, если в нём есть файлы, для которых route не выбрал архив.
+        :param bool delete_archive: если True - удаляет исходный архив
+        :return: (bool, str): возврат True или False и лога с описанием
+        """
+        try:
+            routed_members = self.repack()
+        except PermissionError as pe:
+            return error_message_for_zipfile(f'Не хватает прав доступа для перепаковки архива {self.archive_name}! '
+                                             f'Ошибка {pe}')
+        except zipfile.BadZipFile as bzf:
+            return error_message_for_zipfile(f'Архив {self.archive_name} сломан, перепаковка невозможна! '
+                                             f'Ошибка {bzf}')
+        except OperationCancelledError as oce:
+            return error_message_for_zipfile(f'{oce}. Архивы в {self.target_path} остались в исходном состоянии')
+        except OSError as er:
+            return error_message_for_zipfile(f'Произошла системная ошибка при перепаковке архива {self.archive_name}!'
+                                             f' Ошибка {er}')
+        repack_message = (f'{self.archive_name} - Файлы архива перенесены в архивы '
+                          f'{", ".join(sorted(routed_members))} по пути {self.target_path}')
+        if delete_archive:
+            if self.skipped_members:
+                return error_message_for_zipfile(
+                    f'Архив {self.archive_name} не удалён: для файлов {", ".join(self.skipped_members)} '
+                    f'не выбран архив')
+            try:
+                with metrics.timer('delete'):
+                    os.remove(os.path.join(self.archive_path, self.archive_name))
+                metrics.increment('deleted_files')
+            except OSError as er:
+                return error_message_for_zipfile(f'Удаление архива {self.archive_name} не было завершено успешно!'
+                                                 f' Ошибка {er}')
+            message = f'Удаление архива {self.archive_name} прошло успешно'
+        else:
+            message = f'Архив {self.archive_name} был сохранён'
+        output_message = '. '.join([repack_message, message])
+        logging.info(output_message)
+        return False, output_message
@@ -1,6 +1,10 @@
+import datetime
+import threading
 import unittest
 import os
-from classes.bank_certificates_classes import BankCertificatesContainer, BankCertificateFile
+from classes.bank_certificates_classes import BankCertificatesContainer, BankCertificateFile, CertificateNameParser
+from classes.certificate_columns_classes import CertificateColumns
+from classes.certificate_parse_cache_classes import CertificateParseCache
 from utils.file_utils import create_temp_dir, remove_dir
 
 
@@ -45,6 +49,186 @@ class TestBankCertificateFile(unittest.TestCase):
             # Удалить временную папку
             remove_dir(temporary_folder)
 
+    def test_certificates_index(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            # Создать временные файлы
+            for certificate in self.certificates_list + ['0646.22222222222.20230101000000.cer']:
+                create_new_file(temporary_folder, certificate)
+            bank_certificates_container_obj = BankCertificatesContainer(temporary_folder)
+            self.assertEqual(2, len(bank_certificates_container_obj.get_certificates_by_code('0646')))
+            self.assertEqual(4, len(bank_certificates_container_obj.get_certificates_by_code('0646', False)))
+            self.assertEqual(3, len(bank_certificates_container_obj.get_certificates_by_snils('11111111111')))
+            # Поиск по сроку окончания возвращает сертификаты по возрастанию срока
+            by_end_date = bank_certificates_container_obj.get_certificates_by_end_date(
+                datetime.datetime(2022, 9, 23, 17, 45, 55), datetime.datetime(2024, 1, 1))
+            self.assertEqual(4, len(by_end_date))
+            self.assertEqual('0646.22222222222.20230101000000.cer', by_end_date[-1].file_name)
+            self.assertEqual([], bank_certificates_container_obj.get_certificates_by_end_date(
+                end=datetime.datetime(2022, 9, 23, 17, 45, 55)))
+            # Инкрементальное обновление индекса
+            index = bank_certificates_container_obj.certificates_index
+            index.remove(by_end_date[-1].full_file_name)
+            self.assertEqual(1, len(bank_certificates_container_obj.get_certificates_by_code('0646')))
+            index.add(BankCertificateFile(temporary_folder, '0649.33333333333.20210101000000.cer'))
+            self.assertEqual('0649', index.get_by_end_date()[0].bank_code)
+            # Многократная замена сертификатов не увеличивает индекс без ограничения
+            for _ in range(3000):
+                index.add(BankCertificateFile(temporary_folder, '0649.33333333333.20210101000000.cer'))
+            self.assertLess(len(index.certificates), 1100)
+            self.assertLess(len(index.get_by_end_date(valid_only=False)), 1100)
+            self.assertEqual(1, len(index.get_by_bank_code('0649')))
+            self.assertEqual(9, len(index))
+        finally:
+            # Удалить временную папку
+            remove_dir(temporary_folder)
+
+    def test_certificates_expiry_scheduler(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            # Создать временные файлы
+            for certificate in self.certificates_list + ['0646.22222222222.20230101000000.cer',
+                                                         '0647.11111111111.20220923174555.cer']:
+                create_new_file(temporary_folder, certificate)
+            bank_certificates_container_obj = BankCertificatesContainer(temporary_folder)
+            bank_certificates_container_obj.refresh()
+            scheduler = bank_certificates_container_obj.expiry_scheduler
+            # Сертификат 0647 отменён файлом del и в расписание не попадает
+            self.assertEqual(3, len(scheduler))
+            now = datetime.datetime(2022, 1, 1)
+            self.assertEqual(['0645', '0646'], [x.bank_code for x in scheduler.get_next_expiring(2, now)])
+            self.assertEqual(2, len(scheduler.get_expiring_before(datetime.datetime(2023, 1, 1), now)))
+            self.assertEqual(['0645', '0646'], sorted(scheduler.get_expiring_by_bank(datetime.datetime(2024, 1, 1),
+                                                                                     now)))
+            # Первая проверка возвращает все истёкшие сертификаты, следующая - только истёкшие после неё
+            self.assertEqual(2, len(scheduler.get_expired_since_last_check(datetime.datetime(2022, 10, 1))))
+            self.assertEqual([], scheduler.get_expired_since_last_check(datetime.datetime(2022, 12, 1)))
+            # Удаление файла del возвращает сертификат в расписание, новый файл del снимает сертификат
+            os.remove(os.path.join(temporary_folder, '0647.11111111111.20220923174555.del'))
+            create_new_file(temporary_folder, '0646.22222222222.20230101000000.del')
+            bank_certificates_container_obj.refresh()
+            self.assertEqual(['0645', '0646', '0647'],
+                             sorted(x.bank_code for x in scheduler.get_expiring_before(datetime.datetime(2024, 1, 1),
+                                                                                       now)))
+            self.assertEqual([], scheduler.get_expired_since_last_check(datetime.datetime(2023, 6, 1)))
+        finally:
+            # Удалить временную папку
+            remove_dir(temporary_folder)
+
+    def test_certificates_columns(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            # Создать временные файлы
+            for certificate in self.certificates_list + ['0646.22222222222.20221001000000.cer']:
+                create_new_file(temporary_folder, certificate)
+            bank_certificates_container_obj = BankCertificatesContainer(temporary_folder)
+            # Столбцы по объектам контейнера и по именам файлов совпадают (с numpy и без него)
+            for columns in (CertificateColumns.from_container(bank_certificates_container_obj),
+                            CertificateColumns.from_names(os.listdir(temporary_folder))):
+                self.assertEqual(9, len(columns))
+                self.assertEqual(4, sum(bool(x) for x in columns.is_valid))
+                self.assertEqual({'0645': 1, '0646': 2, '0647': 1}, columns.count_by_bank())
+                self.assertEqual({'0647': 1}, columns.count_by_bank(condition='del'))
+                self.assertEqual({'2022-09': 3, '2022-10': 1}, columns.get_expiry_histogram('M'))
+                self.assertEqual({'2022-10-01': 1}, columns.get_expiry_histogram(
+                    'D', start=datetime.datetime(2022, 9, 24)))
+                self.assertEqual(set(CertificateColumns.column_names), set(columns.to_dict()))
+            with self.assertRaises(ValueError):
+                columns.get_expiry_histogram('H')
+            # Значения невалидных имён не обрезаются до длины значений валидного имени
+            columns = CertificateColumns.from_names(['06450.111111111111.20220923174555.cerx',
+                                                     '0645.11111111111.20220923174555.cer'])
+            self.assertEqual(['06450', '0645'], list(columns.bank_code))
+            self.assertEqual(['111111111111', '11111111111'], list(columns.snils))
+            self.assertEqual(['cerx', 'cer'], list(columns.condition))
+            self.assertEqual(0, len(CertificateColumns.from_names([])))
+        finally:
+            # Удалить временную папку
+            remove_dir(temporary_folder)
+
+    def test_certificate_name_parser(self):
+        parsed_list = CertificateNameParser().parse_many(self.certificates_list + [
+            '0646.11111111111.20240229000000.cer',  # True, високосный год
+            '0646.11111111111.20230229000000.cer',  # False
+            '0646.11111111111.20220923174560.cer',  # False
+            '064.11111111111.20220923174555.cer',  # False
+        ])
+        self.assertEqual([False] * 5 + [True] * 4 + [False] * 3, [x.is_valid for x in parsed_list])
+        self.assertEqual('dddddd - Имя файла не соответствует имени сертификата', parsed_list[0].error_str)
+        self.assertEqual('Файл не является сертификатом', parsed_list[1].error_str)
+        self.assertEqual('Неверный формат даты', parsed_list[2].error_str)
+        self.assertEqual('Неверный код банка', parsed_list[-1].error_str)
+        self.assertEqual(' Код банка: 0646; СНИЛС: 11111111111; Срок окончания сертификата: 2022-09-23 17:45:55; '
+                         'Состояние сертификата: cer', parsed_list[6].error_str)
+        self.assertEqual(datetime.datetime(2024, 2, 29), parsed_list[8].end_date)
+
+    def test_certificates_parse_cache(self):
+        # Создать временные папки для сертификатов и кэша
+        temporary_folder = create_temp_dir()
+        cache_folder = create_temp_dir()
+        default_cache_path = CertificateParseCache.get_default_cache_path(temporary_folder)
+        try:
+            for certificate in self.certificates_list:
+                create_new_file(temporary_folder, certificate)
+            # Время изменения папки в прошлом, чтобы кэш запомнил полный список имён
+            os.utime(temporary_folder, (0, 0))
+            cache_path = os.path.join(cache_folder, 'cache.sqlite')
+            cold_container = BankCertificatesContainer(temporary_folder, parse_cache_path=cache_path)
+            self.assertEqual({'hits': 0, 'misses': 8, 'listing_from_cache': False}, cold_container.parse_cache_stats)
+            cold_container.parse_cache.close()
+            warm_container = BankCertificatesContainer(temporary_folder, parse_cache_path=cache_path)
+            self.assertEqual({'hits': 8, 'misses': 0, 'listing_from_cache': True}, warm_container.parse_cache_stats)
+            warm_container.parse_cache.close()
+            self.assertEqual([(x.file_name, x.is_valid, x.error_str) for x in cold_container.files_list],
+                             [(x.file_name, x.is_valid, x.error_str) for x in warm_container.files_list])
+            self.assertEqual(3, len(warm_container.get_valid_certificates_list()))
+            self.assertEqual(datetime.datetime(2022, 9, 23, 17, 45, 55),
+                             warm_container.get_certificates_by_code('0646')[0].end_date)
+            # Изменение папки: разбирается только новый файл
+            create_new_file(temporary_folder, '0649.11111111111.20230923174555.cer')
+            os.remove(os.path.join(temporary_folder, 'dddddd'))
+            os.utime(temporary_folder, (1, 1))
+            changed_container = BankCertificatesContainer(temporary_folder, parse_cache_path=cache_path)
+            self.assertEqual({'hits': 7, 'misses': 1, 'listing_from_cache': False},
+                             changed_container.parse_cache_stats)
+            changed_container.parse_cache.close()
+            # В ленивом режиме кэш записывается после обхода файлов, файл кэша по умолчанию - рядом с папкой
+            lazy_container = BankCertificatesContainer(temporary_folder, lazy=True, parse_cache_path=True)
+            self.assertEqual(8, len(list(lazy_container.iter_files())))
+            lazy_container.parse_cache.close()
+            self.assertTrue(os.path.isfile(default_cache_path))
+            warm_container = BankCertificatesContainer(temporary_folder, parse_cache_path=True)
+            self.assertEqual({'hits': 8, 'misses': 0, 'listing_from_cache': True}, warm_container.parse_cache_stats)
+            # Обновление из другого потока обновляет индекс и записывает кэш
+            create_new_file(temporary_folder, '0650.11111111111.20230923174555.cer')
+            refresh_errors = []
+
+            def refresh_container():
+                try:
+                    warm_container.refresh()
+                except Exception as error:
+                    refresh_errors.append(error)
+            refresh_thread = threading.Thread(target=refresh_container)
+            refresh_thread.start()
+            refresh_thread.join()
+            self.assertEqual([], refresh_errors)
+            self.assertEqual(1, len(warm_container.get_certificates_by_code('0650')))
+            warm_container.close()
+            warm_container.close()
+            refreshed_container = BankCertificatesContainer(temporary_folder, parse_cache_path=True)
+            self.assertEqual({'hits': 9, 'misses': 0, 'listing_from_cache': False},
+                             refreshed_container.parse_cache_stats)
+            refreshed_container.close()
+        finally:
+            # Удалить временные папки и файл кэша по умолчанию
+            remove_dir(temporary_folder)
+            remove_dir(cache_folder)
+            if os.path.isfile(default_cache_path):
+                os.remove(default_cache_path)
+
     def test_certificate_file(self):
         # Создать временную папку
         temporary_folder = create_temp_dir()
@@ -1,8 +1,15 @@
 import platform
 import random
+import threading
+import time
 import unittest
 import os
-from classes.stored_file_classes import StoredFileContainer
+from unittest import mock
+from classes.blocked_files_classes import BulkBlockedFilesDetector
+from classes.directory_scanner_classes import DirectoryTreeScanner
+from classes.directory_watcher_classes import PollingDirectoryWatcher
+from classes.metrics_classes import metrics, MetricsRegistry, PrometheusFileSink, CallbackSink
+from classes.stored_file_classes import StoredFileContainer, StoredFileFilter
 from utils.file_utils import create_temp_dir, remove_dir
 
 
@@ -55,3 +62,217 @@ class TestStoredFileContainer(unittest.TestCase):
                     any_blocked_file.close()
                 # Удалить папку
                 remove_dir(temporary_folder)
+
+    def test_unlocked_files_restat(self):
+        if BulkBlockedFilesDetector.is_supported():
+            # Создать временную папку
+            temporary_folder = create_temp_dir()
+            for file_name in ('replaced', 'removed', 'unblocked'):
+                create_new_file(temporary_folder, file_name).close()
+            blocked_file = create_new_file(temporary_folder, 'replaced.new')
+            try:
+                stored_file_container_obj = StoredFileContainer(temporary_folder)
+                for stored_file in stored_file_container_obj.files_list:
+                    stored_file.get_file_stat()
+                # Файл заменён открытым на запись файлом, другой файл удалён
+                os.replace(blocked_file.name, os.path.join(temporary_folder, 'replaced'))
+                os.remove(os.path.join(temporary_folder, 'removed'))
+                self.assertEqual(['unblocked'], [x.file_name for x in stored_file_container_obj.get_unlocked_files()])
+            finally:
+                blocked_file.close()
+                # Удалить папку
+                remove_dir(temporary_folder)
+
+    def test_lazy_scan_with_filter(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            # Создать файлы с разными расширениями
+            for i in range(10):
+                create_new_file(temporary_folder, f'{i}.{"zip" if i % 2 else "txt"}').close()
+            stored_file_container_obj = StoredFileContainer(temporary_folder, lazy=True,
+                                                            file_filter=StoredFileFilter(extensions=('zip',),
+                                                                                         min_size=1))
+            # В ленивом режиме директория не читается в конструкторе
+            self.assertIsNone(stored_file_container_obj._files_list)
+            unlocked_files = stored_file_container_obj.get_unlocked_files()
+            self.assertIsNone(stored_file_container_obj._files_list)
+            self.assertEqual(5, len(unlocked_files))
+            self.assertTrue(all(x.file_name.endswith('.zip') for x in unlocked_files))
+            # Информация о файле взята из os.DirEntry
+            self.assertTrue(all(x.file_stat is not None for x in unlocked_files))
+            # При обращении к files_list директория читается
+            self.assertEqual(5, len(stored_file_container_obj.files_list))
+        finally:
+            # Удалить папку
+            remove_dir(temporary_folder)
+
+    def test_tree_scan(self):
+        # Создать временные папки - два корня с деревьями по банкам и датам
+        first_root = create_temp_dir()
+        second_root = create_temp_dir()
+        try:
+            for root, bank_code in ((first_root, '0646'), (second_root, '0647')):
+                for date in ('20220101', '20220102'):
+                    os.makedirs(os.path.join(root, bank_code, date, 'tmp'))
+                    for i in range(3):
+                        create_new_file(os.path.join(root, bank_code, date), f'{i}.cer').close()
+                    create_new_file(os.path.join(root, bank_code, date, 'tmp'), 'partial.cer').close()
+                create_new_file(os.path.join(root, bank_code), 'readme.txt').close()
+            tree_scanner = DirectoryTreeScanner([first_root, second_root], max_depth=2, include=('*.cer',),
+                                                exclude=('*/tmp',), workers=3, max_open_dirs=2)
+            stored_file_container_obj = StoredFileContainer(first_root, tree_scanner=tree_scanner)
+            full_names = [x.full_file_name for x in stored_file_container_obj.files_list]
+            # Порядок стабильный: корни по порядку, внутри директорий - по именам
+            self.assertEqual(12, len(full_names))
+            self.assertEqual(os.path.join(first_root, '0646', '20220101', '0.cer'), full_names[0])
+            self.assertEqual(os.path.join(second_root, '0647', '20220102', '2.cer'), full_names[-1])
+            self.assertEqual(full_names, [x.full_file_name for x in StoredFileContainer(
+                first_root, tree_scanner=tree_scanner).files_list])
+            # Ограничение глубины: только файлы корней и первого уровня
+            self.assertEqual(['readme.txt', 'readme.txt'], [x.file_name for x in StoredFileContainer(
+                first_root, tree_scanner=DirectoryTreeScanner([first_root, second_root], max_depth=1)).files_list])
+            # Символические ссылки на директории и файлы не считаются файлами
+            if platform.system() == 'Linux':
+                date_directory = os.path.join(first_root, '0646', '20220102')
+                os.symlink(os.path.join(first_root, '0646', '20220101'), os.path.join(date_directory, 'dir.cer'))
+                os.symlink(full_names[0], os.path.join(date_directory, 'file.cer'))
+                self.assertEqual(full_names, [x.full_file_name for x in StoredFileContainer(
+                    first_root, tree_scanner=tree_scanner).files_list])
+            # Обновление сверяет список файлов с новым обходом
+            os.remove(full_names[0])
+            create_new_file(os.path.join(second_root, '0647', '20220101'), '3.cer').close()
+            files_change_set = stored_file_container_obj.refresh()
+            self.assertEqual([full_names[0]], [x.full_file_name for x in files_change_set.removed])
+            self.assertEqual(['3.cer'], [x.file_name for x in files_change_set.added])
+            self.assertEqual(12, len(stored_file_container_obj.files_list))
+            # Изменение файла, найденного первым обходом, попадает в modified
+            with open(full_names[1], 'a') as modified_file:
+                modified_file.write(' and more')
+            files_change_set = stored_file_container_obj.refresh()
+            self.assertEqual([full_names[1]], [x.full_file_name for x in files_change_set.modified])
+            self.assertFalse(stored_file_container_obj.refresh())
+            with self.assertRaises(ValueError):
+                StoredFileContainer(first_root, watch=True, tree_scanner=tree_scanner)
+        finally:
+            # Удалить папки
+            remove_dir(first_root)
+            remove_dir(second_root)
+
+    def test_bulk_blocked_files_detector(self):
+        if BulkBlockedFilesDetector.is_supported():
+            # Создать временную папку
+            temporary_folder = create_temp_dir()
+            blocked_file = create_new_file(temporary_folder, 'blocked')
+            create_new_file(temporary_folder, 'unblocked').close()
+            try:
+                detector = BulkBlockedFilesDetector(snapshot_max_age=60)
+                files_paths = [os.path.join(temporary_folder, x) for x in ('blocked', 'unblocked', 'missing')]
+                self.assertEqual({files_paths[0]}, detector.get_locked_files(files_paths))
+                # Снимок переиспользуется, пока не устарел
+                snapshot = detector.get_snapshot()
+                blocked_file.close()
+                self.assertIs(snapshot, detector.get_snapshot())
+                self.assertEqual({files_paths[0]}, detector.get_locked_files(files_paths))
+                # С нулевым возрастом снимок строится заново
+                self.assertEqual(set(), detector.get_locked_files(files_paths, snapshot_max_age=0))
+                # Одновременные запросы из нескольких потоков строят снимок один раз
+                shared_detector = BulkBlockedFilesDetector(snapshot_max_age=60)
+                barrier = threading.Barrier(8)
+                snapshots = []
+
+                def get_snapshot():
+                    barrier.wait()
+                    snapshots.append(shared_detector.get_snapshot())
+                with mock.patch('classes.blocked_files_classes.OpenFilesSnapshot',
+                                side_effect=lambda x: time.sleep(0.05) or mock.Mock(age=0.0)) as snapshot_class:
+                    threads = [threading.Thread(target=get_snapshot) for _ in range(8)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                self.assertEqual(1, snapshot_class.call_count)
+                self.assertEqual(1, len({id(x) for x in snapshots}))
+            finally:
+                blocked_file.close()
+                # Удалить папку
+                remove_dir(temporary_folder)
+
+    def test_watched_container_refresh(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            for i in range(5):
+                create_new_file(temporary_folder, f'{i}.txt').close()
+            stored_file_container_obj = StoredFileContainer(temporary_folder, watch=True)
+            # Проверяем и наблюдение по умолчанию (inotify в Linux), и опрос
+            for use_polling in (False, True):
+                if use_polling:
+                    stored_file_container_obj.directory_watcher = PollingDirectoryWatcher(temporary_folder)
+                directory_watcher = stored_file_container_obj.directory_watcher
+                self.assertFalse(stored_file_container_obj.refresh())
+                create_new_file(temporary_folder, 'new.txt').close()
+                os.remove(os.path.join(temporary_folder, '0.txt'))
+                os.rename(os.path.join(temporary_folder, '1.txt'), os.path.join(temporary_folder, 'renamed.txt'))
+                files_change_set = stored_file_container_obj.refresh()
+                self.assertEqual(['new.txt'], [x.file_name for x in files_change_set.added])
+                self.assertEqual(['0.txt'], [x.file_name for x in files_change_set.removed])
+                self.assertEqual([('1.txt', 'renamed.txt')],
+                                 [(x.file_name, y.file_name) for x, y in files_change_set.renamed])
+                self.assertEqual(sorted(os.listdir(temporary_folder)),
+                                 sorted(x.file_name for x in stored_file_container_obj.files_list))
+                # Изменившийся файл обновляется на своём месте, порядок списка сохраняется
+                files_order = [x.file_name for x in stored_file_container_obj.files_list]
+                with open(os.path.join(temporary_folder, '2.txt'), 'a') as modified_file:
+                    modified_file.write('изменение')
+                files_change_set = stored_file_container_obj.refresh()
+                self.assertEqual(['2.txt'], [x.file_name for x in files_change_set.modified])
+                self.assertEqual(files_order, [x.file_name for x in stored_file_container_obj.files_list])
+                self.assertIs(files_change_set.modified[0],
+                              stored_file_container_obj.files_list[files_order.index('2.txt')])
+                # Возвращаем папку в исходное состояние для следующего наблюдателя
+                os.remove(os.path.join(temporary_folder, 'new.txt'))
+                os.rename(os.path.join(temporary_folder, 'renamed.txt'), os.path.join(temporary_folder, '1.txt'))
+                create_new_file(temporary_folder, '0.txt').close()
+                self.assertTrue(stored_file_container_obj.refresh())
+                self.assertEqual(5, len(stored_file_container_obj.files_list))
+                directory_watcher.close()
+        finally:
+            # Удалить папку
+            remove_dir(temporary_folder)
+
+    def test_metrics_sinks(self):
+        # Создать временную папку
+        temporary_folder = create_temp_dir()
+        metrics_folder = create_temp_dir()
+        registry = MetricsRegistry()
+        prometheus_sink = PrometheusFileSink(os.path.join(metrics_folder, 'metrics.prom'))
+        callback_values = []
+        callback_sink = CallbackSink(lambda kind, name, value: callback_values.append((kind, name)))
+        try:
+            for i in range(5):
+                create_new_file(temporary_folder, f'{i}.txt').close()
+            # Пока приёмников нет, метрики выключены
+            self.assertFalse(metrics.enabled)
+            StoredFileContainer(temporary_folder)
+            for sink in (registry, prometheus_sink, callback_sink):
+                metrics.add_sink(sink)
+            self.assertTrue(metrics.enabled)
+            stored_file_container_obj = StoredFileContainer(temporary_folder)
+            self.assertEqual(5, len(stored_file_container_obj.get_unlocked_files()))
+            self.assertEqual(5, registry.get_counter('listdir_entries'))
+            self.assertEqual(1, registry.get_timer('listdir')[0])
+            self.assertEqual(5, registry.get_counter('lock_probe_files'))
+            self.assertEqual(1, registry.get_timer('lock_probe')[0])
+            self.assertIn(('counter', 'listdir_entries'), callback_values)
+            metrics.flush()
+            with open(os.path.join(metrics_folder, 'metrics.prom')) as metrics_file:
+                metrics_text = metrics_file.read()
+            self.assertIn('utilities_for_reuse_listdir_entries_total 5', metrics_text)
+            self.assertIn('utilities_for_reuse_lock_probe_seconds_count 1', metrics_text)
+        finally:
+            for sink in (registry, prometheus_sink, callback_sink):
+                metrics.remove_sink(sink)
+            # Удалить папки
+            remove_dir(temporary_folder)
+            remove_dir(metrics_folder)
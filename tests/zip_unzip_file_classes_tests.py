@@ -1,7 +1,19 @@
-from classes.zip_unzip_file_classes import ZipFile, UnZipFile
+from classes.zip_unzip_file_classes import (ZipFile, UnZipFile, CompressionPolicy, ArchiveManifest, ZipRepacker,
+                                            route_by_bank_code, write_raw_member, CompressedMember, compress_member,
+                                            write_member_streamed)
+from classes.async_file_classes import (AsyncFilesExecutor, AsyncZipFile, AsyncUnZipFile, get_default_files_executor,
+                                        shutdown_default_files_executor)
+from classes.file_deleter_classes import BulkFileDeleter
 from utils.file_utils import create_temp_dir, remove_dir
 import unittest
+import asyncio
+import io
 import os
+import threading
+import time
+import zipfile
+import zlib
+from unittest import mock
 from classes.stored_file_classes import StoredFile
 
 
@@ -17,6 +29,46 @@ def create_new_file(file_dir, any_file_name) -> None:
     any_file.close()
 
 
+def zip_crypto_encrypt(data: bytes, password: bytes, check_byte: int) -> bytes:
+    """
+    Зашифровать данные файла архива традиционным шифрованием zip (ZipCrypto) вместе с заголовком шифрования
+    """
+    keys = [305419896, 591751049, 878082192]
+
+    def crc32_byte(value, crc):
+        return ~zlib.crc32(bytes([value]), ~crc & 0xFFFFFFFF) & 0xFFFFFFFF
+
+    def update_keys(value):
+        keys[0] = crc32_byte(value, keys[0])
+        keys[1] = ((keys[1] + (keys[0] & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        keys[2] = crc32_byte(keys[1] >> 24, keys[2])
+
+    for value in password:
+        update_keys(value)
+    encrypted_data = bytearray()
+    for value in bytes(11) + bytes([check_byte]) + data:
+        key = keys[2] | 2
+        encrypted_data.append(value ^ ((key * (key ^ 1)) >> 8) & 0xFF)
+        update_keys(value)
+    return bytes(encrypted_data)
+
+
+class WriteOnlyStream:
+    """
+    Поток только для записи: zipfile пишет в него архив без перемещения по файлу
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
 def create_zip_folder(dir_to_zip_create: str) -> ZipFile:
     """
        Функция, предназначенная для создания временных фалов во временной папке и архива
@@ -53,6 +105,481 @@ class TestZipFile(unittest.TestCase):
             # Удаляем временную папку
             remove_dir(temporary_folder)
 
+    def test_zip_archive_create_parallel(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            zip_file_obj.workers = 2
+            false_bool, output_str = zip_file_obj.make_zip_files(True)
+            self.assertEqual(False, false_bool)
+            # Архив читается стандартным zipfile, CRC сходятся
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip')) as created_zip:
+                self.assertIsNone(created_zip.testzip())
+                self.assertEqual(b'Some comment', created_zip.read('test_txt_file_2.txt'))
+                self.assertEqual(3, len(created_zip.infolist()))
+            # Исходные файлы удалены
+            self.assertEqual(['test_arch.zip'], os.listdir(temporary_folder))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_parallel_member_max_size(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            with open(os.path.join(temporary_folder, 'small.txt'), 'w') as small_file:
+                small_file.write('small')
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'small.txt'))
+            zip_file_obj.workers = 2
+            # Файлы больше ограничения записываются частями в текущем процессе и без chunk_size
+            zip_file_obj.parallel_member_max_size = 10
+            with mock.patch('classes.zip_unzip_file_classes.write_member_streamed',
+                            wraps=write_member_streamed) as streamed_mock:
+                self.assertEqual(False, zip_file_obj.make_zip_files(False)[0])
+            self.assertEqual(['test__txt_file1.txt', 'test_txt_file_2.txt', 'test_txt_file_3.txt'],
+                             [x.args[2] for x in streamed_mock.call_args_list])
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip')) as created_zip:
+                self.assertIsNone(created_zip.testzip())
+                self.assertEqual(b'small', created_zip.read('small.txt'))
+                self.assertEqual(b'Some comment', created_zip.read('test_txt_file_2.txt'))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_create_parallel_error(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            zip_file_obj.workers = 2
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'missing_file.txt'))
+            true_bool, error_str = zip_file_obj.make_zip_files(True)
+            self.assertEqual(True, true_bool)
+            self.assertIn('missing_file.txt', error_str)
+            # Архив удален, исходные файлы сохранены
+            self.assertEqual(3, len(os.listdir(temporary_folder)))
+            self.assertFalse(os.path.exists(os.path.join(temporary_folder, 'test_arch.zip')))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_compression_policy(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            # Несжимаемый файл
+            with open(os.path.join(temporary_folder, 'random.bin'), 'wb') as random_file:
+                random_file.write(os.urandom(100000))
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'random.bin'))
+            for workers in (1, 2):
+                zip_file_obj.workers = workers
+                zip_file_obj.compression_policy = CompressionPolicy(zipfile.ZIP_BZIP2, store_incompressible=True)
+                zip_file_obj.member_policies = {'.txt': CompressionPolicy(zipfile.ZIP_LZMA)}
+                false_bool, output_str = zip_file_obj.make_zip_files(False)
+                self.assertEqual(False, false_bool)
+                self.assertEqual([zipfile.ZIP_LZMA] * 3 + [zipfile.ZIP_STORED],
+                                 [x.compress_type for x in zip_file_obj.report])
+                self.assertEqual(1.0, zip_file_obj.report[-1].ratio)
+                with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip')) as created_zip:
+                    self.assertIsNone(created_zip.testzip())
+                    self.assertEqual(b'Some comment', created_zip.read('test__txt_file1.txt'))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_streamed(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            big_data = os.urandom(300000) + b'Some comment' * 100000
+            with open(os.path.join(temporary_folder, 'big.bin'), 'wb') as big_file:
+                big_file.write(big_data)
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'big.bin'))
+            progress = []
+            zip_file_obj.chunk_size = 64 * 1024
+            zip_file_obj.fsync = True
+            zip_file_obj.progress_callback = lambda name, written, total: progress.append((name, written, total))
+            # Большой файл пишется по частям в текущем процессе, маленькие сжимаются в пуле
+            zip_file_obj.parallel_member_max_size = 1024 * 1024
+            for workers, force_zip64 in ((1, False), (2, True)):
+                progress.clear()
+                zip_file_obj.workers = workers
+                zip_file_obj.force_zip64 = force_zip64
+                false_bool, output_str = zip_file_obj.make_zip_files(False)
+                self.assertEqual(False, false_bool)
+                big_progress = [x for x in progress if x[0] == 'big.bin']
+                self.assertEqual(len(big_data) // (64 * 1024) + 1, len(big_progress))
+                self.assertEqual(('big.bin', len(big_data), len(big_data)), big_progress[-1])
+                self.assertEqual(4, len({x[0] for x in progress}))
+                with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip')) as created_zip:
+                    self.assertIsNone(created_zip.testzip())
+                    self.assertEqual(big_data, created_zip.read('big.bin'))
+                    self.assertEqual(b'Some comment', created_zip.read('test__txt_file1.txt'))
+
+            # Файл, выросший во время записи больше ограничения, без Zip64 не записывается
+            def grow_big_file(name, written, total):
+                if name == 'big.bin' and written == 64 * 1024:
+                    with open(os.path.join(temporary_folder, 'big.bin'), 'ab') as grown_file:
+                        grown_file.write(big_data * 2)
+
+            zip_file_obj.workers = 1
+            zip_file_obj.force_zip64 = False
+            zip_file_obj.progress_callback = grow_big_file
+            # Граница Zip64 уменьшена для теста
+            with mock.patch.object(zipfile, 'ZIP64_LIMIT', len(big_data) * 2):
+                self.assertEqual(True, zip_file_obj.make_zip_files(False)[0])
+            self.assertFalse(os.path.isfile(os.path.join(temporary_folder, 'test_arch.zip')))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_bulk_delete(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            for i in range(20):
+                create_new_file(temporary_folder, f'extra_{i}.txt')
+                zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, f'extra_{i}.txt'))
+            # Транзакционное удаление: если один файл удалить нельзя, остальные возвращаются на место
+            zip_file_obj.file_deleter = BulkFileDeleter(workers=3, batch_size=4, transactional=True)
+            zip_file_obj.files_to_zip.insert(10, StoredFile(temporary_folder, 'missing_file.txt'))
+            delete_report = zip_file_obj.file_deleter.delete_files(zip_file_obj.files_to_zip)
+            self.assertFalse(delete_report)
+            self.assertEqual(1, len([x for x in delete_report.failed if x.error is not None]))
+            self.assertEqual('missing_file.txt', delete_report.results[10].stored_file.file_name)
+            self.assertTrue(all(x.rolled_back for x in delete_report.results if x.error is None))
+            self.assertEqual(23, len(os.listdir(temporary_folder)))
+            del zip_file_obj.files_to_zip[10]
+            false_bool, output_str = zip_file_obj.make_zip_files(True)
+            self.assertEqual(False, false_bool)
+            self.assertEqual(23, len(zip_file_obj.delete_report.deleted))
+            self.assertEqual(['test_arch.zip'], os.listdir(temporary_folder))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_bulk_delete_transactional(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            os.mkdir(os.path.join(temporary_folder, 'sub'))
+            create_new_file(temporary_folder, 'a.txt')
+            create_new_file(os.path.join(temporary_folder, 'sub'), 'a.txt')
+            # Имя с поддиректорией переносится в служебную директорию под плоским именем
+            file_deleter = BulkFileDeleter(workers=1, transactional=True)
+            delete_report = file_deleter.delete_files([StoredFile(temporary_folder, 'a.txt'),
+                                                       StoredFile(temporary_folder, os.path.join('sub', 'a.txt'))])
+            self.assertTrue(delete_report)
+            self.assertEqual(['sub'], os.listdir(temporary_folder))
+            self.assertEqual([], os.listdir(os.path.join(temporary_folder, 'sub')))
+
+            # Файл, который не удалось вернуть из служебной директории, не считается возвращённым
+            class FailingRollbackDeleter(BulkFileDeleter):
+                @staticmethod
+                def _rename_batch(file_directory, directory_fd, renames):
+                    return [PermissionError(13, 'Permission denied') if x[1] == 'b.txt' else
+                            BulkFileDeleter._rename_batch(file_directory, directory_fd, [x])[0] for x in renames]
+            create_new_file(temporary_folder, 'b.txt')
+            delete_report = FailingRollbackDeleter(workers=1, transactional=True).delete_files(
+                [StoredFile(temporary_folder, 'missing.txt'), StoredFile(temporary_folder, 'b.txt')])
+            self.assertFalse(delete_report)
+            self.assertFalse(delete_report.results[1].rolled_back)
+            self.assertIn(BulkFileDeleter.staging_prefix, str(delete_report.results[1].error))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_repack(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            bundle_path = os.path.join(temporary_folder, 'bundle.zip')
+            with zipfile.ZipFile(bundle_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle_zip:
+                for bank_code in ('0645', '0646'):
+                    for i in range(3):
+                        bundle_zip.writestr(f'{bank_code}.1111111111{i}.20220923174555.cer', f'{bank_code} {i}' * 100)
+                bundle_zip.writestr('readme.txt', 'readme')
+            # В архиве банка уже есть файл, он сохраняется
+            with zipfile.ZipFile(os.path.join(temporary_folder, '0645.zip'), 'w') as existing_zip:
+                existing_zip.writestr('0645.99999999999.20200101000000.cer', 'old')
+            repacker = ZipRepacker(temporary_folder, 'bundle.zip', temporary_folder, route_by_bank_code)
+            # Файл без архива не даёт удалить исходный архив
+            self.assertEqual(True, repacker.make_repack_files(True)[0])
+            self.assertEqual(['readme.txt'], repacker.skipped_members)
+            self.assertTrue(os.path.isfile(bundle_path))
+            with zipfile.ZipFile(os.path.join(temporary_folder, '0645.zip')) as bank_zip:
+                self.assertEqual(4, len(bank_zip.namelist()))
+                self.assertIsNone(bank_zip.testzip())
+                # Сжатые данные скопированы без перепаковки
+                self.assertTrue(all(x.compress_type == zipfile.ZIP_DEFLATED for x in bank_zip.infolist()
+                                    if x.filename.endswith('20220923174555.cer')))
+                self.assertEqual(b'0645 1' * 100, bank_zip.read('0645.11111111111.20220923174555.cer'))
+            # Перепаковка другим методом сжатия
+            repacker.compression_policy = CompressionPolicy(zipfile.ZIP_STORED)
+            repacker.route = lambda x: 'all.zip'
+            self.assertEqual(False, repacker.make_repack_files(True)[0])
+            self.assertFalse(os.path.isfile(bundle_path))
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'all.zip')) as all_zip:
+                self.assertEqual(7, len(all_zip.namelist()))
+                self.assertIsNone(all_zip.testzip())
+                self.assertTrue(all(x.compress_type == zipfile.ZIP_STORED for x in all_zip.infolist()))
+            self.assertEqual(['0645.zip', '0646.zip', 'all.zip'], sorted(os.listdir(temporary_folder)))
+            # Зашифрованный файл с дескриптором данных переносится как есть и открывается паролем
+            encrypted_info = zipfile.ZipInfo('0647.11111111111.20220923174555.cer', (2022, 9, 23, 17, 45, 54))
+            encrypted_info.flag_bits = 0x1 | 0x08
+            encrypted_data = b'secret certificate'
+            with zipfile.ZipFile(bundle_path, 'w') as bundle_zip:
+                write_raw_member(bundle_zip, encrypted_info, CompressedMember(
+                    zipfile.ZIP_STORED, zlib.crc32(encrypted_data), len(encrypted_data),
+                    zip_crypto_encrypt(encrypted_data, b'password', (17 << 11 | 45 << 5 | 54 // 2) >> 8)))
+            repacker.route = route_by_bank_code
+            self.assertEqual(False, repacker.make_repack_files(True)[0])
+            with zipfile.ZipFile(os.path.join(temporary_folder, '0647.zip')) as bank_zip:
+                self.assertEqual(0x1 | 0x08, bank_zip.infolist()[0].flag_bits & (0x1 | 0x08))
+                self.assertEqual(encrypted_data, bank_zip.read(encrypted_info.filename, pwd=b'password'))
+            # Если архив не удалось заменить, временные архивы удаляются
+            with zipfile.ZipFile(bundle_path, 'w') as bundle_zip:
+                for bank_code in ('0645', '0648'):
+                    bundle_zip.writestr(f'{bank_code}.22222222222.20220923174555.cer', bank_code)
+            os.mkdir(os.path.join(temporary_folder, '0648.zip'))
+            self.assertEqual(True, repacker.make_repack_files(False)[0])
+            self.assertEqual([], [x for x in os.listdir(temporary_folder) if x.endswith('.tmp')])
+            with zipfile.ZipFile(os.path.join(temporary_folder, '0645.zip')) as bank_zip:
+                self.assertIn('0645.22222222222.20220923174555.cer', bank_zip.namelist())
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_repack_manifest(self):
+        # Создаем временные папки для исходных файлов и архивов
+        temporary_folder = create_temp_dir()
+        source_folder = create_temp_dir()
+        try:
+            for bank_code in ('0645', '0646'):
+                create_new_file(source_folder, f'{bank_code}.11111111111.20220923174555.cer')
+            create_new_file(source_folder, '0645.99999999999.20200101000000.cer')
+            # У существующего архива банка есть описание
+            self.assertEqual(False, ZipFile(temporary_folder, '0645.zip', [StoredFile(
+                source_folder, '0645.99999999999.20200101000000.cer')], write_manifest=True).make_zip_files(False)[0])
+            # Исходный архив без описания: описание архива банка удаляется
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'bundle.zip'), 'w') as bundle_zip:
+                bundle_zip.writestr('0645.22222222222.20220923174555.cer', '0645')
+            ZipRepacker(temporary_folder, 'bundle.zip', temporary_folder, route_by_bank_code).repack()
+            self.assertIsNone(ArchiveManifest.load(os.path.join(temporary_folder, '0645.zip')))
+            self.assertEqual(False, UnZipFile(temporary_folder, '0645.zip', source_folder).verify_archive()[0])
+            # Исходный архив с описанием: описание архива банка собирается из обоих описаний
+            self.assertEqual(False, ZipFile(temporary_folder, '0645.zip', [StoredFile(
+                source_folder, '0645.99999999999.20200101000000.cer')], write_manifest=True).make_zip_files(False)[0])
+            self.assertEqual(False, ZipFile(temporary_folder, 'bundle.zip', [StoredFile(
+                source_folder, f'{x}.11111111111.20220923174555.cer') for x in ('0645', '0646')],
+                write_manifest=True).make_zip_files(False)[0])
+            ZipRepacker(temporary_folder, 'bundle.zip', temporary_folder, route_by_bank_code).repack()
+            for target_name, members_count in (('0645.zip', 2), ('0646.zip', 1)):
+                self.assertEqual(members_count, len(ArchiveManifest.load(
+                    os.path.join(temporary_folder, target_name)).members))
+                self.assertEqual(False, UnZipFile(temporary_folder, target_name, source_folder).verify_archive()[0])
+        finally:
+            # Удаляем временные папки
+            remove_dir(temporary_folder)
+            remove_dir(source_folder)
+
+    def test_zip_write_raw_member(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            create_new_file(temporary_folder, 'test_txt_file.txt')
+            compressed_member = compress_member(os.path.join(temporary_folder, 'test_txt_file.txt'),
+                                                CompressionPolicy())
+            archive_full_path = os.path.join(temporary_folder, 'zip64.zip')
+            # Заголовки Zip64 записываются и читаются обратно (граница Zip64 уменьшена для теста)
+            with mock.patch.object(zipfile, 'ZIP64_LIMIT', 4):
+                with zipfile.ZipFile(archive_full_path, 'w') as raw_zip:
+                    write_raw_member(raw_zip, zipfile.ZipInfo('test_txt_file.txt'), compressed_member)
+            with zipfile.ZipFile(archive_full_path) as raw_zip:
+                self.assertIsNone(raw_zip.testzip())
+                self.assertEqual(b'Some comment', raw_zip.read('test_txt_file.txt'))
+                self.assertEqual(zipfile.ZIP_DEFLATED, raw_zip.getinfo('test_txt_file.txt').compress_type)
+            with open(archive_full_path, 'rb') as archive_file:
+                local_header = archive_file.read(30)
+            # Размеры в локальном заголовке перенесены в дополнительное поле Zip64
+            self.assertEqual(b'\xff' * 8, local_header[18:26])
+            # В архив без перемещения по файлу данные записываются через ZipFile.open
+            write_only_stream = WriteOnlyStream()
+            with zipfile.ZipFile(write_only_stream, 'w') as stream_zip:
+                write_raw_member(stream_zip, zipfile.ZipInfo('test_txt_file.txt'), compressed_member)
+            with zipfile.ZipFile(io.BytesIO(b''.join(write_only_stream.chunks))) as stream_zip:
+                self.assertIsNone(stream_zip.testzip())
+                self.assertEqual(b'Some comment', stream_zip.read('test_txt_file.txt'))
+                self.assertEqual(zipfile.ZIP_DEFLATED, stream_zip.getinfo('test_txt_file.txt').compress_type)
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+    def test_zip_archive_update(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            zip_file_obj.update_mode = True
+            archive_full_path = os.path.join(temporary_folder, 'test_arch.zip')
+            self.assertEqual(False, zip_file_obj.make_zip_files(False)[0])
+            self.assertEqual(3, len(ArchiveManifest.load(archive_full_path).members))
+            # Повторный запуск без изменений ничего не записывает
+            self.assertEqual(False, zip_file_obj.make_zip_files(False)[0])
+            self.assertEqual([], zip_file_obj.report)
+            # Новый файл дописывается в архив
+            create_new_file(temporary_folder, 'new_file.txt')
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'new_file.txt'))
+            self.assertEqual(False, zip_file_obj.make_zip_files(False)[0])
+            self.assertEqual(['new_file.txt'], [x.file_name for x in zip_file_obj.report])
+            # Ошибка при дописывании не меняет архив
+            with open(archive_full_path, 'rb') as archive_file:
+                archive_bytes = archive_file.read()
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'missing_file.txt'))
+            self.assertEqual(True, zip_file_obj.make_zip_files(False)[0])
+            with open(archive_full_path, 'rb') as archive_file:
+                self.assertEqual(archive_bytes, archive_file.read())
+            zip_file_obj.files_to_zip.pop()
+            # Ошибка при закрытии архива после дописывания тоже не меняет архив
+            create_new_file(temporary_folder, 'late_file.txt')
+            zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, 'late_file.txt'))
+            with mock.patch.object(zipfile.ZipFile, '_write_end_record', side_effect=PermissionError('closed')):
+                self.assertEqual(True, zip_file_obj.make_zip_files(False)[0])
+            with open(archive_full_path, 'rb') as archive_file:
+                self.assertEqual(archive_bytes, archive_file.read())
+            zip_file_obj.files_to_zip.pop()
+            # Изменившийся файл заменяется, остальные копируются без повторного сжатия
+            with open(os.path.join(temporary_folder, 'test_txt_file_2.txt'), 'w') as changed_file:
+                changed_file.write('Changed comment')
+            zip_file_obj.change_detection = 'hash'
+            self.assertEqual(False, zip_file_obj.make_zip_files(False)[0])
+            self.assertEqual(['test_txt_file_2.txt'], [x.file_name for x in zip_file_obj.report])
+            with zipfile.ZipFile(archive_full_path) as created_zip:
+                self.assertIsNone(created_zip.testzip())
+                self.assertEqual(4, len(created_zip.infolist()))
+                self.assertEqual(b'Changed comment', created_zip.read('test_txt_file_2.txt'))
+                self.assertEqual(b'Some comment', created_zip.read('new_file.txt'))
+            self.assertIn('sha256', ArchiveManifest.load(archive_full_path).members['test_txt_file_2.txt'])
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
+
+class TestAsyncZipFile(unittest.TestCase):
+    """
+    Unit test для тестирования асинхронных компонент AsyncZipFile и AsyncUnZipFile
+    """
+    def test_async_zip_archives(self):
+        # Создаем временные папки
+        temporary_folders = [create_temp_dir() for _ in range(3)]
+
+        async def zip_and_unzip(files_executor):
+            # Архивы обрабатываются одновременно, но не больше двух сразу
+            zip_files = [AsyncZipFile(x, 'test_arch.zip', create_zip_folder(x).files_to_zip, files_executor)
+                         for x in temporary_folders]
+            zip_results = await asyncio.gather(*(x.make_zip_files(True) for x in zip_files))
+            unzip_files = [AsyncUnZipFile(x, 'test_arch.zip', x, files_executor) for x in temporary_folders]
+            unzip_results = await asyncio.gather(*(x.make_unzip_files(False) for x in unzip_files))
+            return zip_results, unzip_results
+
+        async def run_all():
+            async with AsyncFilesExecutor(max_workers=2, max_concurrent=2) as files_executor:
+                return await zip_and_unzip(files_executor)
+
+        try:
+            zip_results, unzip_results = asyncio.run(run_all())
+            self.assertEqual([False] * 3, [x[0] for x in zip_results])
+            self.assertEqual([False] * 3, [x[0] for x in unzip_results])
+            self.assertEqual([3] * 3, [len(x[1]) for x in unzip_results])
+        finally:
+            # Удаляем временные папки
+            for temporary_folder in temporary_folders:
+                remove_dir(temporary_folder)
+
+    def test_async_executor_event_loops(self):
+        files_executor = AsyncFilesExecutor(max_workers=1, max_concurrent=1)
+
+        async def run_concurrently():
+            # Вторая операция ждёт семафор, поэтому он должен относиться к работающему циклу событий
+            return await asyncio.gather(*(files_executor.run(time.sleep, 0.01) for _ in range(2)))
+
+        try:
+            # Пул переиспользуется последовательными и одновременными циклами событий
+            for _ in range(2):
+                self.assertEqual([None, None], asyncio.run(run_concurrently()))
+            thread_results = []
+            threads = [threading.Thread(target=lambda: thread_results.append(asyncio.run(run_concurrently())))
+                       for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([[None, None]] * 2, thread_results)
+        finally:
+            files_executor.shutdown()
+        # После остановки общего пула создаётся новый
+        default_files_executor = get_default_files_executor()
+        shutdown_default_files_executor()
+        self.assertIsNot(default_files_executor, get_default_files_executor())
+        shutdown_default_files_executor()
+
+    def test_async_cancel_waits_rollback(self):
+        rollback_done = []
+
+        def blocking_operation(cancel_event):
+            # Операция работает до отмены и затем возвращает файлы в исходное состояние
+            cancel_event.wait(5)
+            rollback_done.append(cancel_event.is_set())
+
+        async def cancel_operation():
+            cancel_event = threading.Event()
+            async with AsyncFilesExecutor(max_workers=1) as files_executor:
+                task = asyncio.create_task(files_executor.run(blocking_operation, cancel_event,
+                                                              cancel_event=cancel_event))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                # К моменту отмены задачи откат уже выполнен
+                self.assertEqual([True], rollback_done)
+
+        asyncio.run(cancel_operation())
+
+    def test_zip_archive_cancelled(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            zip_file_obj.cancel_event = threading.Event()
+            zip_file_obj.cancel_event.set()
+            true_bool, error_str = zip_file_obj.make_zip_files(True)
+            self.assertEqual(True, true_bool)
+            # Архив удалён, исходные файлы сохранены
+            self.assertFalse(os.path.isfile(os.path.join(temporary_folder, 'test_arch.zip')))
+            self.assertEqual(3, len(os.listdir(temporary_folder)))
+            # Отмена распаковки удаляет уже распакованные файлы
+            zip_file_obj.cancel_event.clear()
+            zip_file_obj.make_zip_files(False)
+            path_to_unzip = create_temp_dir()
+            try:
+                cancel_event = threading.Event()
+                cancel_event.set()
+                unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', path_to_unzip, cancel_event)
+                true_bool, stored_file_list, error_str = unzip_file_obj.make_unzip_files(False)
+                self.assertEqual(True, true_bool)
+                self.assertIn('отменена', error_str)
+                self.assertEqual([], os.listdir(path_to_unzip))
+            finally:
+                remove_dir(path_to_unzip)
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
 
 class TestUnZipFile(unittest.TestCase):
     """
@@ -73,6 +600,156 @@ class TestUnZipFile(unittest.TestCase):
             # Удаляем временную папку
             remove_dir(temporary_folder)
 
+    def test_zip_archive_unpack_parallel_stream(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        path_to_unzip = create_temp_dir()
+        zip_file_obj = create_zip_folder(temporary_folder)
+        zip_file_obj.make_zip_files(True)
+        try:
+            unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', path_to_unzip)
+            # Файлы возвращаются по мере распаковки и уже лежат на диске
+            unzipped_names = []
+            for unzipped_file in unzip_file_obj.iter_unzip_files(workers=2):
+                self.assertTrue(os.path.isfile(unzipped_file.full_file_name))
+                unzipped_names.append(unzipped_file.file_name)
+            self.assertIsNone(unzip_file_obj.unzip_error)
+            self.assertEqual(3, len(unzipped_names))
+            false_bool, stored_file_list, output_str = unzip_file_obj.make_unzip_files(False, workers=3)
+            self.assertEqual(False, false_bool)
+            self.assertEqual(3, len(stored_file_list))
+        finally:
+            # Удаляем временные папки
+            remove_dir(temporary_folder)
+            remove_dir(path_to_unzip)
+
+    def test_zip_archive_unpack_parallel_rollback(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        path_to_unzip = create_temp_dir()
+        try:
+            # Архив, в котором сломан только последний файл
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip'), 'w') as created_zip:
+                for i in range(6):
+                    created_zip.writestr(f'file_{i}.txt', 'Some comment' * 100)
+                broken_member = created_zip.infolist()[-1]
+            with open(os.path.join(temporary_folder, 'test_arch.zip'), 'r+b') as broken_zip:
+                broken_zip.seek(broken_member.header_offset + 30 + len(broken_member.filename))
+                broken_zip.write(b'broken')
+            unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', path_to_unzip)
+            true_bool, stored_file_list, error_str = unzip_file_obj.make_unzip_files(False, workers=2)
+            self.assertEqual(True, true_bool)
+            self.assertIn('file_5.txt', error_str)
+            # Все распакованные файлы удалены
+            self.assertEqual([], os.listdir(path_to_unzip))
+        finally:
+            # Удаляем временные папки
+            remove_dir(temporary_folder)
+            remove_dir(path_to_unzip)
+
+    def test_zip_archive_unpack_parallel_directories(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        path_to_unzip = create_temp_dir()
+        try:
+            # Файлы одной новой директории распаковываются разными потоками, последний файл сломан
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip'), 'w') as created_zip:
+                created_zip.writestr('nested/', '')
+                for i in range(12):
+                    created_zip.writestr(f'nested/inner/file_{i}.txt', 'Some comment' * 100)
+                broken_member = created_zip.infolist()[-1]
+            with open(os.path.join(temporary_folder, 'test_arch.zip'), 'r+b') as broken_zip:
+                broken_zip.seek(broken_member.header_offset + 30 + len(broken_member.filename))
+                broken_zip.write(b'broken')
+            unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', path_to_unzip)
+            # Вызывающий код удаляет полученные файлы, откат распаковки это не ломает
+            for unzipped_file in unzip_file_obj.iter_unzip_files(workers=4):
+                if os.path.isfile(unzipped_file.full_file_name):
+                    os.remove(unzipped_file.full_file_name)
+            self.assertEqual(True, unzip_file_obj.unzip_error[0])
+            self.assertIn('file_11.txt', unzip_file_obj.unzip_error[2])
+            true_bool, stored_file_list, error_str = unzip_file_obj.make_unzip_files(False, workers=4)
+            self.assertEqual(True, true_bool)
+            self.assertIn('file_11.txt', error_str)
+            # Распакованные файлы и созданные директории удалены
+            self.assertEqual([], os.listdir(path_to_unzip))
+        finally:
+            # Удаляем временные папки
+            remove_dir(temporary_folder)
+            remove_dir(path_to_unzip)
+
+    def test_zip_archive_verify(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        path_to_unzip = create_temp_dir()
+        try:
+            zip_file_obj = create_zip_folder(temporary_folder)
+            for i in range(5):
+                with open(os.path.join(temporary_folder, f'big_{i}.bin'), 'wb') as big_file:
+                    big_file.write(os.urandom(1000) + b'Some comment' * 20000)
+                zip_file_obj.files_to_zip.append(StoredFile(temporary_folder, f'big_{i}.bin'))
+            zip_file_obj.write_manifest = True
+            zip_file_obj.make_zip_files(False)
+            archive_full_path = os.path.join(temporary_folder, 'test_arch.zip')
+            manifest = ArchiveManifest.load(archive_full_path)
+            self.assertTrue(all('sha256' in x for x in manifest.members.values()))
+            unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', path_to_unzip)
+            for workers in (1, 3):
+                false_bool, output_str = unzip_file_obj.verify_archive(workers)
+                self.assertEqual(False, false_bool)
+            # Описание архива не совпадает с содержимым
+            manifest.members['big_1.bin']['sha256'] = '0' * 64
+            manifest.save(archive_full_path)
+            true_bool, error_str = unzip_file_obj.verify_archive(2)
+            self.assertEqual(True, true_bool)
+            self.assertIn('SHA-256', error_str)
+            self.assertEqual(False, unzip_file_obj.verify_archive(check_manifest=False)[0])
+            ArchiveManifest.remove(archive_full_path)
+            # Портим сжатые данные последнего файла
+            with zipfile.ZipFile(archive_full_path) as created_zip:
+                broken_member = created_zip.infolist()[-1]
+            with open(archive_full_path, 'r+b') as broken_zip:
+                broken_zip.seek(broken_member.header_offset + 30 + len(broken_member.filename) + 100)
+                broken_zip.write(b'broken')
+            true_bool, stored_file_list, error_str = unzip_file_obj.make_unzip_files(False, workers=2, verify=True)
+            self.assertEqual(True, true_bool)
+            self.assertIn('big_4.bin', error_str)
+            # Испорченный архив отклонён до записи файлов на диск
+            self.assertEqual([], os.listdir(path_to_unzip))
+        finally:
+            # Удаляем временные папки
+            remove_dir(temporary_folder)
+            remove_dir(path_to_unzip)
+
+    def test_zip_archive_view(self):
+        # Создаем временную папку
+        temporary_folder = create_temp_dir()
+        try:
+            member_data = os.urandom(50000) + b'Some comment' * 10000
+            with zipfile.ZipFile(os.path.join(temporary_folder, 'test_arch.zip'), 'w') as created_zip:
+                created_zip.writestr('stored.bin', member_data, compress_type=zipfile.ZIP_STORED)
+                created_zip.writestr('deflated.bin', member_data, compress_type=zipfile.ZIP_DEFLATED)
+                created_zip.writestr('bzip2.bin', member_data, compress_type=zipfile.ZIP_BZIP2)
+            unzip_file_obj = UnZipFile(temporary_folder, 'test_arch.zip', temporary_folder)
+            with unzip_file_obj.open_archive_view() as archive_view:
+                # Несжатый файл читается без копирования
+                member_view = archive_view.get_member_view('stored.bin', check_crc=True)
+                self.assertEqual(member_data, member_view)
+                member_view.release()
+                with self.assertRaises(ValueError):
+                    archive_view.get_member_view('deflated.bin')
+                # Сжатые файлы распаковываются по частям в переданный буфер
+                buffer = bytearray(4096)
+                for member_name in ('stored.bin', 'deflated.bin', 'bzip2.bin'):
+                    chunks = [bytes(x) for x in archive_view.iter_member_chunks(member_name, buffer)]
+                    self.assertTrue(all(len(x) <= 4096 for x in chunks))
+                    self.assertEqual(member_data, b''.join(chunks))
+            # Файлы не распаковывались на диск
+            self.assertEqual(['test_arch.zip'], os.listdir(temporary_folder))
+        finally:
+            # Удаляем временную папку
+            remove_dir(temporary_folder)
+
     def test_zip_archive_badzip_error(self):
         # Создаем временную папку
         temporary_folder = create_temp_dir()